@@ -0,0 +1,112 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BoundedExecutor:
+    """Runs tasks (e.g. recommendation searches) on a fixed number of threads, with a bounded queue.
+
+    When all threads are busy and the queue is full, new tasks are rejected rather than
+    queued, so that latency stays bounded under load instead of growing with queue depth.
+
+    Usage:
+        executor = BoundedExecutor(max_workers=4, max_pending=16)
+        executor.run_async(get_similar_song, "thank u, next", callback=reply, timeout=5)
+    """
+
+    def __init__(self, max_workers, max_pending):
+        """
+        Params:
+            max_workers (int): number of tasks run at once.
+            max_pending (int): number of tasks that may wait for a free thread.
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._lock = threading.Lock()
+        # late: tasks that finished after timing out
+        self.metrics = dict(completed=0, failed=0, timed_out=0, late=0, rejected=0)
+
+    def _count(self, metric):
+        with self._lock:
+            self.metrics[metric] += 1
+
+    def submit(self, fn, *args, **kwargs):
+        """Schedules fn(*args, **kwargs), unless too many tasks are running or waiting already.
+
+        Returns:
+            (concurrent.futures.Future): None if rejected.
+        """
+        if not self._slots.acquire(blocking=False):
+            self._count("rejected")
+            return None
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except RuntimeError:
+            # executor was shut down
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run_async(self, fn, *args, callback, timeout=None, **kwargs):
+        """Schedules fn(*args, **kwargs) without waiting for it. callback(status, result) is
+        called exactly once: when fn returns, when it fails, when the timeout passes (whichever
+        comes first), or right away if the task is rejected.
+
+        A task that times out before it starts is skipped. One that is already running cannot
+        be stopped, so it keeps its thread (and its slot) until it finishes, and its result is
+        discarded.
+
+        Params:
+            callback (function): takes (status, result) where status is one of "ok", "rejected",
+                "timed out", or "failed"; result is fn's return value if status is "ok", and
+                None otherwise. Called on the executor's thread, a timer thread, or this one.
+            timeout (float): max number of seconds until callback is called; None for no limit.
+
+        Returns:
+            (bool): False if rejected.
+        """
+        future = self.submit(fn, *args, **kwargs)
+        if future is None:
+            callback("rejected", None)
+            return False
+
+        # held by whichever of the task and the timer finishes first; the other one is dropped
+        answered = threading.Lock()
+        timer = None
+        if timeout is not None:
+            def on_timeout():
+                if answered.acquire(blocking=False):
+                    # skip the task if it has not started yet
+                    future.cancel()
+                    self._count("timed_out")
+                    callback("timed out", None)
+            timer = threading.Timer(timeout, on_timeout)
+            timer.daemon = True
+            timer.start()
+
+        def on_done(future):
+            if timer is not None:
+                timer.cancel()
+            if future.cancelled():
+                return
+            if not answered.acquire(blocking=False):
+                self._count("late")
+                return
+            try:
+                result = future.result()
+            except Exception as e:
+                print("ERROR: Task {} failed: {}".format(getattr(fn, "__name__", fn), e))
+                self._count("failed")
+                callback("failed", None)
+                return
+            self._count("completed")
+            callback("ok", result)
+
+        future.add_done_callback(on_done)
+        return True
+
+    def shutdown(self):
+        "Stops accepting tasks; tasks still waiting for a thread are cancelled."
+        self._executor.shutdown(wait=False, cancel_futures=True)
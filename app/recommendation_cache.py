@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class RecommendationCache:
+    """Remembers results of recommendation lookups (e.g. candidate songs), so that requests
+    about the same songs can be answered from memory instead of the knowledge base.
+
+    Holds at most max_size results, evicting the least recently used one first, and
+    forgets results older than ttl_seconds. Should be cleared whenever the knowledge
+    base changes, e.g. with KnowledgeBaseAPI.add_write_listener(cache.clear).
+
+    Usage:
+        cache = RecommendationCache(max_size=1024, ttl_seconds=3600)
+        candidates = cache.get_or_compute(("similar", "thank u, next"), lambda: find_candidates(...))
+    """
+
+    def __init__(self, max_size=1024, ttl_seconds=3600, clock=time.monotonic):
+        """
+        Params:
+            max_size (int): max number of results kept.
+            ttl_seconds (float): number of seconds a result is kept for.
+            clock (function): returns current time in seconds; may be replaced for testing.
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries = OrderedDict()  # key is lookup key, val is (result, time it expires)
+        self._lock = threading.Lock()
+        # incremented on clear() so that results computed from outdated data are not kept
+        self._generation = 0
+        self._hits, self._misses, self._evictions, self._expirations = 0, 0, 0, 0
+
+    def get_or_compute(self, key, compute):
+        """Returns cached result for given key, calling compute() to get it if necessary.
+
+        Params:
+            key (hashable): e.g. ("finegrained", "thank u, next", "Ariana Grande", "more acoustic").
+            compute (function): takes no arguments and returns the result, which may be None.
+
+        Returns:
+            result of compute(), possibly from an earlier call.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                result, expires_at = entry
+                if self._clock() < expires_at:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return result
+                del self._entries[key]
+                self._expirations += 1
+            self._misses += 1
+            generation = self._generation
+
+        # computed without holding the lock, since it may query the knowledge base
+        result = compute()
+
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (result, self._clock() + self.ttl_seconds)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+                    self._evictions += 1
+        return result
+
+    def clear(self):
+        """Forgets all results."""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def get_stats(self):
+        """
+        Returns:
+            (dict): e.g. {"size": 10, "hits": 90, "misses": 10, "hit_ratio": 0.9, "evictions": 0, "expirations": 0}.
+        """
+        with self._lock:
+            num_lookups = self._hits + self._misses
+            return dict(
+                size=len(self._entries),
+                hits=self._hits,
+                misses=self._misses,
+                hit_ratio=self._hits / num_lookups if num_lookups > 0 else 0.0,
+                evictions=self._evictions,
+                expirations=self._expirations,
+            )
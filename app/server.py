@@ -7,8 +7,9 @@ Execution:
     $ python app/server.py
 """
 
-from flask import Flask, render_template
+from flask import Flask, jsonify, render_template, request
 from flask_socketio import SocketIO
+import atexit
 import json
 import logging
 import os
@@ -16,11 +17,40 @@ import random
 import sys
 
 sys.path.extend(['.', '../'])   # needed for import statement(s) below
+from app.bounded_executor import BoundedExecutor
+from app.recommendation_cache import RecommendationCache
 from knowledge_base.api import KnowledgeBaseAPI
+from knowledge_base.metrics import metrics
+from knowledge_base.text import normalize_name
 
 app = Flask(__name__)
 socket_io = SocketIO(app)
-music_api = KnowledgeBaseAPI('knowledge_base/knowledge_base.db')
+# The server only reads the knowledge base; scripts that write to it (e.g. a refresh) do so
+# in WAL mode, so that requests do not wait on them.
+music_api = KnowledgeBaseAPI(
+    'knowledge_base/knowledge_base.db',
+    use_graph_snapshot=True,
+    use_feature_store=True,
+    storage_profile=os.environ.get("KNOWLEDGE_BASE_STORAGE_PROFILE", "read_only"),
+)
+atexit.register(music_api.close)
+
+# Recommendations are computed on a few dedicated threads, so that a burst of requests
+# cannot slow every request down: past the queue limit, requests are turned away instead.
+RECOMMENDATION_TIMEOUT_SECONDS = float(os.environ.get("RECOMMENDATION_TIMEOUT_SECONDS", 5))
+recommendation_executor = BoundedExecutor(
+    max_workers=int(os.environ.get("RECOMMENDATION_WORKERS", 4)),
+    max_pending=int(os.environ.get("MAX_PENDING_RECOMMENDATIONS", 16)),
+)
+atexit.register(recommendation_executor.shutdown)
+
+# Candidate songs for recommendations are remembered (the random pick among them is not),
+# until the knowledge base changes, whether through music_api or another process.
+recommendation_cache = RecommendationCache(
+    max_size=int(os.environ.get("RECOMMENDATION_CACHE_SIZE", 4096)),
+    ttl_seconds=float(os.environ.get("RECOMMENDATION_CACHE_TTL_SECONDS", 3600)),
+)
+music_api.add_write_listener(recommendation_cache.clear)
 
 CLIENT_SESSION_KEYS, NEW_CLIENT_IDX, = [None for i in range(100)], 0
 CLIENT_COUNT, MAX_CLIENT_SESSIONS = 0, 100
@@ -29,6 +59,18 @@ CLIENT_COUNT, MAX_CLIENT_SESSIONS = 0, 100
 def get_player():
     return render_template("player.html")
 
+@app.route('/metrics')
+def get_metrics():
+    """Returns timings of knowledge base methods, SQL statements, and recommendation
+    requests (along with traces of recent ones), and state of the recommendation cache
+    and executor, as JSON.
+    """
+    return jsonify(dict(
+        metrics.get_stats(),
+        recommendation_cache=recommendation_cache.get_stats(),
+        recommendation_executor=dict(recommendation_executor.metrics),
+    ))
+
 @socket_io.on("start session")
 def start_user_session():
     global NEW_CLIENT_IDX, CLIENT_COUNT
@@ -49,29 +91,97 @@ def start_user_session():
 
 @socket_io.on("get recommendation")
 def handle_get_recommendation(data):
+    """Schedules a search for a recommendation, without waiting for it, so that other
+    clients' events are handled meanwhile. The result is sent once it is ready.
+    """
     song, adjective = data.get('song'), data.get('adjective')
+    # reply only to the client that asked; request context is gone by the time the result is ready
+    sid = request.sid
+
+    def reply(status, spotify_uri):
+        if status == "rejected":
+            msg = "Too many requests right now, please try again in a moment."
+            print(f"WARN: Turned away request for song '{song}' because recommendation queue is full.")
+            socket_io.emit('msg', msg, room=sid)
+        elif status == "timed out":
+            msg = f"Took too long to find a recommendation for song '{song}'"
+            print(msg)
+            socket_io.emit('msg', msg, room=sid)
+        elif spotify_uri is None:
+            msg = f"Could not get recommendation for song '{song}'"
+            print(msg)
+            socket_io.emit('msg', msg, room=sid)
+        else:
+            print(f"Found recommendation for song '{song}'")
+            socket_io.emit('play song', data=dict(spotify_uri=spotify_uri), room=sid)
+
     if adjective is None:
         print(f"Received request for song similar to '{song}'")
-        spotify_uri = get_similar_song(song)
+        recommendation_executor.run_async(
+            get_similar_song, song, callback=reply, timeout=RECOMMENDATION_TIMEOUT_SECONDS)
     else:
         print(f"Received '{adjective}' request for song '{song}'")
-        spotify_uri = get_finegrained_recommendation(song, adjective)
+        recommendation_executor.run_async(
+            get_finegrained_recommendation, song, adjective, callback=reply, timeout=RECOMMENDATION_TIMEOUT_SECONDS)
 
-    if spotify_uri is None:
-        msg = f"Could not get recommendation for song '{song}'"
-        print(msg)
-        socket_io.emit('msg', msg)
-    else:
-        print(f"Found recommendation for song '{song}'")
-        socket_io.emit('play song', data=dict(spotify_uri=spotify_uri))
+# number of songs that sound most like a given song to choose a recommendation from
+NUM_SIMILAR_SONGS = 10
+
+def _find_songs(song_name):
+    """Same as music_api.get_song_data(song_name), but cached, and falling back to the
+    song with the closest name if there is no song by that name, e.g. if it is misspelled.
+
+    The returned list is shared between callers, so it must not be modified.
+    """
+    # every recommendation starts here, so that nothing is answered from the cache (or
+    # snapshots) after another process, e.g. a refresh, has written to the knowledge base
+    music_api.check_for_changes()
+    return recommendation_cache.get_or_compute(
+        ("song", normalize_name(song_name)),
+        lambda: music_api.get_song_data(song_name) or _find_songs_by_closest_name(song_name),
+    )
+
+def _find_songs_by_closest_name(song_name):
+    matches = music_api.find_similar_names(song_name, entity_type="song", limit=1)
+    if matches == []:
+        return []
+    print(f"WARN: Could not find song '{song_name}'. Using closest match '{matches[0]['name']}'.")
+    return music_api.get_song_data(song_id=matches[0]['id'])
+
+def _get_similar_song_candidates(song_name, cur_song_data):
+    """Finds songs to recommend for given song.
+
+    Returns:
+        (list of lists): groups of song names; a recommendation should be a random song
+            from a random group. E.g. songs related to given song, or else songs that sound
+            most like it, or else songs by each artist related to the given song's artist
+            (and by the artist themselves).
+    """
+    related_songs = music_api.get_related_entities(song_name)
+    if related_songs != []:
+        return [related_songs]
+
+    similar_song_ids = music_api.get_similar_songs(cur_song_data['id'], k=NUM_SIMILAR_SONGS)
+    if similar_song_ids != []:
+        return [[x['song_name'] for x in music_api.get_songs_by_ids(similar_song_ids)]]
 
+    artist = cur_song_data['artist_name']
+
+    # TODO: use music api IDs (as soon as other get_related_entities called above also returns them)
+    songs_by_artist = [
+        [x['song_name'] for x in music_api.get_songs_by_artist(related_artist)]
+        for related_artist in music_api.get_related_entities(artist) + [artist]
+    ]
+    return [songs for songs in songs_by_artist if songs != []]
+
+@metrics.traced
 def get_similar_song(song_name):
     """Encapsulates interaction with music API for getting a recommendation.
 
     Params: song_name (str): e.g. 'No One', 'needy', etc.
     Returns: (str): a spotify URI or None if failure.
     """
-    cur_song_data = music_api.get_song_data(song_name)
+    cur_song_data = _find_songs(song_name)
     if cur_song_data == []:
         print(f"ERR: Could not find song '{song_name}'.")
         return None
@@ -79,26 +189,22 @@ def get_similar_song(song_name):
         print(f"WARN: Found {len(cur_song_data)} hits for song '{song_name}'. Choosing one arbitrarily.")
     cur_song_data = cur_song_data[0]
 
-    recommended_songs = music_api.get_related_entities(song_name)
-    if recommended_songs == []:
-        cur_artist = cur_song_data['artist_name']
-        related_artists = music_api.get_related_entities(cur_artist) + [cur_artist]
-        if len(related_artists) > 0:
-            # TODO: use music api IDs (as soon as other get_related_entities called above also returns them)
-            recommended_songs = [x['song_name']
-                for x in music_api.get_songs_by_artist(
-                    related_artists[random.randint(0, len(related_artists)-1)]
-                )
-            ]
-
-    if recommended_songs == []:
+    # the name found, in case the given one is misspelled
+    found_song_name = cur_song_data['song_name']
+    candidate_groups = recommendation_cache.get_or_compute(
+        ("similar", normalize_name(found_song_name), normalize_name(cur_song_data['artist_name'])),
+        lambda: _get_similar_song_candidates(found_song_name, cur_song_data),
+    )
+    if candidate_groups == []:
         print(f"ERR: Couldn't find recommendations for song: '{song_name}'")
         return None
-    elif len(recommended_songs) > 1:
+
+    recommended_songs = candidate_groups[random.randint(0, len(candidate_groups)-1)]
+    if len(recommended_songs) > 1:
         print(f"WARN: Found {len(recommended_songs)} hits for song '{song_name}'. Choosing one arbitrarily.")
 
     recommended_song = recommended_songs[random.randint(0, len(recommended_songs)-1)]
-    hits = music_api.get_song_data(song_name=recommended_song)
+    hits = _find_songs(recommended_song)
     if hits == []:
         print(f"ERR: Couldn't find song info for: '{song_name}'")
         return None
@@ -106,6 +212,27 @@ def get_similar_song(song_name):
         print(f"WARN: Found {len(hits)} hits for song '{song_name}'. Choosing one arbitrarily.")
     return hits[0]['spotify_uri']
 
+def _get_finegrained_candidates(cur_song_data, adjective):
+    """Finds songs by the given song's artist, or related artists, that compare to it as described.
+
+    Returns:
+        (list of tuples): (song name, artist name, Spotify URI) of each matching song.
+    """
+    cur_artist = cur_song_data['artist_name']
+
+    # key is song ID, val is (song name, artist name)
+    candidate_songs = dict()
+    for related_artist in music_api.get_related_entities(cur_artist) + [cur_artist]:
+        for candidate_song in music_api.get_songs_by_artist(related_artist):
+            candidate_songs[candidate_song["id"]] = (candidate_song["song_name"], related_artist)
+
+    matching_song_ids = music_api.get_ranked_related_songs(cur_song_data["id"], adjective, list(candidate_songs.keys()))
+    return [
+        candidate_songs[song_data["id"]] + (song_data["spotify_uri"],)
+        for song_data in music_api.get_songs_by_ids(matching_song_ids)
+    ]
+
+@metrics.traced
 def get_finegrained_recommendation(song, adjective, artist=None):
     """
 
@@ -118,7 +245,7 @@ def get_finegrained_recommendation(song, adjective, artist=None):
         spotify_uri (str): None if cannot make recommendation.
     """
     hits = [
-        hit for hit in music_api.get_song_data(song)
+        hit for hit in _find_songs(song)
         if artist is None or hit["artist_name"].upper() == artist.upper()
     ]
     if len(hits) == 0:
@@ -131,28 +258,38 @@ def get_finegrained_recommendation(song, adjective, artist=None):
         print(f"WARN: Found {len(hits)} hits for song '{song}'. Choosing one arbitrarily.")
 
     cur_song_data = hits[random.randint(0,len(hits)-1)]
-    cur_artist = cur_song_data['artist_name']
-    cur_song_id = cur_song_data["id"]
-
-    rel_artists = music_api.get_related_entities(cur_artist) + [cur_artist]
-    random.shuffle(rel_artists)
-    for related_artist in rel_artists:
-        songs_by_rel_artist = music_api.get_songs_by_artist(related_artist)
-        random.shuffle(songs_by_rel_artist)
-        for candidate_song in songs_by_rel_artist:
-            if music_api.songs_are_related(candidate_song["id"], cur_song_id, rel_str=adjective):
-                song_data = music_api.get_song_data(candidate_song["song_name"], candidate_song["id"])
-                spotify_uri = song_data[0]['spotify_uri']
-                print(f"Found '{candidate_song['song_name']}' by {related_artist}")
-                return spotify_uri
-    print(f"ERR: Could not find a song '{adjective}' than '{song}'.")
-    return None
+    matching_songs = recommendation_cache.get_or_compute(
+        # keyed by the name found, in case the given one is misspelled
+        ("finegrained", normalize_name(cur_song_data['song_name']), normalize_name(cur_song_data['artist_name']), adjective),
+        lambda: _get_finegrained_candidates(cur_song_data, adjective),
+    )
+    if len(matching_songs) == 0:
+        print(f"ERR: Could not find a song '{adjective}' than '{song}'.")
+        return None
+
+    song_name, related_artist, spotify_uri = matching_songs[random.randint(0, len(matching_songs)-1)]
+    print(f"Found '{song_name}' by {related_artist}")
+    return spotify_uri
 
 @socket_io.on("get random song")
-def get_random_song():
+@metrics.traced
+def get_random_song(data=None):
+    """Plays a random song, optionally of a genre e.g. {"genre": "pop"}, and/or favouring
+    popular songs e.g. {"popular": true}.
+    """
+    data = data or dict()
+    music_api.check_for_changes()
+    spotify_uri = music_api.get_random_song(
+        weighted_by_popularity=bool(data.get('popular')),
+        genre=data.get('genre'),
+    )
+    if spotify_uri is None:
+        genre = data.get('genre')
+        socket_io.emit('msg', "Could not find a random song" + (f" of genre '{genre}'" if genre else ""))
+        return
     socket_io.emit(
         "play song",
-        data=dict(spotify_uri=music_api.get_random_song()),
+        data=dict(spotify_uri=spotify_uri),
     )
 
 
@@ -1,7 +1,20 @@
-import random
+import os
 import sqlite3
+import threading
 from contextlib import closing
 
+from knowledge_base.batch_writer import BatchWriter
+from knowledge_base.connection_pool import ConnectionPool
+from knowledge_base.feature_store import SongFeatureStore
+from knowledge_base.fuzzy import FuzzyNameMatcher
+from knowledge_base.similarity import SongSimilarityEngine
+from knowledge_base.graph import SemanticNetworkSnapshot
+from knowledge_base.metrics import metrics
+from knowledge_base.name_index import NameIndex
+from knowledge_base.sampler import SongSampler
+from knowledge_base.storage import get_storage_profile
+from knowledge_base.text import normalize_name
+
 
 class KnowledgeBaseAPI:
     """
@@ -10,8 +23,38 @@ class KnowledgeBaseAPI:
     components.
     """
 
-    def __init__(self, dbName):
+    def __init__(self, dbName, pool_size=8, use_graph_snapshot=False, use_feature_store=False, storage_profile="default"):
+        """
+        Params:
+            dbName (str): path to SQLite database file.
+            pool_size (int): max number of DB connections kept open for reuse;
+                0 opens a new connection for every query.
+            use_graph_snapshot (bool): if True, graph traversals (related entities,
+                songs by artist, genres) are answered from an in-memory copy of the
+                semantic network, which is reloaded after writes.
+            use_feature_store (bool): if True, songs are compared by their audio features
+                using an in-memory matrix of all songs' features, which is reloaded after writes.
+            storage_profile (str or StorageProfile): how the DB is opened e.g. "wal" for
+                writers whose readers should not wait on them, "read_only" for serving;
+                see knowledge_base/storage.py:STORAGE_PROFILES.
+        """
         self.dbName = dbName
+        self.storage_profile = get_storage_profile(storage_profile)
+        self.pool = ConnectionPool(dbName, max_size=pool_size, storage_profile=self.storage_profile)
+        self.use_graph_snapshot = use_graph_snapshot
+        self.use_feature_store = use_feature_store
+        # in-memory copies of the DB, keyed by their type e.g. {SongFeatureStore: <SongFeatureStore>}
+        self._snapshots = dict()
+        self._snapshots_lock = threading.Lock()
+        # incremented on every write so that snapshots loaded concurrently with a write are not kept
+        self._write_count = 0
+        self._write_lock = threading.Lock()
+        self._write_listeners = []
+        # version of the DB that snapshots were loaded from, to tell when another
+        # process (e.g. a refresh from Spotify) has written to it; see check_for_changes
+        self._data_version = None
+        self._data_version_con = None
+        self._data_version_lock = threading.Lock()
         self.approved_relations = dict(
             similarity="similar to",
             genre="of genre",
@@ -25,17 +68,18 @@ class KnowledgeBaseAPI:
 
         LESS_COMP = lambda val1, val2: val1 < val2
         MORE_COMP = lambda val1, val2: val1 > val2
+        # descending: whether songs that the adjective describes best have the highest values
         self.SONG_ADJECTIVES = dict([
-            ("more acoustic", dict(name='acousticness', comparison=MORE_COMP)),
-            ("less acoustic", dict(name='acousticness', comparison=LESS_COMP)),
-            ("more popular", dict(name="popularity", comparison=MORE_COMP)),
-            ("less popular", dict(name="popularity", comparison=LESS_COMP)),
-            ("more happy", dict(name="valence", comparison=MORE_COMP)),
-            ("less happy", dict(name="valence", comparison=LESS_COMP)),
-            ("more dancey", dict(name="danceability", comparison=MORE_COMP)),
-            ("less dancey", dict(name="danceability", comparison=LESS_COMP)),
-            ("more long", dict(name="duration_ms", comparison=MORE_COMP)),
-            ("less long", dict(name="duration_ms", comparison=LESS_COMP)),
+            ("more acoustic", dict(name='acousticness', comparison=MORE_COMP, descending=True)),
+            ("less acoustic", dict(name='acousticness', comparison=LESS_COMP, descending=False)),
+            ("more popular", dict(name="popularity", comparison=MORE_COMP, descending=True)),
+            ("less popular", dict(name="popularity", comparison=LESS_COMP, descending=False)),
+            ("more happy", dict(name="valence", comparison=MORE_COMP, descending=True)),
+            ("less happy", dict(name="valence", comparison=LESS_COMP, descending=False)),
+            ("more dancey", dict(name="danceability", comparison=MORE_COMP, descending=True)),
+            ("less dancey", dict(name="danceability", comparison=LESS_COMP, descending=False)),
+            ("more long", dict(name="duration_ms", comparison=MORE_COMP, descending=True)),
+            ("less long", dict(name="duration_ms", comparison=LESS_COMP, descending=False)),
         ])
 
     def _get_audio_feature_name(self, adjective):
@@ -83,13 +127,160 @@ class KnowledgeBaseAPI:
     def __str__(self):
         return "Knowledge Representation API object for {} DB.".format(self.dbName)
 
-    @property
-    def connection(self):
-        conn = sqlite3.connect(self.dbName)
-        # enable foreign key constraints
-        conn.execute("PRAGMA foreign_keys = 1")
-        return conn
+    def close(self):
+        """Closes all pooled DB connections."""
+        self.pool.close()
+        with self._data_version_lock:
+            if self._data_version_con is not None:
+                self._data_version_con.close()
+                self._data_version_con = None
+
+    def batch_writer(self, flush_size=10000):
+        """Returns a BatchWriter, for adding many entities in a single transaction.
+
+        E.g.
+            with kb_api.batch_writer() as writer:
+                writer.add_artist("Justin Bieber", genres=["pop"])
+                ...
+        """
+        return BatchWriter(self, flush_size=flush_size)
+
+    def _get_graph_snapshot(self):
+        """Returns in-memory semantic network, loading it if necessary.
+
+        Returns:
+            (SemanticNetworkSnapshot): None if snapshots are disabled.
+        """
+        if not self.use_graph_snapshot:
+            return None
+        return self._get_snapshot(SemanticNetworkSnapshot)
+
+    def _get_feature_store(self):
+        """Returns in-memory matrix of song features, loading it if necessary.
+
+        Returns:
+            (SongFeatureStore): None if feature store is disabled.
+        """
+        if not self.use_feature_store:
+            return None
+        return self._get_snapshot(SongFeatureStore)
+
+    def _get_name_index(self):
+        """Returns in-memory index of node IDs by normalized name, loading it if necessary.
+
+        Returns:
+            (NameIndex): None if it could not be loaded.
+        """
+        return self._get_snapshot(NameIndex)
+
+    def _get_snapshot(self, snapshot_cls):
+        """Returns in-memory copy of the DB of given type, loading it if necessary.
+
+        Params:
+            snapshot_cls (class): has a load(connection) class method e.g. SemanticNetworkSnapshot.
+
+        Returns:
+            (snapshot_cls instance): None if it could not be loaded.
+        """
+        snapshot = self._snapshots.get(snapshot_cls)
+        if snapshot is not None:
+            return snapshot
+
+        # only before loading, so that serving from snapshots costs no I/O; until callers
+        # check for changes again, snapshots are served even if the DB has since changed
+        self.check_for_changes()
+        with self._snapshots_lock:
+            snapshot = self._snapshots.get(snapshot_cls)
+            if snapshot is not None:
+                return snapshot
+            write_count = self._write_count
+            try:
+                with self.pool.connection() as con:
+                    snapshot = snapshot_cls.load(con)
+            except sqlite3.OperationalError as e:
+                print("ERROR: Could not load {}: {}".format(snapshot_cls.__name__, str(e)))
+                return None
+            if write_count == self._write_count:
+                self._snapshots[snapshot_cls] = snapshot
+            return snapshot
+
+    def add_write_listener(self, listener):
+        """Registers a function to be called (without arguments) after every write
+        through this object, or by another process (see check_for_changes), e.g. for
+        invalidating caches of query results.
+        """
+        self._write_listeners.append(listener)
+
+    def _get_data_version(self):
+        """Returns a value that changes whenever the DB is written to by another connection.
+
+        That is SQLite's data_version, read on a connection of its own, which sees
+        commits by every other connection, including pooled ones. Immutable DBs are read
+        without locking, so SQLite cannot tell that they changed; the file's modification
+        time and size are used instead.
+        """
+        if self.storage_profile.immutable:
+            stat = os.stat(self.dbName)
+            return (stat.st_mtime_ns, stat.st_size)
+        with self._data_version_lock:
+            if self._data_version_con is None:
+                database, uri = self.storage_profile.get_database(self.dbName)
+                # neither pooled nor instrumented: it only ever runs this PRAGMA
+                self._data_version_con = sqlite3.connect(database, uri=uri, check_same_thread=False)
+            # fetching every row ends the statement, so that no read lock is held onto
+            return self._data_version_con.execute("PRAGMA data_version;").fetchall()[0][0]
+
+    def check_for_changes(self):
+        """Discards in-memory copies of the DB, and notifies write listeners, if the DB
+        was written to by another process (e.g. scripts/create_new_db.py --refresh)
+        since they were loaded.
+
+        Snapshots are not checked each time they are used, which would cost a query per
+        lookup; long-lived callers (e.g. the server) should call this once per request,
+        before using this object or caches of its results.
+
+        Returns:
+            (bool): True if the DB changed.
+        """
+        try:
+            data_version = self._get_data_version()
+        except (sqlite3.Error, OSError) as e:
+            print("WARN: Could not check '{}' for changes: {}".format(self.dbName, str(e)))
+            return False
+        if self._data_version is None:
+            self._data_version = data_version
+        if data_version == self._data_version:
+            return False
+        print("Knowledge base '{}' changed; discarding in-memory copies.".format(self.dbName))
+        self._invalidate_snapshots()
+        return True
+
+    def _invalidate_snapshots(self, added_nodes=None):
+        """Discards in-memory copies of the DB and notifies write listeners; to be called after every write.
 
+        Params:
+            added_nodes (list of tuples): (name, type, ID) of each node added by the write, if
+                that is all it changed about nodes, so that the name index is kept up to date
+                instead of reloaded; None if nodes may have changed otherwise (e.g. a batch write).
+        """
+        with self._write_lock:
+            name_index = self._snapshots.get(NameIndex)
+            self._write_count += 1
+            self._snapshots = dict()
+            if name_index is not None and added_nodes is not None:
+                for name, node_type, node_id in added_nodes:
+                    name_index.add(normalize_name(name), node_type, node_id)
+                self._snapshots[NameIndex] = name_index
+            # so that this write is not mistaken for another process's; one committed by
+            # another process at the same moment is only noticed with its next write
+            try:
+                self._data_version = self._get_data_version()
+            except (sqlite3.Error, OSError):
+                self._data_version = None
+        for listener in self._write_listeners:
+            listener()
+
+    @metrics.timed
     def songs_are_related(self, song1_id, song2_id, rel_str):
         """Determines whether any two given songs are related in the way described.
 
@@ -121,18 +312,17 @@ class KnowledgeBaseAPI:
             print(f"ERROR: could not find feature name for relationship: '{rel_str}'")
             return False
 
-        song1_data = self.get_song_data(song_id=song1_id)
-        song2_data = self.get_song_data(song_id=song2_id)
+        songs_by_id = {x["id"]: x for x in self.get_songs_by_ids([song1_id, song2_id])}
 
-        if len(song1_data) == 0:
+        if song1_id not in songs_by_id:
             print(f"ERROR: Could not find song with id={song1_id}")
             return False
-        if len(song2_data) == 0:
+        if song2_id not in songs_by_id:
             print(f"ERROR: Could not find song with id={song2_id}")
             return False
 
-        song1_val = song1_data[0].get(feature_name)
-        song2_val = song2_data[0].get(feature_name)
+        song1_val = songs_by_id[song1_id].get(feature_name)
+        song2_val = songs_by_id[song2_id].get(feature_name)
 
         if song1_val is None:
             print(f"ERROR: could not find '{feature_name}' value for song with id={song1_id}")
@@ -142,6 +332,128 @@ class KnowledgeBaseAPI:
             return False
         return compare_func(song1_val, song2_val)
 
+    @metrics.timed
+    def filter_related_songs(self, candidate_song_ids, song_id, rel_str):
+        """Finds which of the candidate songs are related to the given song in the way described.
+
+        Equivalent to calling songs_are_related(candidate_id, song_id, rel_str) for every
+        candidate, but makes a single vectorized comparison if the feature store is enabled.
+
+        E.g. Finds which of the candidates are 'more acoustic' than 'bad idea'.
+
+        Params:
+            candidate_song_ids (list of ints): IDs of candidate songs' nodes in semantic network.
+            song_id (int): ID of song's node in semantic network.
+            rel_str (string): e.g. "more acoustic", "less happy".
+
+        Returns:
+            (list of ints): IDs of candidates related to given song as described, in given order.
+                Empty if relationship is not recognized.
+        """
+        if rel_str not in self.SONG_ADJECTIVES.keys():
+            print(f"ERROR: relationship '{rel_str}' is not recognized.")
+            return []
+
+        feature_store = self._get_feature_store()
+        if feature_store is None:
+            return [
+                candidate_id for candidate_id in candidate_song_ids
+                if self.songs_are_related(candidate_id, song_id, rel_str)
+            ]
+
+        return feature_store.filter_related(
+            candidate_song_ids,
+            song_id,
+            self._get_audio_feature_name(rel_str),
+            self._get_comparison_func(rel_str),
+        )
+
+    @metrics.timed
+    def get_ranked_related_songs(self, song_id, rel_str, candidate_song_ids=None, k=None):
+        """Finds songs related to the given song in the way described, ranked by how well
+        the description fits them.
+
+        Uses the in-memory feature store (loading it if necessary, even if use_feature_store
+        is False), where songs are already sorted by each audio feature.
+
+        E.g. Finds the 10 most danceable songs by related artists that are 'more dancey' than 'bad idea'.
+
+        Params:
+            song_id (int): ID of song's node in semantic network.
+            rel_str (string): e.g. "more acoustic", "less happy".
+            candidate_song_ids (list of ints): if given, only these songs are considered;
+                otherwise, all songs are.
+            k (int): max number of songs returned; None for all.
+
+        Returns:
+            (list of ints): IDs of songs related to given song as described, e.g. most acoustic
+                first for "more acoustic". Empty if relationship is not recognized.
+        """
+        if rel_str not in self.SONG_ADJECTIVES.keys():
+            print(f"ERROR: relationship '{rel_str}' is not recognized.")
+            return []
+
+        feature_store = self._get_snapshot(SongFeatureStore)
+        if feature_store is None:
+            return []
+
+        return feature_store.get_ranked(
+            song_id,
+            self._get_audio_feature_name(rel_str),
+            self.SONG_ADJECTIVES[rel_str]["descending"],
+            candidate_ids=candidate_song_ids,
+            k=k,
+        )
+
+    @metrics.timed
+    def get_similar_songs(self, song_id, k=10):
+        """Finds the songs that sound most like the given song, by their audio features.
+
+        Uses an in-memory SongSimilarityEngine, which is loaded on first use and reloaded after writes.
+
+        Params:
+            song_id (int): ID of song's node in semantic network.
+            k (int): max number of songs returned.
+
+        Returns:
+            (list of ints): IDs of similar songs, most similar first.
+                Empty if the song is unknown or has no audio features.
+        """
+        engine = self._get_snapshot(SongSimilarityEngine)
+        if engine is None:
+            return []
+        return [similar_song_id for similar_song_id, _ in engine.get_similar(song_id, k)]
+
+    @metrics.timed
+    def find_similar_names(self, name, entity_type=None, limit=5, min_score=0.5):
+        """Finds the entities whose names are closest to the given, possibly misspelled, name.
+
+        Names are compared without e.g. "(Remix)" or "- Live", so "Sorry (Remix) - Live"
+        finds "Sorry". Uses an in-memory FuzzyNameMatcher, which is loaded on first use
+        and reloaded after writes.
+
+        Params:
+            name (str): e.g. "Sorry (Remix) - Live", "beyonse".
+            entity_type (str): e.g. "song", "artist"; if omitted, entities of any type are matched.
+            limit (int): max number of matches.
+            min_score (float): matches scoring lower (in [0,1] range) are left out.
+
+        Returns:
+            (list of dicts): each with keys "id", "name", "type", "score", best match first.
+                Empty if no name is close enough.
+        """
+        if entity_type is not None and not self._is_valid_entity_type(entity_type):
+            print("ERROR: Given entity type '{0}' is invalid.".format(entity_type))
+            return []
+        matcher = self._get_snapshot(FuzzyNameMatcher)
+        if matcher is None:
+            return []
+        return [
+            dict(id=node_id, name=node_name, type=node_type, score=score)
+            for node_id, node_name, node_type, score in matcher.match(name, entity_type, limit, min_score)
+        ]
+
+    @metrics.timed
     def get_related_entities(self, entity_name, rel_str="similar to"):
         """Finds all entities connected to the given entity in the semantic network.
 
@@ -164,8 +476,22 @@ class KnowledgeBaseAPI:
         if rel_str not in self.approved_relations.values():
             print("WARN: querying for invalid relations. Only allow: {}".format(self.approved_relations))
 
+        graph = self._get_graph_snapshot()
+        if graph is not None:
+            return graph.get_related_names(entity_name, rel_str)
+
+        name_index = self._get_name_index()
+        if name_index is None:
+            return []
+        source_ids = [
+            node_id for node_ids in name_index.get_ids_by_type(normalize_name(entity_name)).values()
+            for node_id in node_ids
+        ]
+        if source_ids == []:
+            return []
+
         try:
-            with closing(self.connection) as con:
+            with self.pool.connection() as con:
                 # Auto-commit
                 with con:
                     with closing(con.cursor()) as cursor:
@@ -175,10 +501,10 @@ class KnowledgeBaseAPI:
                             FROM nodes
                             WHERE id IN (
                                 SELECT dest
-                                FROM edges JOIN nodes ON source == id
-                                WHERE name LIKE (?) AND rel == (?)
+                                FROM edges
+                                WHERE source IN ({}) AND rel == (?)
                             );
-                        """, (entity_name, rel_str))
+                        """.format(", ".join("?" * len(source_ids))), (*source_ids, rel_str))
                         # [("Justin Timberlake",), ("Shawn Mendes",)] => ["Justin Timberlake", "Shawn Mendes"]
                         return [x[0] for x in cursor.fetchall()]
 
@@ -186,17 +512,18 @@ class KnowledgeBaseAPI:
             print("ERROR: Could not find entities similar to entity with name '{}': {}".format(entity_name, str(e)))
             return []
 
+    @metrics.timed
     def get_all_song_names(self):
         """Gets all song names from database.
 
-        TODO: this is not scalable. Support paging or something.
+        NOTE: reads every name into memory at once; use iter_song_names for large catalogs.
 
         Returns:
             (list of str): song names.
         """
         try:
-            # Auto-close
-            with closing(self.connection) as con:
+            # Auto-release (back to pool).
+            with self.pool.connection() as con:
                 # Auto-commit
                 with con:
                     # Auto-close
@@ -211,6 +538,21 @@ class KnowledgeBaseAPI:
             print("ERROR: Could not retrieve songs: {}".format(str(e)))
         return []
 
+    def iter_song_names(self, batch_size=1000, shard=0, num_shards=1):
+        """Generates song names, in order of ID, a page at a time.
+
+        Params:
+            batch_size (int): number of names read per query.
+            shard (int): in [0, num_shards) range; which part of the songs to generate.
+            num_shards (int): number of equal ranges of IDs the songs are split into.
+
+        Returns:
+            (generator of str): song names.
+        """
+        for _, name in self._iter_nodes("song", batch_size, shard, num_shards):
+            yield name
+
+    @metrics.timed
     def get_song_data(self, song_name=None, song_id=None):
         """Gets all songs that match given name, along with their artists.
 
@@ -249,45 +591,74 @@ class KnowledgeBaseAPI:
         if song_name is None and song_id is None:
             print("ERROR: Require one of song name and song ID to retrieve song data.")
             return []
-        elif song_name is None:
-            song_name = "%" # match any string
+        elif song_id is not None:
+            return [
+                x for x in self.get_songs_by_ids([song_id])
+                if song_name is None or normalize_name(x["song_name"]) == normalize_name(song_name)
+            ]
+
+        name_index = self._get_name_index()
+        if name_index is None:
+            return []
+        return self.get_songs_by_ids(name_index.get_ids(normalize_name(song_name), "song"))
+
+    # max number of IDs bound to a single query; SQLite allows at most 999 parameters by default
+    _MAX_IDS_PER_QUERY = 500
 
+    @metrics.timed
+    def get_songs_by_ids(self, song_ids):
+        """Gets data of the songs with the given IDs, along with their artists.
+
+        Songs are looked up by primary key, so each lookup costs O(log n).
+
+        Params:
+            song_ids (list of ints): IDs of songs in semantic network e.g. [10, 14].
+
+        Returns:
+            (list of dicts): same as get_song_data(), in order of given IDs;
+                unknown IDs are skipped. Empty if none found or error.
+        """
+        unique_ids = list(dict.fromkeys(song_ids))
+        songs_by_id = dict()
         try:
-            # Auto-close.
-            with closing(self.connection) as con:
-                # Auto-commit
+            with self.pool.connection() as con:
                 with con:
-                    # Auto-close.
                     with closing(con.cursor()) as cursor:
-                        cursor.execute("""
-                            SELECT
-                                song.name, artist.name, song.duration_ms, song.popularity,
-                                song.id, song.spotify_uri, song.acousticness, song.danceability,
-                                song.energy, song.instrumentalness, song.liveness, song.loudness,
-                                song.speechiness, song.valence, song.tempo, song.mode,
-                                song.musical_key, song.time_signature
-
-                            FROM (
-                                SELECT *
-                                FROM songs JOIN nodes ON node_id == id
-                                WHERE name LIKE (?)
-                            ) AS song JOIN nodes AS artist ON main_artist_id == artist.id;
-                        """, (song_name,))
-                        return [
-                            dict(
-                                song_name=x[0], artist_name=x[1], duration_ms=x[2], popularity=x[3],
-                                id=x[4], spotify_uri=x[5], acousticness=x[6], danceability=x[7],
-                                energy=x[8], instrumentalness=x[9], liveness=x[10], loudness=x[11],
-                                speechiness=x[12], valence=x[13], tempo=x[14], mode=x[15],
-                                musical_key=x[16], time_signature=x[17],
-                            ) for x in cursor.fetchall()
-                            if song_id is None or song_id == x[4]
-                        ]
+                        for i in range(0, len(unique_ids), self._MAX_IDS_PER_QUERY):
+                            chunk = unique_ids[i:i+self._MAX_IDS_PER_QUERY]
+                            cursor.execute("""
+                                SELECT
+                                    song.name, artist.name, songs.duration_ms, songs.popularity,
+                                    song.id, songs.spotify_uri, songs.acousticness, songs.danceability,
+                                    songs.energy, songs.instrumentalness, songs.liveness, songs.loudness,
+                                    songs.speechiness, songs.valence, songs.tempo, songs.mode,
+                                    songs.musical_key, songs.time_signature
+
+                                FROM nodes AS song
+                                    JOIN songs ON songs.node_id == song.id
+                                    JOIN nodes AS artist ON songs.main_artist_id == artist.id
+                                WHERE song.id IN ({});
+                            """.format(", ".join("?" * len(chunk))), chunk)
+                            for x in cursor.fetchall():
+                                songs_by_id[x[4]] = self._to_song_data(x)
 
         except sqlite3.OperationalError as e:
-            print("ERROR: Could not retrieve data for song with name '{}': {}".format(song_name, str(e)))
+            print("ERROR: Could not retrieve data for songs with IDs {}: {}".format(song_ids, str(e)))
             return []
 
+        return [songs_by_id[x] for x in song_ids if x in songs_by_id]
+
+    def _to_song_data(self, x):
+        "Packs a row of song columns (in the order selected by get_song_data) into a dict."
+        return dict(
+            song_name=x[0], artist_name=x[1], duration_ms=x[2], popularity=x[3],
+            id=x[4], spotify_uri=x[5], acousticness=x[6], danceability=x[7],
+            energy=x[8], instrumentalness=x[9], liveness=x[10], loudness=x[11],
+            speechiness=x[12], valence=x[13], tempo=x[14], mode=x[15],
+            musical_key=x[16], time_signature=x[17],
+        )
+
+    @metrics.timed
     def get_artist_data(self, artist_name):
         """Get artist info.
 
@@ -303,9 +674,16 @@ class KnowledgeBaseAPI:
                     name="Justin Bieber",
                 }, ...]
         """
+        name_index = self._get_name_index()
+        if name_index is None:
+            return []
+        artist_ids = name_index.get_ids(normalize_name(artist_name), "artist")
+        if artist_ids == []:
+            return []
+
         try:
-            # Auto-close.
-            with closing(self.connection) as con:
+            # Auto-release (back to pool).
+            with self.pool.connection() as con:
                 # Auto-commit
                 with con:
                     # Auto-close.
@@ -313,8 +691,8 @@ class KnowledgeBaseAPI:
                         cursor.execute("""
                             SELECT id, name, num_spotify_followers
                             FROM artists JOIN nodes ON node_id == id
-                            WHERE name LIKE (?);
-                        """, (artist_name,))
+                            WHERE node_id IN ({});
+                        """.format(", ".join("?" * len(artist_ids))), artist_ids)
                         res_tuples = cursor.fetchall()
 
         except sqlite3.OperationalError as e:
@@ -331,6 +709,7 @@ class KnowledgeBaseAPI:
             ))
         return results
 
+    @metrics.timed
     def get_all_artist_names(self):
         """Get artist names.
 
@@ -338,8 +717,8 @@ class KnowledgeBaseAPI:
             (list of str): artist names.
         """
         try:
-            # Auto-close.
-            with closing(self.connection) as con:
+            # Auto-release (back to pool).
+            with self.pool.connection() as con:
                 # Auto-commit
                 with con:
                     # Auto-close.
@@ -355,6 +734,107 @@ class KnowledgeBaseAPI:
             print("ERROR: Could not retrieve artist data: {}".format(str(e)))
         return []
 
+    def iter_artists(self, batch_size=1000, shard=0, num_shards=1):
+        """Generates artist names, in order of ID, a page at a time.
+
+        Params:
+            batch_size (int): number of names read per query.
+            shard (int): in [0, num_shards) range; which part of the artists to generate.
+            num_shards (int): number of equal ranges of IDs the artists are split into.
+
+        Returns:
+            (generator of str): artist names.
+        """
+        for _, name in self._iter_nodes("artist", batch_size, shard, num_shards):
+            yield name
+
+    def _iter_nodes(self, node_type, batch_size, shard, num_shards):
+        """Generates nodes of given type by keyset pagination: each page is read by a
+        separate query, starting after the last ID of the page before, so that memory
+        does not grow with the number of nodes, and no connection is held in between.
+
+        Returns:
+            (generator of tuples): (node ID, name) of each node.
+        """
+        try:
+            with self.pool.connection() as con:
+                with con:
+                    with closing(con.cursor()) as cursor:
+                        cursor.execute("""
+                            SELECT MIN(id), MAX(id)
+                            FROM nodes
+                            WHERE type = (?);
+                        """, (node_type,))
+                        min_id, max_id = cursor.fetchone()
+            if min_id is None:
+                return
+
+            # IDs in [start, end) belong to this shard
+            shard_size = (max_id - min_id + num_shards) // num_shards
+            last_id, end = min_id + shard * shard_size - 1, min(min_id + (shard + 1) * shard_size, max_id + 1)
+            while last_id < end - 1:
+                with self.pool.connection() as con:
+                    with con:
+                        with closing(con.cursor()) as cursor:
+                            cursor.execute("""
+                                SELECT id, name
+                                FROM nodes
+                                WHERE type = (?) AND id > (?) AND id < (?)
+                                ORDER BY id
+                                LIMIT (?);
+                            """, (node_type, last_id, end, batch_size))
+                            page = cursor.fetchall()
+                if len(page) == 0:
+                    return
+                yield from page
+                last_id = page[-1][0]
+
+        except sqlite3.OperationalError as e:
+            print("ERROR: Could not retrieve {} nodes: {}".format(node_type, str(e)))
+
+    @metrics.timed
+    def get_stale_artists(self, fetched_before, limit=None):
+        """Finds artists whose data was last fetched (e.g. from Spotify) before given time, or never.
+
+        Params:
+            fetched_before (int): Unix time in seconds.
+            limit (int): max number of artists to return; None for all of them.
+
+        Returns:
+            (list of tuples): (node ID, name, Spotify ID) of each stale artist, least recently
+                fetched first. Spotify ID is None if unknown.
+                e.g. [(1, "Justin Bieber", "1uNFoZAHBGtllmzznpCI3s"), ...]
+        """
+        try:
+            with self.pool.connection() as con:
+                with con:
+                    with closing(con.cursor()) as cursor:
+                        # two queries, so that each can be answered from the index on last_fetched_at
+                        limit = -1 if limit is None else limit
+                        cursor.execute("""
+                            SELECT artists.node_id, nodes.name, artists.spotify_id
+                            FROM artists JOIN nodes ON nodes.id == artists.node_id
+                            WHERE artists.last_fetched_at IS NULL
+                            LIMIT (?);
+                        """, (limit,))
+                        stale_artists = cursor.fetchall()
+                        if limit >= 0 and len(stale_artists) >= limit:
+                            return stale_artists
+
+                        cursor.execute("""
+                            SELECT artists.node_id, nodes.name, artists.spotify_id
+                            FROM artists JOIN nodes ON nodes.id == artists.node_id
+                            WHERE artists.last_fetched_at < (?)
+                            ORDER BY artists.last_fetched_at
+                            LIMIT (?);
+                        """, (fetched_before, limit - len(stale_artists) if limit >= 0 else -1))
+                        return stale_artists + cursor.fetchall()
+
+        except sqlite3.OperationalError as e:
+            print("ERROR: Could not retrieve stale artists: {}".format(str(e)))
+        return []
+
+    @metrics.timed
     def get_songs_by_artist(self, artist):
         """Retrieves list of songs for given artist.
 
@@ -366,7 +846,12 @@ class KnowledgeBaseAPI:
                 Empty if artist is ambiguous or not found.
                 e.g. [{"song_name": "Despacito", "id": 1}, {"song_name": "Sorry", "id":2}]
         """
-        matching_artist_node_ids = self._get_matching_node_ids(artist)
+        graph = self._get_graph_snapshot()
+        if graph is not None:
+            matching_artist_node_ids = graph.get_node_ids(artist)
+        else:
+            matching_artist_node_ids = self._get_matching_node_ids(artist)
+
         if len(matching_artist_node_ids) == 0:
             print("ERROR: could not find entry for artist '{}'".format(artist))
             return []
@@ -376,8 +861,12 @@ class KnowledgeBaseAPI:
             return []
 
         artist_node_id = matching_artist_node_ids[0]
+        graph = self._get_graph_snapshot()
+        if graph is not None:
+            return graph.get_songs_by_artist_id(artist_node_id)
+
         try:
-            with closing(self.connection) as con:
+            with self.pool.connection() as con:
                 with con:
                     with closing(con.cursor()) as cursor:
                         cursor.execute("""
@@ -397,46 +886,67 @@ class KnowledgeBaseAPI:
                 artist))
             return []
 
-    def get_random_song(self):
-        """Returns Spotify URI for random song (or None)"""
-        songs = self.get_all_song_names()
-        song_name = songs[random.randrange(len(songs))]
-        hits = self.get_song_data(song_name=song_name)
-        if len(hits) == 0:
-            # Just return Oops! I did it again by Britney
-            return 'spotify:track:6naxalmIoLFWR0siv8dnQQ'
-        else:
-            return hits[0].get('spotify_uri')
+    @metrics.timed
+    def get_random_song(self, weighted_by_popularity=False, genre=None):
+        """Picks a random song, in constant time regardless of the number of songs.
 
-    def get_node_ids_by_entity_type(self, entity_name):
-        """Retrieves and organizes IDs of all nodes that match given entity name.
+        Uses an in-memory SongSampler, which is loaded on first use and reloaded after writes.
 
-        Return:
-            (dict): key=entity_types of all nodes with the given name, val=list of int IDs. Empty if no matches.
-                e.g. {"artist": [1, 2], "song": [5,7]}
+        Params:
+            weighted_by_popularity (bool): if True, popular songs are picked more often.
+            genre (str): e.g. "pop"; if given, only songs whose main artist is of that genre are picked.
+
+        Returns:
+            (str): Spotify URI of song; None if there is no song of given genre.
         """
+        genre_id = None
+        if genre is not None:
+            genre_ids = self.get_node_ids_by_entity_type(genre) or dict()
+            if "genre" not in genre_ids:
+                print(f"ERROR: Could not find genre '{genre}'.")
+                return None
+            genre_id = genre_ids["genre"][0]
+
+        sampler = self._get_snapshot(SongSampler)
+        song_id = None if sampler is None else sampler.sample(weighted_by_popularity, genre_id)
+        if song_id is None:
+            if genre is not None:
+                print(f"WARN: Found no songs of genre '{genre}'.")
+                return None
+            # Just return Oops! I did it again by Britney
+            return 'spotify:track:6naxalmIoLFWR0siv8dnQQ'
+
         try:
-            with closing(self.connection) as con:
+            with self.pool.connection() as con:
                 with con:
                     with closing(con.cursor()) as cursor:
                         cursor.execute("""
-                            SELECT type, id
-                            FROM nodes
-                            WHERE name == (?)
-                        """, (entity_name,))
-                        node_ids_by_type = dict()
-                        for x in cursor.fetchall():
-                            ids = node_ids_by_type.setdefault(x[0], [])
-                            ids.append(x[1])
-                            node_ids_by_type[x[0]] = ids
-                        return node_ids_by_type
+                            SELECT spotify_uri FROM songs WHERE node_id = (?);
+                        """, (song_id,))
+                        res = cursor.fetchone()
+                        return None if res is None else res[0]
 
         except sqlite3.OperationalError as e:
-            print("ERROR: Could not retrieve ids for entity with name '{}': {}".format(entity_name, str(e)))
+            print("ERROR: Could not retrieve Spotify URI of song with id={}: {}".format(song_id, str(e)))
             return None
 
+    @metrics.timed
+    def get_node_ids_by_entity_type(self, entity_name):
+        """Retrieves and organizes IDs of all nodes that match given entity name,
+        ignoring case, accents, and extra whitespace (see text.normalize_name).
+
+        Return:
+            (dict): key=entity_types of all nodes with the given name, val=list of int IDs. Empty if no matches.
+                e.g. {"artist": [1, 2], "song": [5,7]}
+        """
+        name_index = self._get_name_index()
+        if name_index is None:
+            return None
+        return name_index.get_ids_by_type(normalize_name(entity_name))
+
     def _get_matching_node_ids(self, node_name):
-        """Retrieves IDs of all nodes matching the given name.
+        """Retrieves IDs of all nodes matching the given name, ignoring case, accents,
+        and extra whitespace (see text.normalize_name).
 
         Params:
             node_name (string): name of entity node. E.g. "Justin Bieber".
@@ -444,20 +954,13 @@ class KnowledgeBaseAPI:
         Returns:
             (list of ints): ids of nodes corresponding to given name; empty if none found.
         """
-        try:
-            with closing(self.connection) as con:
-                with con:
-                    with closing(con.cursor()) as cursor:
-                        cursor.execute("""
-                            SELECT id
-                            FROM nodes
-                            WHERE name LIKE (?)
-                        """, (node_name,))
-                        res = cursor.fetchall()
-
-        except sqlite3.OperationalError as e:
-            print("ERROR: An error occurred when retrieving node ids: {}".format(e))
-
+        name_index = self._get_name_index()
+        if name_index is None:
+            return []
+        res = sorted(
+            node_id for node_ids in name_index.get_ids_by_type(normalize_name(node_name)).values()
+            for node_id in node_ids
+        )
         if len(res) == 0:
             print("ERROR: Could not find node ID for name '{0}'.".format(node_name))
             return []
@@ -465,9 +968,9 @@ class KnowledgeBaseAPI:
         elif len(res) > 1:
             print("Found multiple node IDs for name '{0}', returning first result.".format(node_name))
 
-        # e.g. [(10,), (11,)] => [10, 11]
-        return [x[0] for x in res]
+        return res
 
+    @metrics.timed
     def connect_entities(self, source_node_name, dest_node_name, rel_str, score):
         """Inserts edge row into edges table.
 
@@ -503,7 +1006,7 @@ class KnowledgeBaseAPI:
         source_node_id, dest_node_id = matching_src_nodes[0], matching_dst_nodes[0]
 
         try:
-            with closing(self.connection) as conn:
+            with self.pool.connection() as conn:
                 with conn:
                     with closing(conn.cursor()) as cursor:
                         cursor.execute("""
@@ -521,6 +1024,52 @@ class KnowledgeBaseAPI:
                 source_node_name, dest_node_name, str(e)))
             return False
 
+        self._invalidate_snapshots(added_nodes=[])
+        return True
+
+    @metrics.timed
+    def replace_edges(self, rel_str, edges_by_source):
+        """Replaces all edges of given relation from each given node, in a single transaction.
+
+        E.g. for storing the songs most similar to each song, computed by a batch job,
+        without keeping similarities from an earlier run.
+
+        Params:
+            rel_str (string): e.g. "similar to".
+            edges_by_source (dict): key is ID of source node, val is list of (dest node ID, score)
+                where score must be in [0,100] range. E.g. {10: [(11, 95.5), (14, 80)]}.
+
+        Returns:
+            (bool): False if error occurred (and nothing was replaced), True otherwise.
+        """
+        if rel_str not in self.approved_relations.values():
+            print("WARN: adding unapproved relation. Only allow: {}".format(self.approved_relations))
+
+        try:
+            with self.pool.connection() as conn:
+                with conn:
+                    with closing(conn.cursor()) as cursor:
+                        cursor.executemany("""
+                            DELETE FROM edges WHERE source = (?) AND rel = (?);
+                        """, ((source_id, rel_str) for source_id in edges_by_source))
+                        cursor.executemany("""
+                            INSERT INTO edges (source, dest, rel, score)
+                            VALUES (?, ?, ?, ?);
+                        """, (
+                            (source_id, dest_id, rel_str, score)
+                            for source_id, edges in edges_by_source.items()
+                            for dest_id, score in edges
+                        ))
+
+        except sqlite3.OperationalError as e:
+            print("ERROR: Could not replace '{}' edges: {}".format(rel_str, str(e)))
+            return False
+
+        except sqlite3.IntegrityError as e:
+            print("ERROR: Could not replace '{}' edges due to schema constraints: {}".format(rel_str, str(e)))
+            return False
+
+        self._invalidate_snapshots(added_nodes=[])
         return True
 
     def _is_valid_entity_type(self, entity_type):
@@ -532,7 +1081,8 @@ class KnowledgeBaseAPI:
         """
         return entity_type in ["artist", "song", "genre"]
 
-    def add_artist(self, name, genres=[], num_spotify_followers=None):
+    @metrics.timed
+    def add_artist(self, name, genres=[], num_spotify_followers=None, spotify_id=None):
         """Inserts given values into two tables: artists and nodes.
 
         Ensures that:
@@ -543,6 +1093,7 @@ class KnowledgeBaseAPI:
             name (string): e.g. "Justin Bieber"
             genres (list): e.g. ['indie r&b', 'malaysian indie']
             num_spotify_followers (int): number of Spotify followers.
+            spotify_id (str): e.g. "1uNFoZAHBGtllmzznpCI3s".
 
         Returns:
             (int): node_id corresponding to given artist if added or already existed; None otherwise.
@@ -558,12 +1109,12 @@ class KnowledgeBaseAPI:
             return None
 
         try:
-            with closing(self.connection) as con:
+            with self.pool.connection() as con:
                 with con:
                     with closing(con.cursor()) as cursor:
                         cursor.execute("""
-                            INSERT INTO artists (node_id, num_spotify_followers) VALUES (?, ?);
-                        """, (node_id, num_spotify_followers))
+                            INSERT INTO artists (node_id, num_spotify_followers, spotify_id) VALUES (?, ?, ?);
+                        """, (node_id, num_spotify_followers, spotify_id))
 
         except sqlite3.OperationalError as e:
             print("ERROR: Could not add artist '{0}'".format(
@@ -575,6 +1126,7 @@ class KnowledgeBaseAPI:
                 .format(name, str(e)))
             return None
 
+        self._invalidate_snapshots(added_nodes=[])
         for genre in genres:
             if self.add_genre(genre) is not None:
                 genre_rel_str = self.approved_relations["genre"]
@@ -586,6 +1138,7 @@ class KnowledgeBaseAPI:
 
         return node_id
 
+    @metrics.timed
     def add_song(
         self,
         name,
@@ -628,7 +1181,7 @@ class KnowledgeBaseAPI:
 
         existing_songs = self.get_song_data(name)
         for tmp_song in existing_songs:
-            if tmp_song["artist_name"] == artist:
+            if normalize_name(tmp_song["artist_name"]) == normalize_name(artist):
                 print("WARN: Song '{}' by artist '{}' already exists in semantic network. Aborting insertion.".format(name, artist))
                 return None
 
@@ -649,7 +1202,7 @@ class KnowledgeBaseAPI:
                     is not recognized.")
 
         try:
-            with closing(self.connection) as con:
+            with self.pool.connection() as con:
                 with con:
                     with closing(con.cursor()) as cursor:
                         x = audio_features
@@ -682,8 +1235,10 @@ class KnowledgeBaseAPI:
                 .format(name, artist, str(e)))
             return None
 
+        self._invalidate_snapshots(added_nodes=[])
         return node_id
 
+    @metrics.timed
     def add_genre(self, name):
         """Adds given value into two tables: genres and nodes.
 
@@ -705,7 +1260,7 @@ class KnowledgeBaseAPI:
             return None
 
         try:
-            with closing(self.connection) as con:
+            with self.pool.connection() as con:
                 with con:
                     with closing(con.cursor()) as cursor:
                         cursor.execute("""
@@ -721,6 +1276,8 @@ class KnowledgeBaseAPI:
             print("ERROR: Could not add genre '{}' due to schema constraints: {}"
                 .format(name, str(e)))
             return None
+
+        self._invalidate_snapshots(added_nodes=[])
         return node_id
 
     def _add_node(self, entity_name, entity_type):
@@ -741,15 +1298,16 @@ class KnowledgeBaseAPI:
             return None
 
         try:
-            with closing(self.connection) as con:
+            with self.pool.connection() as con:
                 with con:
                     with closing(con.cursor()) as cursor:
                         # NULL is passed so that SQLite assigns the auto-generated row_id value
                         # see:  - https://www.sqlite.org/autoinc.html
                         #       - https://stackoverflow.com/questions/7905859/is-there-an-auto-increment-in-sqlite
                         cursor.execute("""
-                            INSERT INTO nodes (name, type, id) VALUES (?, ?, NULL);
-                        """, (entity_name, entity_type,))
+                            INSERT INTO nodes (name, normalized_name, type, id) VALUES (?, ?, ?, NULL);
+                        """, (entity_name, normalize_name(entity_name), entity_type,))
+                        node_id = cursor.lastrowid
 
         except sqlite3.OperationalError as e:
             print("ERROR: Could not insert entity with name '{}' into nodes table: {}".format(entity_name, str(e)))
@@ -760,8 +1318,5 @@ class KnowledgeBaseAPI:
                 .format(entity_name, str(e)))
             return None
 
-        node_ids = self.get_node_ids_by_entity_type(entity_name).get(entity_type, [])
-
-        # NOTE: taking the max is a heuristic to disambiguate between multiplet matching ID:
-        # Since we _just_ inserted the node and its id is autogenerated, it must have the largest id.
-        return max(node_ids)
+        self._invalidate_snapshots(added_nodes=[(entity_name, entity_type, node_id)])
+        return node_id
@@ -0,0 +1,369 @@
+import sqlite3
+import time
+from contextlib import closing
+
+from knowledge_base.text import normalize_name
+
+
+class BatchWriter:
+    """Adds many artists, songs, genres, and edges to the knowledge base in a single transaction.
+
+    Meant for bulk ingestion (e.g. building a knowledge base from Spotify data),
+    where calling KnowledgeBaseAPI.add_artist, add_song, etc. once per entity costs
+    several lookups and a commit per call.
+
+    Instead, entities already in the DB are read once up front and new ones are
+    deduplicated in memory. Nodes are inserted as they are added so that their IDs
+    (from cursor.lastrowid) can be returned right away, while rows of the artists,
+    songs, genres, and edges tables are buffered and written with executemany().
+
+    Usage:
+        with kb_api.batch_writer() as writer:
+            artist_id = writer.add_artist("Justin Bieber", genres=["pop"])
+            writer.add_song("Despacito", "Justin Bieber", popularity=90)
+            writer.connect_entities(artist_id, writer.add_artist("Shawn Mendes"), "similar to", 100)
+
+    Everything is committed when the with-block exits, or rolled back if it raises.
+
+    Adding an artist or song that is already in the DB updates its metadata
+    (e.g. number of followers, popularity) instead, so that a batch can also
+    refresh an existing knowledge base.
+    """
+
+    INSERT_ARTIST_SQL = """
+        INSERT INTO artists (node_id, num_spotify_followers, spotify_id) VALUES (?, ?, ?);
+    """
+    INSERT_GENRE_SQL = """
+        INSERT INTO genres (node_id) VALUES (?);
+    """
+    INSERT_SONG_SQL = """
+        INSERT INTO songs (
+            main_artist_id, node_id, duration_ms, popularity, spotify_uri,
+            acousticness, danceability, energy, instrumentalness, liveness, mode,
+            loudness, speechiness, valence, tempo, musical_key, time_signature
+        )
+        VALUES (
+            ?, ?, ?, ?, ?,
+            ?, ?, ?, ?, ?, ?,
+            ?, ?, ?, ?, ?, ?
+        );
+    """
+    INSERT_EDGE_SQL = """
+        INSERT OR IGNORE INTO edges (source, dest, rel, score) VALUES (?, ?, ?, ?);
+    """
+    UPDATE_ARTIST_SQL = """
+        UPDATE artists
+        SET num_spotify_followers = coalesce(?, num_spotify_followers), spotify_id = coalesce(?, spotify_id)
+        WHERE node_id = (?);
+    """
+    UPDATE_ARTIST_FETCHED_SQL = """
+        UPDATE artists SET last_fetched_at = (?) WHERE node_id = (?);
+    """
+    UPDATE_SONG_SQL = """
+        UPDATE songs SET popularity = coalesce(?, popularity) WHERE node_id = (?);
+    """
+
+    def __init__(self, kb_api, flush_size=10000):
+        """
+        Params:
+            kb_api (KnowledgeBaseAPI): knowledge base to write to.
+            flush_size (int): number of buffered rows after which they are written to the DB
+                (still within the same transaction).
+        """
+        self.kb_api = kb_api
+        self.flush_size = flush_size
+        self._con = None
+
+        # entities in the DB (or in the current transaction), by normalized name (see text.normalize_name)
+        self._artist_ids = dict()  # key is artist name, val is node ID
+        self._genre_ids = dict()   # key is genre name, val is node ID
+        self._song_ids = dict()    # key is (song name, artist node ID), val is node ID
+        self._spotify_uris = set()
+        self._edge_keys = set()    # elems are (source ID, dest ID, rel)
+        self._unknown_features = set()
+        # entities added in this batch, or whose metadata was already updated in it
+        self._up_to_date_ids = set()
+        # nodes inserted since the last flush, which are removed again if their rows are rejected;
+        # key is node ID, val is (dict of IDs above it was added to, its key there, its Spotify URI)
+        self._unflushed_nodes = dict()
+
+        # rows waiting to be written; key is SQL statement, val is list of (row, node ID) pairs
+        self._pending = {
+            self.INSERT_ARTIST_SQL: [],
+            self.INSERT_GENRE_SQL: [],
+            self.INSERT_SONG_SQL: [],
+            self.INSERT_EDGE_SQL: [],
+            self.UPDATE_ARTIST_SQL: [],
+            self.UPDATE_ARTIST_FETCHED_SQL: [],
+            self.UPDATE_SONG_SQL: [],
+        }
+        self._num_pending = 0
+
+    def __enter__(self):
+        self._con = self.kb_api.pool.connect()
+        # transactions are managed explicitly below
+        self._con.isolation_level = None
+        self._con.execute("BEGIN IMMEDIATE")
+        self._load_existing_entities()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.flush()
+                self._con.execute("COMMIT")
+            else:
+                self._con.execute("ROLLBACK")
+        finally:
+            self._con.close()
+            self._con = None
+            self.kb_api._invalidate_snapshots()
+        return False
+
+    def _load_existing_entities(self):
+        with closing(self._con.cursor()) as cursor:
+            cursor.execute("""
+                SELECT normalized_name, id FROM nodes WHERE type = "artist";
+            """)
+            self._artist_ids = dict(cursor.fetchall())
+
+            cursor.execute("""
+                SELECT normalized_name, id FROM nodes WHERE type = "genre";
+            """)
+            self._genre_ids = dict(cursor.fetchall())
+
+            cursor.execute("""
+                SELECT normalized_name, main_artist_id, spotify_uri, node_id
+                FROM nodes JOIN songs ON songs.node_id == nodes.id
+                WHERE type = "song";
+            """)
+            for name, artist_id, spotify_uri, node_id in cursor.fetchall():
+                self._song_ids[(name, artist_id)] = node_id
+                if spotify_uri is not None:
+                    self._spotify_uris.add(spotify_uri)
+
+    def commit(self):
+        """Writes and commits everything added so far, then starts a new transaction.
+
+        Useful for checkpointing long-running ingestion.
+        """
+        self.flush()
+        self._con.execute("COMMIT")
+        self.kb_api._invalidate_snapshots()
+        self._con.execute("BEGIN IMMEDIATE")
+
+    def flush(self):
+        """Writes buffered rows to the DB, without committing.
+
+        Rows rejected by schema constraints are skipped (along with their nodes)
+        and reported, like the corresponding KnowledgeBaseAPI.add_* methods do.
+        """
+        rejected_node_ids = set()
+        with closing(self._con.cursor()) as cursor:
+            # order matters: songs reference artists, edges reference all kinds of nodes,
+            # and updates may refer to rows inserted in this batch
+            for sql, rows in self._pending.items():
+                if len(rows) > 0:
+                    rejected_node_ids.update(self._executemany(cursor, sql, rows))
+                    self._pending[sql] = []
+        self._num_pending = 0
+        self._forget_nodes(rejected_node_ids)
+        self._unflushed_nodes = dict()
+
+    def _executemany(self, cursor, sql, rows):
+        """
+        Returns:
+            (set of ints): IDs of nodes whose rows were rejected.
+        """
+        cursor.execute("SAVEPOINT batch")
+        try:
+            cursor.executemany(sql, [row for row, _ in rows])
+            cursor.execute("RELEASE batch")
+            return set()
+        except sqlite3.IntegrityError:
+            cursor.execute("ROLLBACK TO batch")
+            cursor.execute("RELEASE batch")
+
+        # find the offending rows
+        rejected_node_ids = set()
+        for row, node_id in rows:
+            try:
+                cursor.execute(sql, row)
+            except sqlite3.IntegrityError as e:
+                print("ERROR: Could not insert {} due to schema constraints: {}".format(row, str(e)))
+                if node_id is not None:
+                    self._delete_node(cursor, node_id)
+                    rejected_node_ids.add(node_id)
+        return rejected_node_ids
+
+    def _delete_node(self, cursor, node_id):
+        # in a savepoint of its own, so that if rows added in this batch refer to the node
+        # (and foreign keys keep it from being deleted), the rest of the batch is unaffected
+        cursor.execute("SAVEPOINT delete_node")
+        try:
+            cursor.execute("DELETE FROM nodes WHERE id = (?);", (node_id,))
+        except sqlite3.IntegrityError as e:
+            cursor.execute("ROLLBACK TO delete_node")
+            print("WARN: Could not remove node {} of rejected row: {}".format(node_id, str(e)))
+        cursor.execute("RELEASE delete_node")
+
+    def _forget_nodes(self, node_ids):
+        """Removes given nodes, inserted since the last flush, from the entities known to
+        this batch, so that adding them again inserts new nodes instead of returning these IDs.
+        """
+        if len(node_ids) == 0:
+            return
+        for node_id in node_ids:
+            ids, key, spotify_uri = self._unflushed_nodes[node_id]
+            if ids.get(key) == node_id:
+                del ids[key]
+            self._spotify_uris.discard(spotify_uri)
+            self._up_to_date_ids.discard(node_id)
+        self._edge_keys = set(
+            key for key in self._edge_keys if key[0] not in node_ids and key[1] not in node_ids
+        )
+
+    def _buffer(self, sql, row, node_id=None):
+        self._pending[sql].append((row, node_id))
+        self._num_pending += 1
+        if self._num_pending >= self.flush_size:
+            self.flush()
+
+    def _add_node(self, entity_name, entity_type):
+        with closing(self._con.cursor()) as cursor:
+            # NULL is passed so that SQLite assigns the auto-generated row_id value
+            cursor.execute("""
+                INSERT INTO nodes (name, normalized_name, type, id) VALUES (?, ?, ?, NULL);
+            """, (entity_name, normalize_name(entity_name), entity_type))
+            return cursor.lastrowid
+
+    def add_genre(self, name):
+        """Same as KnowledgeBaseAPI.add_genre.
+
+        Returns:
+            (int): node_id if genre was added or it already existed; None otherwise.
+        """
+        if name is None:
+            print("ERROR: Genre name is required.")
+            return None
+        key = normalize_name(name)
+        if key not in self._genre_ids:
+            node_id = self._add_node(name, "genre")
+            self._genre_ids[key] = node_id
+            self._unflushed_nodes[node_id] = (self._genre_ids, key, None)
+            self._buffer(self.INSERT_GENRE_SQL, (node_id,), node_id)
+        # None if the flush that buffering may have caused rejected the genre
+        return self._genre_ids.get(key)
+
+    def add_artist(self, name, genres=[], num_spotify_followers=None, spotify_id=None):
+        """Like KnowledgeBaseAPI.add_artist, except that if the artist already exists,
+        their number of followers and Spotify ID are updated and any new genres are added.
+
+        Returns:
+            (int): node_id corresponding to given artist if added or already existed; None otherwise.
+        """
+        if name is None:
+            print("ERROR: Artist name is required.")
+            return None
+        key = normalize_name(name)
+        node_id = self._artist_ids.get(key)
+        if node_id is None:
+            node_id = self._add_node(name, "artist")
+            self._artist_ids[key] = node_id
+            self._unflushed_nodes[node_id] = (self._artist_ids, key, None)
+            self._buffer(self.INSERT_ARTIST_SQL, (node_id, num_spotify_followers, spotify_id), node_id)
+            if self._artist_ids.get(key) != node_id:
+                # rejected by the flush that buffering caused; its ID may be reused
+                return None
+        elif node_id in self._up_to_date_ids:
+            return node_id
+        elif num_spotify_followers is not None or spotify_id is not None:
+            self._buffer(self.UPDATE_ARTIST_SQL, (num_spotify_followers, spotify_id, node_id))
+        self._up_to_date_ids.add(node_id)
+
+        genre_rel_str = self.kb_api.approved_relations["genre"]
+        for genre in genres:
+            genre_id = self.add_genre(genre)
+            if genre_id is not None:
+                self.connect_entities(node_id, genre_id, genre_rel_str, 100)
+        return node_id
+
+    def mark_artist_fetched(self, artist_id, fetched_at=None):
+        """Records when the given artist's data (e.g. top songs) was fetched, e.g. from Spotify.
+
+        Params:
+            artist_id (int): node ID of artist.
+            fetched_at (int): Unix time in seconds; defaults to now.
+        """
+        fetched_at = int(time.time()) if fetched_at is None else fetched_at
+        self._buffer(self.UPDATE_ARTIST_FETCHED_SQL, (fetched_at, artist_id))
+
+    def add_song(
+        self,
+        name,
+        artist,
+        duration_ms=None,
+        popularity=None,
+        spotify_uri=None,
+        audio_features=dict()
+    ):
+        """Same as KnowledgeBaseAPI.add_song, except that the artist must have been
+        added already (either before or within this batch), and that if the song
+        already exists, its popularity is updated.
+
+        Returns:
+            (int): node_id of song if added; None if it already existed or could not be added.
+        """
+        artist_node_id = self._artist_ids.get(normalize_name(artist))
+        if name is None or artist_node_id is None:
+            print("ERROR: Failed to add song '{}' because artist '{}' is unknown.".format(name, artist))
+            return None
+        key = (normalize_name(name), artist_node_id)
+        existing_id = self._song_ids.get(key)
+        if existing_id is not None:
+            if existing_id not in self._up_to_date_ids and popularity is not None:
+                self._buffer(self.UPDATE_SONG_SQL, (popularity, existing_id))
+                self._up_to_date_ids.add(existing_id)
+            return None
+        if spotify_uri is not None and spotify_uri in self._spotify_uris:
+            print("WARN: Song '{}' by '{}' has the same Spotify URI as another song. Skipping it.".format(name, artist))
+            return None
+
+        for audio_feature in audio_features:
+            if audio_feature not in self.kb_api.song_audio_features and audio_feature not in self._unknown_features:
+                print(f"WARN: audio feature '{audio_feature}' (given for song '{name}') is not recognized.")
+                # warn only once per batch, since the same features tend to be given for every song
+                self._unknown_features.add(audio_feature)
+        x = {
+            audio_feature: audio_features.get(audio_feature)
+            for audio_feature in self.kb_api.song_audio_features
+        }
+
+        node_id = self._add_node(name, "song")
+        self._song_ids[key] = node_id
+        self._unflushed_nodes[node_id] = (self._song_ids, key, spotify_uri)
+        self._up_to_date_ids.add(node_id)
+        if spotify_uri is not None:
+            self._spotify_uris.add(spotify_uri)
+        self._buffer(self.INSERT_SONG_SQL, (
+            artist_node_id, node_id, duration_ms, popularity, spotify_uri,
+            x['acousticness'], x['danceability'], x['energy'],
+            x['instrumentalness'], x['liveness'], x['mode'], x['loudness'],
+            x['speechiness'], x['valence'], x['tempo'], x['musical_key'],
+            x['time_signature'],
+        ), node_id)
+        if self._song_ids.get(key) != node_id:
+            # rejected by the flush that buffering caused; its ID may be reused
+            return None
+        return node_id
+
+    def connect_entities(self, source_node_id, dest_node_id, rel_str, score):
+        """Like KnowledgeBaseAPI.connect_entities, but takes node IDs (as returned by add_*)
+        instead of names. Edges that already exist are ignored.
+        """
+        if rel_str not in self.kb_api.approved_relations.values():
+            print("WARN: adding unapproved relation. Only allow: {}".format(self.kb_api.approved_relations))
+        key = (source_node_id, dest_node_id, rel_str)
+        if key not in self._edge_keys:
+            self._edge_keys.add(key)
+            self._buffer(self.INSERT_EDGE_SQL, (source_node_id, dest_node_id, rel_str, score))
@@ -0,0 +1,176 @@
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from knowledge_base.metrics import InstrumentedConnection
+from knowledge_base.storage import StorageProfile
+
+
+class ConnectionPool:
+    """Hands out long-lived SQLite connections to the knowledge base.
+
+    Opening a connection (and running the PRAGMAs every connection needs)
+    costs far more than the small queries the knowledge base runs, so
+    connections are kept open and reused instead of being opened per query.
+
+    A connection is checked out by one thread (or greenlet, when the server
+    runs under eventlet/gevent) at a time. Nested checkouts from the same
+    thread reuse the connection the thread already holds, so a thread never
+    holds more than one connection and cannot deadlock waiting on itself.
+
+    Setting max_size to 0 disables pooling: every checkout opens a new
+    connection and closes it when released.
+    """
+
+    def __init__(self, db_path, max_size=8, timeout=30.0, health_check_interval=60.0, storage_profile=None):
+        """
+        Params:
+            db_path (str): path to SQLite database file.
+            max_size (int): max number of open connections; 0 disables pooling.
+            timeout (float): seconds to wait for a free connection before giving up.
+            health_check_interval (float): idle connections older than this (in seconds)
+                are checked with a trivial query before being handed out.
+            storage_profile (StorageProfile): how connections are opened; None for SQLite defaults.
+        """
+        self.db_path = db_path
+        self.storage_profile = storage_profile or StorageProfile()
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        self._idle = queue.LifoQueue()  # elems are (connection, time of last use)
+        self._num_open = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._closed = False
+
+    def __str__(self):
+        return "Connection pool for {} DB ({} of max {} connections open).".format(
+            self.db_path, self._num_open, self.max_size)
+
+    def connect(self):
+        """Opens a new connection that is not managed by the pool.
+
+        Useful for long-running work (e.g. a bulk write in a single transaction)
+        that should not tie up, or share, a pooled connection.
+        """
+        database, uri = self.storage_profile.get_database(self.db_path)
+        # times every statement; see metrics.InstrumentedConnection
+        conn = sqlite3.connect(database, uri=uri, check_same_thread=False, factory=InstrumentedConnection)
+        try:
+            for pragma in self.storage_profile.get_pragmas():
+                conn.execute(pragma)
+            # enable foreign key constraints
+            conn.execute("PRAGMA foreign_keys = 1")
+        except sqlite3.Error:
+            conn.close()
+            raise
+        return conn
+
+    def _is_healthy(self, conn):
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn):
+        with self._lock:
+            self._num_open -= 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _acquire(self):
+        if self._closed:
+            raise sqlite3.OperationalError("connection pool for '{}' is closed".format(self.db_path))
+
+        if self.max_size == 0:
+            return self.connect()
+
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                conn, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_open = self._num_open < self.max_size
+                    if can_open:
+                        self._num_open += 1
+                if can_open:
+                    try:
+                        return self.connect()
+                    except sqlite3.Error:
+                        with self._lock:
+                            self._num_open -= 1
+                        raise
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise sqlite3.OperationalError(
+                        "timed out waiting for a connection to '{}'".format(self.db_path))
+                try:
+                    # wake up periodically in case an unhealthy connection was discarded
+                    conn, last_used = self._idle.get(timeout=min(remaining, 0.1))
+                except queue.Empty:
+                    continue
+
+            if time.monotonic() - last_used < self.health_check_interval or self._is_healthy(conn):
+                return conn
+            print("WARN: Discarding unhealthy connection to '{}'.".format(self.db_path))
+            self._discard(conn)
+
+    def _release(self, conn):
+        if self.max_size == 0:
+            conn.close()
+            return
+
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+
+        if self._closed:
+            self._discard(conn)
+        else:
+            self._idle.put((conn, time.monotonic()))
+
+    @contextmanager
+    def connection(self):
+        """Checks out a connection for the duration of a with-block.
+
+        E.g.
+            with pool.connection() as con:
+                con.execute(...)
+        """
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            self._local.depth += 1
+            try:
+                yield held
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn = self._acquire()
+        self._local.conn, self._local.depth = conn, 1
+        try:
+            yield conn
+        finally:
+            self._local.conn, self._local.depth = None, 0
+            self._release(conn)
+
+    def close(self):
+        """Closes all idle connections; connections in use are closed once released."""
+        self._closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
@@ -0,0 +1,156 @@
+from contextlib import closing
+
+import numpy as np
+
+
+class SongFeatureStore:
+    """Dense, in-memory matrix of every song's numerical features.
+
+    Row i holds the features of the song with ID song_ids[i]; song_ids is sorted
+    so that rows for many IDs can be found at once with a binary search.
+    Missing values (NULL in the DB) are stored as NaN, which compares False
+    against everything, just like a missing value fails KnowledgeBaseAPI.songs_are_related.
+
+    For each feature, songs are also ranked by value, so that the songs with more (or less)
+    of a feature than a given song are found with a binary search; see get_ranked().
+    """
+
+    # columns of the songs table that hold numbers
+    FEATURES = (
+        "acousticness", "danceability", "energy", "instrumentalness",
+        "liveness", "loudness", "speechiness", "valence", "tempo",
+        "musical_key", "time_signature", "popularity", "duration_ms",
+    )
+
+    def __init__(self, song_ids, features):
+        """
+        Params:
+            song_ids (np.ndarray): sorted IDs of song nodes; shape (n,).
+            features (np.ndarray): float32 feature values; shape (n, len(FEATURES)).
+        """
+        self.song_ids = song_ids
+        self.features = features
+        self._column_by_name = {name: i for i, name in enumerate(self.FEATURES)}
+        # key is feature name, val is (rows in ascending order of value, those values,
+        # position of each row in that order); songs missing the feature are not ranked
+        self._rankings = {name: self._rank(features[:, i]) for i, name in enumerate(self.FEATURES)}
+
+    def __str__(self):
+        return "Feature store with {} songs and {} features.".format(*self.features.shape)
+
+    def __len__(self):
+        return len(self.song_ids)
+
+    @classmethod
+    def load(cls, con):
+        """Reads the songs table into a new feature store.
+
+        Params:
+            con (sqlite3.Connection): connection to knowledge base.
+
+        Returns:
+            (SongFeatureStore).
+        """
+        with closing(con.cursor()) as cursor:
+            cursor.execute("SELECT node_id, {} FROM songs ORDER BY node_id;".format(", ".join(cls.FEATURES)))
+            rows = cursor.fetchall()
+
+        song_ids = np.array([x[0] for x in rows], dtype=np.int64)
+        # None => NaN
+        features = np.array([x[1:] for x in rows], dtype=np.float32).reshape(len(rows), len(cls.FEATURES))
+        return cls(song_ids, features)
+
+    @staticmethod
+    def _rank(values):
+        # NaNs are sorted last; stable sort keeps rows with equal values in ID order
+        order = np.argsort(values, kind="stable")[:np.count_nonzero(~np.isnan(values))]
+        positions = np.full(len(values), len(order), dtype=np.int64)
+        positions[order] = np.arange(len(order))
+        return order, values[order], positions
+
+    def get_rows(self, song_ids):
+        """Maps song IDs to rows of the feature matrix.
+
+        Params:
+            song_ids (iterable of ints).
+
+        Returns:
+            (np.ndarray): row of each given song ID; -1 for IDs not in the store.
+        """
+        song_ids = np.asarray(song_ids, dtype=np.int64)
+        rows = np.searchsorted(self.song_ids, song_ids)
+        rows[rows >= len(self.song_ids)] = -1
+        found = rows >= 0
+        found[found] = self.song_ids[rows[found]] == song_ids[found]
+        rows[~found] = -1
+        return rows
+
+    def get_feature_values(self, song_ids, feature_name):
+        """
+        Returns:
+            (np.ndarray): value of given feature for each given song; NaN if unknown.
+        """
+        rows = self.get_rows(song_ids)
+        found = rows >= 0
+        values = np.full(len(rows), np.nan, dtype=np.float32)
+        values[found] = self.features[rows[found], self._column_by_name[feature_name]]
+        return values
+
+    def filter_related(self, candidate_ids, song_id, feature_name, comparison):
+        """Finds candidate songs that compare to given song as described, in a single pass.
+
+        Params:
+            candidate_ids (list of ints): IDs of candidate songs.
+            song_id (int): ID of song that candidates are compared against.
+            feature_name (str): e.g. "acousticness".
+            comparison (func): applied to (candidate values, value of given song)
+                e.g. lambda val1, val2: val1 > val2 for "more acoustic".
+
+        Returns:
+            (list of ints): IDs of candidates for which comparison holds, in given order.
+        """
+        if len(candidate_ids) == 0:
+            return []
+        song_val = self.get_feature_values([song_id], feature_name)[0]
+        if np.isnan(song_val):
+            return []
+        mask = comparison(self.get_feature_values(candidate_ids, feature_name), song_val)
+        return np.asarray(candidate_ids, dtype=np.int64)[mask].tolist()
+
+    def get_ranked(self, song_id, feature_name, descending, candidate_ids=None, k=None):
+        """Finds songs with more (or less) of a feature than given song, ranked by that feature.
+
+        E.g. the 10 most danceable songs that are more danceable than song 12:
+            get_ranked(12, "danceability", descending=True, k=10)
+
+        Params:
+            song_id (int): ID of song that others are compared against.
+            feature_name (str): e.g. "danceability".
+            descending (bool): if True, finds songs with more of the feature, highest values
+                first; otherwise, finds songs with less of the feature, lowest values first.
+            candidate_ids (iterable of ints): if given, only these songs are considered,
+                e.g. songs by related artists.
+            k (int): max number of songs returned; None for all.
+
+        Returns:
+            (list of ints): IDs of songs, ranked.
+        """
+        song_val = self.get_feature_values([song_id], feature_name)[0]
+        if np.isnan(song_val):
+            return []
+
+        order, sorted_values, positions = self._rankings[feature_name]
+        if descending:
+            start, end = np.searchsorted(sorted_values, song_val, side="right"), len(order)
+        else:
+            start, end = 0, np.searchsorted(sorted_values, song_val, side="left")
+
+        if candidate_ids is None:
+            ranked_positions = np.arange(start, end)
+        else:
+            rows = self.get_rows(list(candidate_ids))
+            candidate_positions = np.unique(positions[rows[rows >= 0]])
+            ranked_positions = candidate_positions[(candidate_positions >= start) & (candidate_positions < end)]
+        if descending:
+            ranked_positions = ranked_positions[::-1]
+        return self.song_ids[order[ranked_positions[:k]]].tolist()
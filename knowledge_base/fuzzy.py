@@ -0,0 +1,236 @@
+from contextlib import closing
+
+import numpy as np
+
+from knowledge_base.text import normalize_name, remove_extra_sections
+
+
+def get_match_key(name):
+    """
+    Returns:
+        (str): form in which given name is fuzzy-matched e.g. "sorry" for "Sorry (Remix) - Live".
+    """
+    return normalize_name(remove_extra_sections(name))
+
+def _pad(key):
+    # so that short names have trigrams too, and the start of a name (where typos are rarer) weighs more
+    return "  {} ".format(key)
+
+def get_trigram_codes(keys):
+    """Encodes the trigrams (3 consecutive characters) of each key as integers.
+
+    E.g. the trigrams of "sorry" are "  s", " so", "sor", "orr", "rry", and "ry ".
+
+    Params:
+        keys (list of str).
+
+    Returns:
+        (tuple): (codes, key indices) where codes[i] is a trigram of keys[key_indices[i]];
+            shape (number of trigrams,) each.
+    """
+    padded = [_pad(key) for key in keys]
+    lengths = np.array([len(x) for x in padded], dtype=np.int64)
+    # unicode code points are under 2**21, so three of them fit in an int64
+    chars = np.frombuffer("".join(padded).encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+    key_indices = np.repeat(np.arange(len(keys)), lengths - 2)
+    positions = np.arange(len(key_indices)) + 2 * key_indices
+    codes = (chars[positions] << 42) | (chars[positions + 1] << 21) | chars[positions + 2]
+    return codes, key_indices
+
+def get_edit_distance(s1, s2):
+    """Levenshtein distance: number of characters inserted, deleted, or replaced to turn s1 into s2.
+
+    Computed with Myers' bit-parallel algorithm, which keeps a column of the usual
+    dynamic programming table as the bits of two ints, so that it takes one step per
+    character of the longer string rather than one per pair of characters.
+    """
+    if len(s1) < len(s2):
+        s1, s2 = s2, s1
+    if len(s2) == 0:
+        return len(s1)
+    # bit i of masks[c] is set if s2[i] == c
+    masks = dict()
+    for i, c in enumerate(s2):
+        masks[c] = masks.get(c, 0) | (1 << i)
+    all_bits, last_bit = (1 << len(s2)) - 1, 1 << (len(s2) - 1)
+    # bits of vertical deltas (+1 and -1) between consecutive rows of current column
+    plus, minus = all_bits, 0
+    distance = len(s2)
+    for c in s1:
+        eq = masks.get(c, 0)
+        x_vertical = eq | minus
+        x_horizontal = (((eq & plus) + plus) ^ plus) | eq
+        plus_horizontal = minus | ~(x_horizontal | plus)
+        minus_horizontal = plus & x_horizontal
+        if plus_horizontal & last_bit:
+            distance += 1
+        elif minus_horizontal & last_bit:
+            distance -= 1
+        plus_horizontal = (plus_horizontal << 1) | 1
+        minus_horizontal <<= 1
+        plus = (minus_horizontal | ~(x_vertical | plus_horizontal)) & all_bits
+        minus = plus_horizontal & x_vertical & all_bits
+    return distance
+
+def get_similarity(s1, s2):
+    """
+    Returns:
+        (float): 1 - edit distance relative to the longer string's length; 1 if equal, 0 if nothing in common.
+    """
+    if len(s1) == 0 and len(s2) == 0:
+        return 1.0
+    return 1 - get_edit_distance(s1, s2) / max(len(s1), len(s2))
+
+
+class FuzzyNameMatcher:
+    """Finds the nodes whose names are closest to a (possibly misspelled) name.
+
+    Names are matched without what sets versions of a song apart (see
+    text.remove_extra_sections), and normalized (see text.normalize_name), so that
+    e.g. "sorry - live" matches "Sorry (Remix)".
+
+    Candidates are found through an inverted index from each trigram (3 consecutive
+    characters) to the names that contain it, and ranked by the share of trigrams they
+    have in common with the given name. The best few are then reranked by edit distance.
+    To bound latency on large catalogs, only the postings of a query's rarest trigrams
+    are read, up to max_postings names.
+
+    Postings are kept in compressed sparse row form: the names containing trigram t
+    are postings[offsets[t]:offsets[t+1]].
+    """
+
+    def __init__(self, node_ids, names, types, keys, trigram_codes, offsets, postings, num_trigrams):
+        """
+        Params:
+            node_ids (np.ndarray): ID of each node; shape (n,).
+            names (list of str): names[i] is the name of node i.
+            types (list of str): types[i] is the type of node i e.g. "song".
+            keys (list of str): keys[i] is the match key of node i; see get_match_key.
+            trigram_codes (np.ndarray): sorted codes of all trigrams; see get_trigram_codes.
+            offsets (np.ndarray): shape (len(trigram_codes) + 1,).
+            postings (np.ndarray): node indices.
+            num_trigrams (np.ndarray): number of distinct trigrams in each node's key; shape (n,).
+        """
+        self.node_ids = node_ids
+        self.names = names
+        self.types = types
+        self.keys = keys
+        self.trigram_codes = trigram_codes
+        self.offsets = offsets
+        self.postings = postings
+        self.num_trigrams = num_trigrams
+
+        self._type_codes = {node_type: i for i, node_type in enumerate(sorted(set(types)))}
+        self._types = np.array([self._type_codes[node_type] for node_type in types], dtype=np.int8)
+
+    def __str__(self):
+        return "Fuzzy name matcher over {} names and {} trigrams.".format(len(self.names), len(self.trigram_codes))
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def load(cls, con):
+        """Reads all nodes' names into a new matcher.
+
+        Params:
+            con (sqlite3.Connection): connection to knowledge base.
+
+        Returns:
+            (FuzzyNameMatcher).
+        """
+        with closing(con.cursor()) as cursor:
+            cursor.execute("SELECT id, name, type FROM nodes ORDER BY id;")
+            rows = cursor.fetchall()
+        return cls.from_names(
+            np.array([x[0] for x in rows], dtype=np.int64),
+            [x[1] for x in rows],
+            [x[2] for x in rows],
+        )
+
+    @classmethod
+    def from_names(cls, node_ids, names, types):
+        """Builds the trigram index of given names.
+
+        Returns:
+            (FuzzyNameMatcher).
+        """
+        if len(names) == 0:
+            # e.g. a new knowledge base; there are no keys to bucket postings by
+            return cls(
+                node_ids, names, types, [], np.zeros(0, dtype=np.int64), np.zeros(1, dtype=np.int64),
+                np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int64),
+            )
+        keys = [get_match_key(name) for name in names]
+        codes, key_indices = get_trigram_codes(keys)
+        trigram_codes, trigram_ids = np.unique(codes, return_inverse=True)
+        # distinct (trigram, node) pairs, sorted by trigram then node
+        pairs = np.sort(trigram_ids.astype(np.int64) * len(keys) + key_indices)
+        pairs = pairs[np.concatenate(([True], pairs[1:] != pairs[:-1]))]
+        postings = (pairs % len(keys)).astype(np.int32)
+        offsets = np.zeros(len(trigram_codes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pairs // len(keys), minlength=len(trigram_codes)), out=offsets[1:])
+        num_trigrams = np.bincount(postings, minlength=len(keys))
+        return cls(node_ids, names, types, keys, trigram_codes, offsets, postings, num_trigrams)
+
+    def match(self, name, node_type=None, limit=5, min_score=0.5, num_reranked=20, max_postings=20000):
+        """Finds the nodes whose names are closest to the given name.
+
+        Params:
+            name (str): e.g. "sory".
+            node_type (str): e.g. "song"; if omitted, nodes of any type are matched.
+            limit (int): max number of matches.
+            min_score (float): matches scoring lower (in [0,1] range) are left out.
+            num_reranked (int): number of candidates, by shared trigrams, reranked by edit distance.
+            max_postings (int): max number of postings read, starting from the rarest trigrams.
+
+        Returns:
+            (list of tuples): (node ID, name, type, score) of each match, best first;
+                score is 1 for names that match exactly once normalized.
+        """
+        if node_type is not None and node_type not in self._type_codes:
+            return []
+        key = get_match_key(name)
+        codes = np.unique(get_trigram_codes([key])[0])
+        trigram_ids = np.searchsorted(self.trigram_codes, codes)
+        found = trigram_ids < len(self.trigram_codes)
+        found[found] = self.trigram_codes[trigram_ids[found]] == codes[found]
+        trigram_ids = trigram_ids[found]
+        if len(trigram_ids) == 0:
+            return []
+
+        postings, num_read = [], 0
+        lengths = self.offsets[trigram_ids + 1] - self.offsets[trigram_ids]
+        for t in trigram_ids[np.argsort(lengths, kind="stable")].tolist():
+            if num_read >= max_postings:
+                break
+            postings.append(self.postings[self.offsets[t]:self.offsets[t+1]])
+            num_read += len(postings[-1])
+        # number of read trigrams each candidate shares with given name; postings are far
+        # fewer than names, so sorting them beats counting into an array of every name
+        postings = np.sort(np.concatenate(postings))
+        starts = np.flatnonzero(np.concatenate(([True], postings[1:] != postings[:-1])))
+        candidates = postings[starts]
+        num_shared = np.diff(np.append(starts, len(postings)))
+
+        if node_type is not None:
+            is_type = self._types[candidates] == self._type_codes[node_type]
+            candidates, num_shared = candidates[is_type], num_shared[is_type]
+        # Dice coefficient of trigram sets
+        trigram_scores = 2 * num_shared / (len(codes) + self.num_trigrams[candidates])
+        if len(candidates) > num_reranked:
+            best = np.argpartition(-trigram_scores, num_reranked - 1)[:num_reranked]
+            candidates = candidates[best]
+
+        normalized = normalize_name(name)
+        matches = []
+        for i in candidates.tolist():
+            score = get_similarity(key, self.keys[i])
+            if normalized != key:
+                # so that e.g. "sorry - live" prefers "Sorry - Live" over "Sorry"
+                score = max(score, get_similarity(normalized, normalize_name(self.names[i])))
+            if score >= min_score:
+                matches.append((int(self.node_ids[i]), self.names[i], self.types[i], score))
+        # best first; among equally good matches, shorter names (e.g. the original rather than a remix) first
+        matches.sort(key=lambda x: (-x[3], len(x[1]), x[0]))
+        return matches[:limit]
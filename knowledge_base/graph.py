@@ -0,0 +1,148 @@
+from array import array
+from contextlib import closing
+
+from knowledge_base.text import normalize_name
+
+
+class SemanticNetworkSnapshot:
+    """Read-only, in-memory copy of the semantic network.
+
+    Nodes are numbered 0..n-1 in order of their IDs. For each relation, edges
+    are stored in compressed sparse row (CSR) form: the destinations of node i
+    are targets[offsets[i]:offsets[i+1]], kept in ascending ID order so that
+    results match the order in which SQLite returns them.
+
+    Songs are linked to their main artist through the songs table rather
+    than through edges, so artist -> songs is stored the same way, separately.
+
+    Names are matched by their normalized form (see text.normalize_name), like in the DB.
+    """
+
+    def __init__(self, node_ids, names, types, relations, songs_by_artist, normalized_names=None):
+        """
+        Params:
+            node_ids (array): IDs of all nodes, in ascending order.
+            names (list of str): names[i] is the name of node i.
+            types (list of str): types[i] is the type of node i, e.g. "artist".
+            relations (dict): key is relation e.g. "similar to", val is (offsets, targets).
+            songs_by_artist (tuple): (offsets, targets) of song nodes by main artist node.
+            normalized_names (list of str): normalized_names[i] is the normalized name of node i;
+                computed from names if omitted.
+        """
+        self.node_ids = node_ids
+        self.names = names
+        self.types = types
+        self.relations = relations
+        self.songs_by_artist = songs_by_artist
+
+        self._index_by_id = {node_id: i for i, node_id in enumerate(node_ids)}
+        if normalized_names is None:
+            normalized_names = [normalize_name(name) for name in names]
+        # key is normalized name, val is indices of nodes with that name
+        self._indices_by_name = dict()
+        for i, name in enumerate(normalized_names):
+            self._indices_by_name.setdefault(name, []).append(i)
+
+    def __str__(self):
+        return "Semantic network snapshot with {} nodes and {} edges.".format(
+            len(self.node_ids), sum(len(targets) for _, targets in self.relations.values()))
+
+    @classmethod
+    def load(cls, con):
+        """Reads the nodes, edges, and songs tables into a new snapshot.
+
+        Params:
+            con (sqlite3.Connection): connection to knowledge base.
+
+        Returns:
+            (SemanticNetworkSnapshot).
+        """
+        with closing(con.cursor()) as cursor:
+            cursor.execute("SELECT id, name, type, normalized_name FROM nodes ORDER BY id;")
+            rows = cursor.fetchall()
+            node_ids = array("q", (x[0] for x in rows))
+            names = [x[1] for x in rows]
+            types = [x[2] for x in rows]
+            normalized_names = [x[3] for x in rows]
+            index_by_id = {node_id: i for i, node_id in enumerate(node_ids)}
+
+            cursor.execute("SELECT source, dest, rel FROM edges ORDER BY rel, source, dest;")
+            edges_by_rel = dict()
+            for source, dest, rel in cursor.fetchall():
+                edges_by_rel.setdefault(rel, []).append((index_by_id[source], index_by_id[dest]))
+
+            cursor.execute("SELECT main_artist_id, node_id FROM songs ORDER BY rowid;")
+            song_edges = [(index_by_id[x[0]], index_by_id[x[1]]) for x in cursor.fetchall()]
+
+        num_nodes = len(node_ids)
+        relations = {
+            # sorting by source keeps destinations in ID order since node indices follow IDs
+            rel: _to_csr(num_nodes, sorted(edges))
+            for rel, edges in edges_by_rel.items()
+        }
+        # stable sort by artist preserves the insertion order of each artist's songs
+        songs_by_artist = _to_csr(num_nodes, sorted(song_edges, key=lambda edge: edge[0]))
+        return cls(node_ids, names, types, relations, songs_by_artist, normalized_names)
+
+    def get_node_ids(self, name, node_type=None):
+        """
+        Params:
+            name (str): e.g. "Justin Bieber".
+            node_type (str): e.g. "artist"; if omitted, nodes of any type are matched.
+
+        Returns:
+            (list of ints): IDs of nodes with given name in ascending order; empty if none found.
+        """
+        return [
+            self.node_ids[i] for i in self._indices_by_name.get(normalize_name(name), [])
+            if node_type is None or self.types[i] == node_type
+        ]
+
+    def get_related_names(self, name, rel_str):
+        """Equivalent to KnowledgeBaseAPI.get_related_entities.
+
+        Returns:
+            (list of str): names of nodes that any node with the given name connects to
+                via given relation, in ascending order of their IDs.
+        """
+        if rel_str not in self.relations:
+            return []
+        offsets, targets = self.relations[rel_str]
+        related = set()
+        for i in self._indices_by_name.get(normalize_name(name), []):
+            related.update(targets[offsets[i]:offsets[i+1]])
+        return [self.names[i] for i in sorted(related)]
+
+    def get_songs_by_artist_id(self, artist_id):
+        """
+        Returns:
+            (list of dicts): songs by given artist, in order of insertion.
+                e.g. [{"song_name": "Despacito", "id": 1}, {"song_name": "Sorry", "id":2}]
+        """
+        i = self._index_by_id.get(artist_id)
+        if i is None:
+            return []
+        offsets, targets = self.songs_by_artist
+        return [
+            dict(song_name=self.names[j], id=self.node_ids[j])
+            for j in targets[offsets[i]:offsets[i+1]]
+        ]
+
+
+def _to_csr(num_nodes, edges):
+    """Packs edges, sorted by source, into compressed sparse row arrays.
+
+    Params:
+        num_nodes (int): number of nodes.
+        edges (list of tuples): (source index, dest index) pairs, sorted by source index.
+
+    Returns:
+        (tuple of arrays): offsets (length num_nodes+1) and targets (length len(edges)).
+    """
+    offsets = array("l", [0] * (num_nodes + 1))
+    for source, _ in edges:
+        offsets[source + 1] += 1
+    for i in range(num_nodes):
+        offsets[i + 1] += offsets[i]
+    targets = array("l", (dest for _, dest in edges))
+    return offsets, targets
@@ -0,0 +1,354 @@
+import bisect
+import functools
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+
+# upper bounds (in milliseconds) of histogram buckets: 0.01 ms, 0.02 ms, ..., ~10 s
+BUCKET_BOUNDS_MS = tuple(0.01 * 2 ** i for i in range(21))
+# max number of distinct SQL statements tracked; any more are counted together
+MAX_STATEMENTS = 1000
+OTHER_STATEMENTS = "(other statements)"
+
+
+class LatencyHistogram:
+    """Counts durations into buckets of exponentially growing size, so that recording
+    one costs a binary search, and memory does not grow with the number recorded.
+
+    Percentiles are estimated as the upper bound of the bucket they fall in, so they
+    are at most twice the actual value.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        # last bucket is for durations above every bound
+        self.buckets = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+
+    def observe(self, ms):
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS_MS, ms)] += 1
+
+    def get_percentile(self, q):
+        """
+        Params:
+            q (float): in [0,1] range e.g. 0.99.
+
+        Returns:
+            (float): estimated duration in milliseconds; 0 if nothing was recorded.
+        """
+        if self.count == 0:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for i, num in enumerate(self.buckets):
+            seen += num
+            if seen >= rank and num > 0:
+                return min(BUCKET_BOUNDS_MS[i], self.max_ms) if i < len(BUCKET_BOUNDS_MS) else self.max_ms
+        return self.max_ms
+
+    def get_stats(self):
+        return dict(
+            count=self.count,
+            total_ms=round(self.total_ms, 3),
+            mean_ms=round(self.total_ms / self.count, 3) if self.count > 0 else 0.0,
+            p50_ms=round(self.get_percentile(0.5), 3),
+            p90_ms=round(self.get_percentile(0.9), 3),
+            p99_ms=round(self.get_percentile(0.99), 3),
+            max_ms=round(self.max_ms, 3),
+        )
+
+
+class RequestTrace:
+    """What a single request (e.g. a "get recommendation" event) did: how long it took,
+    and how many SQL statements it executed, on whichever connections.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.started_at = time.time()
+        self.elapsed_ms = 0.0
+        self.num_queries = 0
+        self.query_ms = 0.0
+        self.statements = dict()  # key is SQL statement, val is number of times it was executed
+
+    def record_query(self, statement, ms):
+        self.num_queries += 1
+        self.query_ms += ms
+        self.statements[statement] = self.statements.get(statement, 0) + 1
+
+    def to_dict(self):
+        return dict(
+            name=self.name,
+            started_at=self.started_at,
+            elapsed_ms=round(self.elapsed_ms, 3),
+            num_queries=self.num_queries,
+            query_ms=round(self.query_ms, 3),
+            statements=self.statements,
+        )
+
+
+class Metrics:
+    """Counts and latency histograms of KnowledgeBaseAPI methods, of SQL statements, and
+    of requests, along with traces of the most recent requests.
+
+    Recording a duration takes a lock and a binary search, which is cheap enough to
+    leave on in production; it can still be turned off with enabled = False.
+
+    Usage:
+        @metrics.timed
+        def get_song_data(self, ...):
+            ...
+
+        @metrics.traced
+        def get_similar_song(song_name):
+            ...  # SQL statements executed here, on this thread, are counted in its trace
+    """
+
+    def __init__(self, num_recent_requests=50):
+        """
+        Params:
+            num_recent_requests (int): number of traces of recent requests kept.
+        """
+        self.enabled = True
+        self._lock = threading.Lock()
+        # key is name e.g. "KnowledgeBaseAPI.get_song_data", val is LatencyHistogram
+        self._methods = dict()
+        self._statements = dict()
+        self._fetch_ms = dict()  # key is SQL statement, val is total time spent fetching its rows
+        self._requests = dict()
+        self._queries_per_request = dict()  # key is request name, val is [total, max] number of queries
+        self._recent_requests = deque(maxlen=num_recent_requests)
+        self._local = threading.local()
+
+    def _observe(self, histograms, name, ms):
+        with self._lock:
+            self._observe_locked(histograms, name, ms)
+
+    def _observe_locked(self, histograms, name, ms):
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms[name] = LatencyHistogram()
+        histogram.observe(ms)
+
+    def record_method(self, name, ms):
+        if self.enabled:
+            self._observe(self._methods, name, ms)
+
+    def record_query(self, statement, ms):
+        """Records execution of a SQL statement, also in current thread's request trace (if any).
+
+        Params:
+            statement (str): normalized SQL; see normalize_statement.
+            ms (float): time it took, in milliseconds.
+        """
+        if not self.enabled:
+            return
+        if statement not in self._statements and len(self._statements) >= MAX_STATEMENTS:
+            statement = OTHER_STATEMENTS
+        self._observe(self._statements, statement, ms)
+        trace = getattr(self._local, "trace", None)
+        if trace is not None:
+            trace.record_query(statement, ms)
+
+    def record_fetch(self, statement, ms):
+        """Records time spent fetching rows of a SQL statement, which is part of its cost
+        but not another execution of it.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if statement in self._fetch_ms or len(self._fetch_ms) < MAX_STATEMENTS:
+                self._fetch_ms[statement] = self._fetch_ms.get(statement, 0.0) + ms
+        trace = getattr(self._local, "trace", None)
+        if trace is not None:
+            trace.query_ms += ms
+
+    def timed(self, func):
+        "Decorator that records how long each call to func takes."
+        name = func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record_method(name, (time.perf_counter() - start) * 1000)
+        return wrapper
+
+    def traced(self, func):
+        "Decorator that traces each call to func as a request named after it; see trace()."
+        name = func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.trace(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def trace(self, name):
+        """Returns a context manager that traces a request handled on the current thread.
+
+        Traces do not nest: statements are counted in the innermost one only.
+        """
+        return _TraceContext(self, name)
+
+    def _finish_trace(self, trace):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._observe_locked(self._requests, trace.name, trace.elapsed_ms)
+            queries = self._queries_per_request.setdefault(trace.name, [0, 0])
+            queries[0] += trace.num_queries
+            queries[1] = max(queries[1], trace.num_queries)
+            self._recent_requests.append(trace)
+
+    def get_stats(self):
+        """
+        Returns:
+            (dict): JSON serializable e.g. {
+                "methods": {"KnowledgeBaseAPI.get_song_data": {"count": 10, "p50_ms": 0.08, ...}, ...},
+                "statements": {"SELECT ...": {"count": 25, ..., "fetch_ms": 1.2}, ...},
+                "requests": {"get recommendation": {"count": 3, ..., "queries": {"mean": 7.3, ...}}},
+                "recent_requests": [{"name": "get recommendation", "num_queries": 7, ...}, ...],
+            }
+        """
+        with self._lock:
+            requests = dict()
+            for name, histogram in self._requests.items():
+                total_queries, max_queries = self._queries_per_request[name]
+                requests[name] = dict(
+                    histogram.get_stats(),
+                    queries=dict(mean=round(total_queries / histogram.count, 1), max=max_queries),
+                )
+            return dict(
+                enabled=self.enabled,
+                methods={name: x.get_stats() for name, x in self._methods.items()},
+                statements={
+                    name: dict(x.get_stats(), fetch_ms=round(self._fetch_ms.get(name, 0.0), 3))
+                    for name, x in self._statements.items()
+                },
+                requests=requests,
+                recent_requests=[x.to_dict() for x in reversed(self._recent_requests)],
+            )
+
+    def reset(self):
+        with self._lock:
+            self._methods.clear()
+            self._statements.clear()
+            self._fetch_ms.clear()
+            self._requests.clear()
+            self._queries_per_request.clear()
+            self._recent_requests.clear()
+
+
+class _TraceContext:
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.trace = RequestTrace(name)
+
+    def __enter__(self):
+        self._outer = getattr(self.metrics._local, "trace", None)
+        self.metrics._local.trace = self.trace
+        self._start = time.perf_counter()
+        return self.trace
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.trace.elapsed_ms = (time.perf_counter() - self._start) * 1000
+        self.metrics._local.trace = self._outer
+        self.metrics._finish_trace(self.trace)
+        return False
+
+
+# metrics of this process; recorded by KnowledgeBaseAPI and its connections
+metrics = Metrics()
+
+_statement_names = dict()  # key is SQL as executed, val is normalized SQL
+
+def normalize_statement(sql):
+    """Maps SQL to the form it is counted under: on one line, and with lists of
+    placeholders (whose length varies between calls) shortened.
+
+    E.g. "SELECT *\\n  FROM songs WHERE node_id IN (?, ?, ?);" => "SELECT * FROM songs WHERE node_id IN (?, ...);"
+    """
+    name = _statement_names.get(sql)
+    if name is None:
+        name = re.sub(r"\(\?(, \?)+\)", "(?, ...)", " ".join(sql.split()))
+        if len(_statement_names) < MAX_STATEMENTS:
+            _statement_names[sql] = name
+    return name
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that records in metrics how long each statement takes to execute, and
+    to fetch rows from. Rows read by iterating over the cursor are not timed.
+    """
+
+    _statement = None
+
+    def _record(self, start):
+        if self._statement is not None:
+            metrics.record_query(self._statement, (time.perf_counter() - start) * 1000)
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._statement = normalize_statement(sql)
+            self._record(start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._statement = normalize_statement(sql)
+            self._record(start)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            self._record_fetch(start)
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        try:
+            return super().fetchmany(self.arraysize if size is None else size)
+        finally:
+            self._record_fetch(start)
+
+    def fetchall(self):
+        start = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            self._record_fetch(start)
+
+    def _record_fetch(self, start):
+        if self._statement is not None:
+            metrics.record_fetch(self._statement, (time.perf_counter() - start) * 1000)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors (including those of execute() and executemany()) are
+    InstrumentedCursors. Passed to sqlite3.connect as factory.
+    """
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
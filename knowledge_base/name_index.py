@@ -0,0 +1,73 @@
+from contextlib import closing
+
+
+class NameIndex:
+    """Maps normalized names (see text.normalize_name) to IDs of the nodes with that name,
+    by node type, so that names are resolved without a query.
+
+    Most names belong to a single node, so that node's ID is stored as is, and only
+    names shared by several nodes (e.g. songs by different artists) get a tuple of IDs;
+    that keeps the index to about one dict entry per node.
+    """
+
+    def __init__(self, ids_by_type=None):
+        """
+        Params:
+            ids_by_type (dict): key is node type e.g. "song", val is dict whose key is
+                normalized name, and val is node ID or tuple of node IDs (in increasing order).
+        """
+        self._ids_by_type = ids_by_type or dict()
+
+    def __str__(self):
+        return "Name index over {} names.".format(sum(len(x) for x in self._ids_by_type.values()))
+
+    @classmethod
+    def load(cls, con):
+        """Reads normalized names of all nodes into a new index.
+
+        Params:
+            con (sqlite3.Connection): connection to knowledge base.
+
+        Returns:
+            (NameIndex).
+        """
+        index = cls()
+        with closing(con.cursor()) as cursor:
+            cursor.execute("SELECT normalized_name, type, id FROM nodes ORDER BY id;")
+            for normalized_name, node_type, node_id in cursor:
+                index.add(normalized_name, node_type, node_id)
+        return index
+
+    def add(self, normalized_name, node_type, node_id):
+        """Adds a node, whose ID must be greater than that of every node with the same name."""
+        ids_by_name = self._ids_by_type.setdefault(node_type, dict())
+        ids = ids_by_name.get(normalized_name)
+        if ids is None:
+            ids_by_name[normalized_name] = node_id
+        elif isinstance(ids, tuple):
+            ids_by_name[normalized_name] = ids + (node_id,)
+        else:
+            ids_by_name[normalized_name] = (ids, node_id)
+
+    def get_ids(self, normalized_name, node_type):
+        """
+        Returns:
+            (list of ints): IDs of nodes of given type with given normalized name, in increasing order.
+        """
+        ids = self._ids_by_type.get(node_type, dict()).get(normalized_name)
+        if ids is None:
+            return []
+        return list(ids) if isinstance(ids, tuple) else [ids]
+
+    def get_ids_by_type(self, normalized_name):
+        """
+        Returns:
+            (dict): key is type of nodes with given normalized name, val is list of their IDs.
+                e.g. {"artist": [1], "song": [5, 7]}
+        """
+        ids_by_type = dict()
+        for node_type in self._ids_by_type:
+            ids = self.get_ids(normalized_name, node_type)
+            if ids != []:
+                ids_by_type[node_type] = ids
+        return ids_by_type
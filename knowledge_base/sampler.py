@@ -0,0 +1,133 @@
+import random
+from contextlib import closing
+
+import numpy as np
+
+# relation between an artist and their genre; same as KnowledgeBaseAPI.approved_relations["genre"]
+GENRE_REL_STR = "of genre"
+
+
+class SongSampler:
+    """Picks random playable songs (those with a Spotify URI) in constant time, either
+    uniformly or weighted by popularity, from the whole catalog or from a genre.
+
+    Songs of each genre (that of their main artist) are stored in compressed sparse row
+    form: rows of the songs of genre_ids[g] are genre_rows[genre_offsets[g]:genre_offsets[g+1]].
+
+    Popularity-weighted picks are made by rejection sampling: a song is picked uniformly
+    and kept with probability proportional to its weight (popularity + 1, so that songs
+    with no popularity can still be picked), or else another is picked. That takes
+    (max weight / mean weight) picks on average, whatever the size of the catalog.
+    """
+
+    def __init__(self, song_ids, weights, genre_ids, genre_offsets, genre_rows):
+        """
+        Params:
+            song_ids (np.ndarray): sorted IDs of song nodes; shape (n,).
+            weights (np.ndarray): weight of each song for popularity-weighted picks; shape (n,).
+            genre_ids (np.ndarray): sorted IDs of genre nodes that have songs.
+            genre_offsets (np.ndarray): shape (len(genre_ids) + 1,).
+            genre_rows (np.ndarray): rows of song_ids.
+        """
+        self.song_ids = song_ids
+        self.weights = weights
+        self.genre_ids = genre_ids
+        self.genre_offsets = genre_offsets
+        self.genre_rows = genre_rows
+
+        self.max_weight = float(weights.max()) if len(weights) > 0 else 0.0
+        self._genre_max_weights = (
+            np.maximum.reduceat(weights[genre_rows], genre_offsets[:-1])
+            if len(genre_rows) > 0 else np.zeros(0, dtype=weights.dtype)
+        )
+
+    def __str__(self):
+        return "Song sampler over {} songs of {} genres.".format(len(self.song_ids), len(self.genre_ids))
+
+    def __len__(self):
+        return len(self.song_ids)
+
+    @classmethod
+    def load(cls, con):
+        """Reads playable songs, and their artists' genres, into a new sampler.
+
+        Params:
+            con (sqlite3.Connection): connection to knowledge base.
+
+        Returns:
+            (SongSampler).
+        """
+        with closing(con.cursor()) as cursor:
+            cursor.execute("""
+                SELECT node_id, main_artist_id, popularity
+                FROM songs
+                WHERE spotify_uri IS NOT NULL
+                ORDER BY node_id;
+            """)
+            songs = cursor.fetchall()
+            cursor.execute("SELECT source, dest FROM edges WHERE rel = (?);", (GENRE_REL_STR,))
+            artist_genres = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 2)
+
+        song_ids = np.array([x[0] for x in songs], dtype=np.int64)
+        artist_ids = np.array([x[1] for x in songs], dtype=np.int64)
+        # None => NaN
+        popularity = np.array([x[2] for x in songs], dtype=np.float64)
+        weights = np.where(np.isnan(popularity), 0, popularity) + 1
+        return cls(song_ids, weights, *cls._group_by_genre(artist_ids, artist_genres))
+
+    @staticmethod
+    def _group_by_genre(artist_ids, artist_genres):
+        """
+        Params:
+            artist_ids (np.ndarray): main artist of each song.
+            artist_genres (np.ndarray): (artist ID, genre ID) pairs; shape (num pairs, 2).
+
+        Returns:
+            (tuple): (genre_ids, genre_offsets, genre_rows); see SongSampler.__init__.
+        """
+        # songs in order of their artist, so that each artist's songs are a contiguous range
+        order = np.argsort(artist_ids, kind="stable")
+        sorted_artist_ids = artist_ids[order]
+        starts = np.searchsorted(sorted_artist_ids, artist_genres[:, 0], side="left")
+        ends = np.searchsorted(sorted_artist_ids, artist_genres[:, 0], side="right")
+
+        # one (genre, song row) pair per song of each artist of each genre
+        counts = ends - starts
+        pair_genres = np.repeat(artist_genres[:, 1], counts)
+        pair_positions = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)
+        pair_rows = order[pair_positions]
+
+        by_genre = np.lexsort((pair_rows, pair_genres))
+        pair_genres, pair_rows = pair_genres[by_genre], pair_rows[by_genre]
+        genre_ids, genre_starts = np.unique(pair_genres, return_index=True)
+        genre_offsets = np.append(genre_starts, len(pair_rows)).astype(np.int64)
+        return genre_ids, genre_offsets, pair_rows
+
+    def sample(self, weighted_by_popularity=False, genre_id=None, rand=random):
+        """Picks a random song.
+
+        Params:
+            weighted_by_popularity (bool): if True, a song is picked with probability
+                proportional to its popularity (+ 1); otherwise, every song is equally likely.
+            genre_id (int): ID of genre node; if given, only songs of that genre are picked.
+            rand (random.Random): source of randomness.
+
+        Returns:
+            (int): ID of song node; None if there are no songs (of given genre).
+        """
+        if genre_id is None:
+            start, count, max_weight, rows = 0, len(self.song_ids), self.max_weight, None
+        else:
+            g = np.searchsorted(self.genre_ids, genre_id)
+            if g >= len(self.genre_ids) or self.genre_ids[g] != genre_id:
+                return None
+            start, count = int(self.genre_offsets[g]), int(self.genre_offsets[g+1] - self.genre_offsets[g])
+            max_weight, rows = self._genre_max_weights[g], self.genre_rows
+        if count == 0:
+            return None
+
+        while True:
+            i = start + rand.randrange(count)
+            row = i if rows is None else rows[i]
+            if not weighted_by_popularity or rand.random() * max_weight < self.weights[row]:
+                return int(self.song_ids[row])
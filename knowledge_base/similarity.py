@@ -0,0 +1,214 @@
+import numpy as np
+
+from knowledge_base.feature_store import SongFeatureStore
+
+# audio features that describe how a song sounds (unlike e.g. popularity or duration)
+SIMILARITY_FEATURES = (
+    "acousticness", "danceability", "energy", "instrumentalness",
+    "liveness", "loudness", "speechiness", "valence", "tempo",
+)
+
+# catalogs larger than this are searched with an approximate (LSH) index
+MAX_BRUTE_FORCE_SONGS = 50000
+
+
+def embed(features):
+    """Turns songs' feature values into unit vectors, so that their dot product is
+    their cosine similarity.
+
+    Each feature is standardized (to mean 0 and standard deviation 1) so that features
+    with large ranges, like tempo, do not outweigh the others. Missing values are
+    replaced by the mean, i.e. they count as neither similar nor dissimilar.
+
+    Params:
+        features (np.ndarray): float feature values, NaN if missing; shape (n, num features).
+
+    Returns:
+        (np.ndarray): float32 vectors; shape (n, num features). All zeros for songs
+            missing every feature.
+    """
+    features = np.asarray(features, dtype=np.float32)
+    known = ~np.isnan(features)
+    num_known = np.maximum(known.sum(axis=0), 1)
+    means = np.where(known, features, 0).sum(axis=0) / num_known
+    centered = np.where(known, features - means, 0)
+    stds = np.sqrt((centered ** 2).sum(axis=0) / num_known)
+    vectors = centered / np.where(stds > 0, stds, 1)
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.where(norms > 0, norms, 1)).astype(np.float32)
+
+
+def _top_k(rows, similarities, k):
+    "Returns rows with the k highest similarities, most similar first."
+    if len(rows) > k:
+        best = np.argpartition(-similarities, k - 1)[:k]
+        rows, similarities = rows[best], similarities[best]
+    order = np.argsort(-similarities, kind="stable")
+    return rows[order], similarities[order]
+
+
+class BruteForceIndex:
+    """Exact nearest neighbour search: compares the query against every vector at once.
+
+    Fast enough for catalogs of up to tens of thousands of songs.
+    """
+
+    def __init__(self, vectors):
+        """
+        Params:
+            vectors (np.ndarray): unit vectors; shape (n, d).
+        """
+        self.vectors = vectors
+
+    def __str__(self):
+        return "Brute force index of {} vectors.".format(len(self.vectors))
+
+    def query(self, vector, k):
+        """
+        Params:
+            vector (np.ndarray): unit vector; shape (d,).
+            k (int): number of neighbours.
+
+        Returns:
+            (tuple): (rows of the k nearest vectors, their cosine similarities to given
+                vector), most similar first.
+        """
+        return _top_k(np.arange(len(self.vectors)), self.vectors @ vector, k)
+
+
+class LSHIndex:
+    """Approximate nearest neighbour search by random-projection locality-sensitive hashing.
+
+    Each of num_tables tables hashes a vector to num_bits bits: which side of num_bits
+    random hyperplanes it falls on. Vectors at a small angle from each other are likely
+    to share a bucket in at least one table, so a query only compares itself against
+    vectors in its own buckets (and those one bit away, if they are not enough).
+    More tables raise recall; more bits make buckets smaller and queries faster.
+    """
+
+    def __init__(self, vectors, num_tables=8, num_bits=12, seed=0):
+        """
+        Params:
+            vectors (np.ndarray): unit vectors; shape (n, d).
+            num_tables (int): number of hash tables.
+            num_bits (int): number of bits in each hash.
+            seed (int): seed for choosing the random hyperplanes.
+        """
+        self.vectors = vectors
+        self.num_bits = num_bits
+        self.hyperplanes = np.random.RandomState(seed).standard_normal(
+            (num_tables, vectors.shape[1], num_bits)).astype(np.float32)
+        self._powers = 1 << np.arange(num_bits, dtype=np.int64)
+
+        # one list of buckets per table; key is hash, val is rows of vectors with that hash
+        self.tables = []
+        for hashes in self._hash(vectors):
+            order = np.argsort(hashes, kind="stable")
+            unique_hashes, starts = np.unique(hashes[order], return_index=True)
+            self.tables.append(dict(zip(unique_hashes.tolist(), np.split(order, starts[1:]))))
+
+    def __str__(self):
+        return "LSH index of {} vectors with {} tables of {} bits.".format(
+            len(self.vectors), len(self.tables), self.num_bits)
+
+    def _hash(self, vectors):
+        "Returns hash of each vector in each table; shape (num tables, n)."
+        return ((np.einsum("nd,tdb->tnb", vectors, self.hyperplanes) > 0) @ self._powers)
+
+    def query(self, vector, k):
+        """Same as BruteForceIndex.query, but may miss some of the nearest vectors."""
+        hashes = self._hash(vector[np.newaxis, :])[:, 0].tolist()
+        candidates = [table.get(h) for table, h in zip(self.tables, hashes)]
+        candidates = [rows for rows in candidates if rows is not None]
+        if sum(len(rows) for rows in candidates) <= k:
+            # multi-probe: also look in buckets that differ by one bit
+            candidates.extend(
+                table[h ^ int(bit)]
+                for table, h in zip(self.tables, hashes)
+                for bit in self._powers
+                if h ^ int(bit) in table
+            )
+        if len(candidates) == 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+
+        rows = np.unique(np.concatenate(candidates))
+        return _top_k(rows, self.vectors[rows] @ vector, k)
+
+
+class SongSimilarityEngine:
+    """Finds the songs that sound most like a given song, by the cosine similarity of
+    their audio features (see embed()).
+
+    Songs missing every audio feature are left out. Searches exactly for catalogs of up
+    to MAX_BRUTE_FORCE_SONGS songs, and approximately (with an LSHIndex) beyond that.
+    """
+
+    def __init__(self, song_ids, vectors, index=None):
+        """
+        Params:
+            song_ids (np.ndarray): sorted IDs of song nodes; shape (n,).
+            vectors (np.ndarray): unit vector of each song; shape (n, d).
+            index (BruteForceIndex or LSHIndex): index of vectors; chosen by catalog size if None.
+        """
+        self.song_ids = song_ids
+        self.vectors = vectors
+        if index is None:
+            index = BruteForceIndex(vectors) if len(song_ids) <= MAX_BRUTE_FORCE_SONGS else LSHIndex(vectors)
+        self.index = index
+
+    def __str__(self):
+        return "Similarity engine over {} songs, using {}".format(len(self.song_ids), self.index)
+
+    def __len__(self):
+        return len(self.song_ids)
+
+    @classmethod
+    def load(cls, con):
+        """Reads the songs table into a new engine.
+
+        Params:
+            con (sqlite3.Connection): connection to knowledge base.
+
+        Returns:
+            (SongSimilarityEngine).
+        """
+        return cls.from_feature_store(SongFeatureStore.load(con))
+
+    @classmethod
+    def from_feature_store(cls, feature_store, index_cls=None):
+        """
+        Params:
+            feature_store (SongFeatureStore).
+            index_cls (class): e.g. LSHIndex; chosen by catalog size if None.
+
+        Returns:
+            (SongSimilarityEngine).
+        """
+        columns = [SongFeatureStore.FEATURES.index(name) for name in SIMILARITY_FEATURES]
+        features = feature_store.features[:, columns]
+        has_features = ~np.isnan(features).all(axis=1)
+        vectors = embed(features[has_features])
+        index = None if index_cls is None else index_cls(vectors)
+        return cls(feature_store.song_ids[has_features], vectors, index)
+
+    def get_similar(self, song_id, k=10):
+        """
+        Params:
+            song_id (int): ID of song's node in semantic network.
+            k (int): max number of songs returned.
+
+        Returns:
+            (list of tuples): (song ID, cosine similarity) of the k songs most similar
+                to given song, most similar first. Empty if song has no audio features.
+        """
+        row = np.searchsorted(self.song_ids, song_id)
+        if row >= len(self.song_ids) or self.song_ids[row] != song_id:
+            return []
+        # one extra, since the song is its own nearest neighbour
+        rows, similarities = self.index.query(self.vectors[row], k + 1)
+        return [
+            (int(self.song_ids[r]), float(similarity))
+            for r, similarity in zip(rows, similarities)
+            if r != row
+        ][:k]
@@ -0,0 +1,118 @@
+import os
+import urllib.parse
+
+
+class StorageProfile:
+    """How connections to the knowledge base are opened: the SQLite journal mode, how
+    often writes are synced to disk, how much is cached in memory, and whether the DB
+    may be written to at all.
+
+    Usage:
+        KnowledgeBaseAPI(db_path, storage_profile="wal")
+        KnowledgeBaseAPI(db_path, storage_profile=StorageProfile(journal_mode="WAL", mmap_size=2**30))
+
+    In WAL mode, readers read the last committed state of the DB while a writer appends
+    to the write-ahead log, so neither blocks the other; in the default (rollback
+    journal) mode, readers wait while a writer commits. WAL mode is stored in the DB
+    file, so once a writer has turned it on, read-only connections get it too.
+    """
+
+    def __init__(
+        self,
+        journal_mode=None,
+        synchronous=None,
+        cache_size=None,
+        mmap_size=None,
+        read_only=False,
+        immutable=False,
+    ):
+        """
+        Params:
+            journal_mode (str): e.g. "WAL"; None leaves the DB's journal mode as is.
+            synchronous (str): e.g. "NORMAL", which in WAL mode syncs at checkpoints
+                instead of every commit; None for SQLite's default ("FULL").
+            cache_size (int): page cache size per connection; negative for KiB
+                (e.g. -65536 for 64 MiB), positive for number of pages.
+            mmap_size (int): max number of bytes of the DB file read through memory-mapped I/O.
+            read_only (bool): if True, the DB is opened read-only, and writes fail.
+            immutable (bool): if True, the DB is assumed not to change while it is open
+                (e.g. a copy made for serving), so it is read without any locking.
+                Implies read_only. Results are undefined if the DB is written to anyway.
+        """
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.cache_size = cache_size
+        self.mmap_size = mmap_size
+        self.read_only = read_only or immutable
+        self.immutable = immutable
+
+    def __str__(self):
+        return "Storage profile: {}.".format(", ".join(
+            "{}={}".format(name, val) for name, val in vars(self).items() if val not in (None, False)
+        ) or "SQLite defaults")
+
+    def get_database(self, db_path):
+        """
+        Params:
+            db_path (str): path to SQLite database file.
+
+        Returns:
+            (tuple): (database, uri) arguments of sqlite3.connect.
+        """
+        if not self.read_only:
+            return db_path, False
+        # with mode=ro, opening a DB that does not exist fails instead of creating it
+        params = "mode=ro&immutable=1" if self.immutable else "mode=ro"
+        return "file:{}?{}".format(urllib.parse.quote(os.path.abspath(db_path)), params), True
+
+    def get_pragmas(self):
+        """
+        Returns:
+            (list of str): PRAGMA statements to run on each new connection.
+        """
+        pragmas = []
+        # changing the journal mode writes to the DB
+        if self.journal_mode is not None and not self.read_only:
+            pragmas.append("PRAGMA journal_mode = {}".format(self.journal_mode))
+        if self.synchronous is not None:
+            pragmas.append("PRAGMA synchronous = {}".format(self.synchronous))
+        if self.cache_size is not None:
+            pragmas.append("PRAGMA cache_size = {:d}".format(self.cache_size))
+        if self.mmap_size is not None:
+            pragmas.append("PRAGMA mmap_size = {:d}".format(self.mmap_size))
+        if self.read_only:
+            pragmas.append("PRAGMA query_only = 1")
+        return pragmas
+
+
+CACHE_SIZE_KIB = 64 * 1024
+MMAP_SIZE_BYTES = 256 * 1024 * 1024
+
+STORAGE_PROFILES = dict(
+    # rollback journal, and SQLite's default cache; how the knowledge base was always opened
+    default=StorageProfile(),
+    # for processes that write (e.g. refreshing from Spotify) while others read
+    wal=StorageProfile(
+        journal_mode="WAL", synchronous="NORMAL", cache_size=-CACHE_SIZE_KIB, mmap_size=MMAP_SIZE_BYTES,
+    ),
+    # for serving: reads see writes committed by other processes, but cannot make any
+    read_only=StorageProfile(read_only=True, cache_size=-CACHE_SIZE_KIB, mmap_size=MMAP_SIZE_BYTES),
+    # for serving a copy of the knowledge base that nothing writes to
+    immutable=StorageProfile(immutable=True, cache_size=-CACHE_SIZE_KIB, mmap_size=MMAP_SIZE_BYTES),
+)
+
+
+def get_storage_profile(storage_profile):
+    """
+    Params:
+        storage_profile (str or StorageProfile): name of one of STORAGE_PROFILES, or a profile.
+
+    Returns:
+        (StorageProfile).
+    """
+    if isinstance(storage_profile, StorageProfile):
+        return storage_profile
+    if storage_profile not in STORAGE_PROFILES:
+        raise ValueError("Unknown storage profile '{}'; expected one of: {}.".format(
+            storage_profile, ", ".join(STORAGE_PROFILES)))
+    return STORAGE_PROFILES[storage_profile]
@@ -0,0 +1,58 @@
+import unicodedata
+
+
+def normalize_name(name):
+    """Maps a name to the form in which names are compared, so that lookups ignore case,
+    accents, and extra whitespace.
+
+    E.g.
+        "Beyoncé"           => "beyonce"
+        "  Thank U,  Next " => "thank u, next"
+
+    Stored alongside each node's name (nodes.normalized_name) and indexed, so that lookups
+    by name are exact matches on it.
+
+    Params:
+        name (str): e.g. "Beyoncé"; None is returned as is.
+
+    Returns:
+        (str): e.g. "beyonce".
+    """
+    if name is None:
+        return None
+    if name.isascii():
+        # nothing to decompose, which is the case for most names
+        return " ".join(name.casefold().split())
+    decomposed = unicodedata.normalize("NFKD", name)
+    without_accents = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(without_accents.casefold().split())
+
+def remove_parenthised_section(s):
+    """
+    E.g. "Sorry (Remix)" => "Sorry"
+    """
+    tokens = s.split("(")
+    no_paren = ""
+    for t in tokens:
+        if ")" in t:
+            no_paren += t.split(")")[-1]
+        else:
+            no_paren += t
+    return no_paren.strip()
+
+def remove_dash_section(s):
+    """
+    E.g. "Sorry - Live" => "Sorry"
+    """
+    return s.split("-")[0].strip()
+
+def remove_extra_sections(name):
+    """Strips what tends to set versions of a song apart from the song itself, e.g. remixes
+    or live recordings.
+
+    E.g. "Sorry (Remix) - Live" => "Sorry"
+
+    Returns:
+        (str): given name as is, if nothing would be left of it.
+    """
+    return remove_dash_section(remove_parenthised_section(name)) or name.strip()
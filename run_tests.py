@@ -11,6 +11,28 @@ To run the tests:
 """
 from unit_tests.knowledge_base.test_knowledge_base_api import TestMusicKnowledgeBaseAPI
 from unit_tests.knowledge_base.test_db_schema import TestDbSchema
+from unit_tests.knowledge_base.test_connection_pool import TestConnectionPool
+from unit_tests.knowledge_base.test_graph import TestSemanticNetworkSnapshot, TestMusicKnowledgeBaseAPIWithGraphSnapshot
+from unit_tests.knowledge_base.test_feature_store import TestSongFeatureStore
+from unit_tests.knowledge_base.test_similarity import TestSongSimilarityEngine
+from unit_tests.knowledge_base.test_query_plans import TestQueryPlans
+from unit_tests.knowledge_base.test_batch_writer import TestBatchWriter
+from unit_tests.knowledge_base.test_text import TestText
+from unit_tests.knowledge_base.test_fuzzy import TestFuzzyNameMatcher
+from unit_tests.knowledge_base.test_metrics import TestMetrics
+from unit_tests.knowledge_base.test_storage import TestStorageProfiles
+from unit_tests.knowledge_base.test_name_index import TestNameIndex
+from unit_tests.knowledge_base.test_sampler import TestSongSampler
+from unit_tests.utils.test_spotify_client import TestSpotifyClient
+from unit_tests.utils.test_rate_limiter import TestTokenBucket
+from unit_tests.utils.test_response_cache import TestResponseCache
+from unit_tests.scripts.test_spotify_crawler import TestSpotifyCrawler
+from unit_tests.scripts.test_materialize_similar_songs import TestMaterializeSimilarSongs
+from unit_tests.scripts.test_benchmark_recommendations import TestBenchmarkRecommendations
+from unit_tests.scripts.test_benchmark_storage_profiles import TestBenchmarkStorageProfiles
+from unit_tests.scripts.test_extract_entities import TestExtractEntities
+from unit_tests.app.test_bounded_executor import TestBoundedExecutor
+from unit_tests.app.test_recommendation_cache import TestRecommendationCache
 from unit_tests.app.server.test_server import TestServer
 
 if __name__ == '__main__':
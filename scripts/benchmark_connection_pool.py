@@ -0,0 +1,103 @@
+"""
+Compares knowledge base query throughput with and without connection pooling.
+
+Runs the same mix of read queries (the ones a recommendation request issues)
+against the shipped knowledge base, once with a new connection per query and
+once with pooled connections, and reports queries per second for each.
+
+Example:
+    python scripts/benchmark_connection_pool.py
+    python scripts/benchmark_connection_pool.py -d knowledge_base/knowledge_base.db -n 2000 -t 4
+"""
+
+import contextlib
+import os
+import random
+import sys
+import threading
+import time
+from argparse import ArgumentParser
+
+sys.path.append('../')
+sys.path.append('.')
+from knowledge_base.api import KnowledgeBaseAPI
+
+DEFAULT_DB_PATH = "knowledge_base/knowledge_base.db"
+
+
+def _sample_names(kb_api, num_samples, seed):
+    rand = random.Random(seed)
+    song_names = kb_api.get_all_song_names()
+    artist_names = kb_api.get_all_artist_names()
+    return (
+        [rand.choice(song_names) for _ in range(num_samples)],
+        [rand.choice(artist_names) for _ in range(num_samples)],
+    )
+
+def _run_queries(kb_api, song_names, artist_names):
+    for song_name, artist_name in zip(song_names, artist_names):
+        kb_api.get_song_data(song_name)
+        kb_api.get_related_entities(artist_name)
+        kb_api.get_songs_by_artist(artist_name)
+        kb_api.get_node_ids_by_entity_type(artist_name)
+
+QUERIES_PER_ITERATION = 4
+
+def measure_qps(db_path, pool_size, song_names, artist_names, num_threads):
+    """Runs the query mix split across threads.
+
+    Returns:
+        (float): queries per second.
+    """
+    kb_api = KnowledgeBaseAPI(db_path, pool_size=pool_size)
+    chunk_size = len(song_names) // num_threads
+    threads = [
+        threading.Thread(target=_run_queries, args=(
+            kb_api,
+            song_names[i*chunk_size:(i+1)*chunk_size],
+            artist_names[i*chunk_size:(i+1)*chunk_size],
+        ))
+        for i in range(num_threads)
+    ]
+    try:
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        kb_api.close()
+    return chunk_size * num_threads * QUERIES_PER_ITERATION / elapsed
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("-d", type=str, dest="db_path", default=DEFAULT_DB_PATH,
+                        help="Path to knowledge base. Ex: -d ./knowledge_base/knowledge_base.db")
+    parser.add_argument("-n", type=int, dest="num_iterations", default=1000,
+                        help="Number of iterations of the query mix.")
+    parser.add_argument("-t", type=int, dest="num_threads", default=1,
+                        help="Number of threads issuing queries.")
+    parser.add_argument("-p", type=int, dest="pool_size", default=8,
+                        help="Pool size to benchmark against unpooled connections.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # silence the API's warnings about ambiguous names, etc.
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        kb_api = KnowledgeBaseAPI(args.db_path)
+        try:
+            song_names, artist_names = _sample_names(kb_api, args.num_iterations, args.seed)
+        finally:
+            kb_api.close()
+        before = measure_qps(args.db_path, 0, song_names, artist_names, args.num_threads)
+        after = measure_qps(args.db_path, args.pool_size, song_names, artist_names, args.num_threads)
+
+    print(f"Ran {args.num_iterations * QUERIES_PER_ITERATION} queries on {args.db_path} with {args.num_threads} thread(s):")
+    print("  {:<26}{:10.1f} queries/s".format("new connection per query:", before))
+    print("  {:<26}{:10.1f} queries/s".format(f"pooled (max {args.pool_size}):", after))
+    print(f"  speedup: {after / before:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
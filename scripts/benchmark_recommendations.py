@@ -0,0 +1,463 @@
+"""
+Measures how recommendations scale with the size of the knowledge base.
+
+Generates synthetic knowledge bases (through the same schema and BatchWriter that
+real ones are built with), then calls each public KnowledgeBaseAPI method and each
+server handler with randomly sampled songs and artists, and reports latency
+percentiles and throughput for each as JSON, so that runs can be compared across commits.
+
+Catalogs are seeded, so the same sizes and seed always give the same knowledge base
+and the same queries. They are kept in a directory (-o) and reused by later runs.
+Artists have a long-tailed number of songs, 1 to 3 genres (some far more common
+than others), and a few related artists, mostly of the same genre.
+
+Example:
+    python scripts/benchmark_recommendations.py
+    python scripts/benchmark_recommendations.py --sizes 1000 100000 1000000 -n 500 --json results.json
+    python scripts/benchmark_recommendations.py --sizes 100000 --json new.json --compare old.json
+"""
+
+import contextlib
+import datetime
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from contextlib import closing
+
+import numpy as np
+
+sys.path.append('../')
+sys.path.append('.')
+from knowledge_base.api import KnowledgeBaseAPI
+from scripts import test_db_utils
+
+DEFAULT_SIZES = (1000, 100000, 1000000)
+DEFAULT_CATALOG_DIR = os.path.join(tempfile.gettempdir(), "muze_benchmark")
+DEFAULT_NUM_CALLS = 200
+# methods that read the whole catalog are called this many times fewer
+SLOW_METHOD_DIVISOR = 20
+
+# syllables that names of artists, songs, and genres are made of
+SYLLABLES = (
+    "la", "na", "mi", "ro", "ka", "ze", "to", "ri", "shi", "ba", "do", "fe", "lu", "mo",
+    "sa", "ti", "vo", "ya", "el", "an", "or", "is", "un", "ay", "be", "co", "di", "ga",
+)
+SONG_NAME_SUFFIXES = (" (Remix)", " - Live", " (Acoustic)", " - Radio Edit")
+
+
+def _make_word(rand, num_syllables):
+    return "".join(rand.choice(SYLLABLES, num_syllables))
+
+def _make_names(rand, num_names, num_words, unique=False):
+    """
+    Params:
+        num_words (tuple): (min, max) number of words in a name.
+        unique (bool): if True, no two names are the same once normalized.
+    """
+    vocabulary = [_make_word(rand, n) for n in rand.randint(1, 4, max(100, num_names // 10))]
+    names, seen = [], set()
+    for n in rand.randint(num_words[0], num_words[1] + 1, num_names):
+        name = " ".join(vocabulary[i] for i in rand.randint(0, len(vocabulary), n)).title()
+        if unique:
+            while name.lower() in seen:
+                name = "{} {}".format(name, _make_word(rand, 2).title())
+            seen.add(name.lower())
+        names.append(name)
+    return names
+
+def _make_audio_features(rand, num_songs):
+    "Returns feature values of each song, roughly distributed like Spotify's."
+    return dict(
+        acousticness=rand.beta(0.5, 1.5, num_songs),
+        danceability=rand.beta(5, 3, num_songs),
+        energy=rand.beta(4, 3, num_songs),
+        instrumentalness=rand.beta(0.2, 2, num_songs),
+        liveness=rand.beta(1.5, 6, num_songs),
+        loudness=rand.normal(-8, 3, num_songs).clip(-60, 0),
+        speechiness=rand.beta(1, 12, num_songs),
+        valence=rand.beta(2, 2, num_songs),
+        tempo=rand.normal(120, 25, num_songs).clip(40, 220),
+        mode=rand.choice(["major", "minor"], num_songs),
+        musical_key=rand.randint(0, 12, num_songs),
+        time_signature=rand.choice([3, 4, 4, 4, 4, 5], num_songs),
+    )
+
+def generate_catalog(db_path, num_songs, seed=0):
+    """Creates a knowledge base with num_songs synthetic songs, and their artists and genres.
+
+    Params:
+        db_path (str): path of new DB; must not exist yet.
+        num_songs (int): e.g. 100000.
+        seed (int): same seed, same knowledge base.
+
+    Returns:
+        (dict): number of songs, artists, genres, and edges in new knowledge base; see count_entities.
+    """
+    rand = np.random.RandomState(seed)
+
+    # long tail: most artists have a few songs, some have hundreds
+    songs_per_artist = []
+    while sum(songs_per_artist) < num_songs:
+        songs_per_artist.append(int(1 + rand.lognormal(1.5, 1.0)))
+    songs_per_artist[-1] -= sum(songs_per_artist) - num_songs
+    num_artists = len(songs_per_artist)
+
+    genre_names = _make_names(rand, int(np.clip(num_artists // 50, 10, 1500)), (1, 2), unique=True)
+    # some genres are far more common than others
+    genre_weights = 1 / np.arange(1, len(genre_names) + 1)
+    genre_weights /= genre_weights.sum()
+    artist_genres = [
+        rand.choice(len(genre_names), min(n, len(genre_names)), replace=False, p=genre_weights)
+        for n in 1 + rand.binomial(2, 0.4, num_artists)
+    ]
+    artist_names = _make_names(rand, num_artists, (1, 3), unique=True)
+    artist_followers = rand.lognormal(9, 2.5, num_artists).astype(np.int64)
+    # popular artists have popular songs
+    artist_popularity = np.argsort(np.argsort(artist_followers)) / max(num_artists - 1, 1) * 80
+
+    song_names = _make_names(rand, num_songs, (1, 4))
+    has_suffix = rand.random_sample(num_songs) < 0.05
+    suffixes = rand.choice(len(SONG_NAME_SUFFIXES), num_songs)
+    song_artists = np.repeat(np.arange(num_artists), songs_per_artist)
+    song_popularity = (artist_popularity[song_artists] + rand.normal(0, 10, num_songs)).clip(0, 100).astype(np.int64)
+    durations = rand.normal(210000, 45000, num_songs).clip(30000, 900000).astype(np.int64)
+    features = _make_audio_features(rand, num_songs)
+    has_features = rand.random_sample(num_songs) >= 0.05
+
+    # related artists are mostly of the same (main) genre
+    artists_by_genre = dict()
+    for artist, genres in enumerate(artist_genres):
+        artists_by_genre.setdefault(int(genres[0]), []).append(artist)
+    num_related = np.minimum(rand.poisson(5, num_artists), 20)
+
+    test_db_utils.create_db(db_path)
+    kb_api = KnowledgeBaseAPI(db_path)
+    similarity_rel_str = kb_api.approved_relations["similarity"]
+    try:
+        with kb_api.batch_writer() as writer:
+            artist_ids = [
+                writer.add_artist(
+                    artist_names[i],
+                    genres=[genre_names[g] for g in artist_genres[i]],
+                    num_spotify_followers=int(artist_followers[i]),
+                    spotify_id="synthetic-artist-{}".format(i),
+                )
+                for i in range(num_artists)
+            ]
+            # different artists' songs may share a name, but an artist's own songs may not
+            song_keys = set()
+            for i in range(num_songs):
+                name = song_names[i] + (SONG_NAME_SUFFIXES[suffixes[i]] if has_suffix[i] else "")
+                while (song_artists[i], name.lower()) in song_keys:
+                    name = "{} {}".format(name, _make_word(rand, 2).title())
+                song_keys.add((song_artists[i], name.lower()))
+                writer.add_song(
+                    name,
+                    artist_names[song_artists[i]],
+                    duration_ms=int(durations[i]),
+                    popularity=int(song_popularity[i]),
+                    spotify_uri="spotify:track:synthetic{}".format(i),
+                    audio_features={k: v[i].item() for k, v in features.items()} if has_features[i] else dict(),
+                )
+            for i in range(num_artists):
+                same_genre = artists_by_genre[int(artist_genres[i][0])]
+                candidates = same_genre if rand.random_sample() < 0.8 else range(num_artists)
+                for j in rand.choice(len(candidates), min(num_related[i], len(candidates)), replace=False):
+                    if candidates[j] != i:
+                        writer.connect_entities(
+                            artist_ids[i], artist_ids[candidates[j]], similarity_rel_str, int(rand.randint(50, 101)))
+    finally:
+        kb_api.close()
+    return count_entities(db_path)
+
+def count_entities(db_path):
+    """
+    Returns:
+        (dict): number of songs, artists, genres, and edges in given knowledge base.
+    """
+    with closing(sqlite3.connect(db_path)) as con:
+        return {
+            table: con.execute("SELECT count(*) FROM {};".format(table)).fetchone()[0]
+            for table in ("songs", "artists", "genres", "edges")
+        }
+
+def get_catalog(catalog_dir, num_songs, seed=0):
+    """Returns path to synthetic knowledge base of given size, generating it unless it already exists.
+
+    Returns:
+        (tuple): (path to DB, number of seconds it took to generate; None if it already existed).
+    """
+    os.makedirs(catalog_dir, exist_ok=True)
+    db_path = os.path.join(catalog_dir, "synthetic_{}_seed{}.db".format(num_songs, seed))
+    if os.path.exists(db_path):
+        return db_path, None
+
+    # generated under another name, so that an interrupted run does not leave a partial catalog behind
+    partial_path = db_path + ".partial"
+    if os.path.exists(partial_path):
+        os.remove(partial_path)
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        generate_catalog(partial_path, num_songs, seed)
+    os.rename(partial_path, db_path)
+    return db_path, time.perf_counter() - start
+
+def _sample_queries(kb_api, num_queries, seed):
+    """
+    Returns:
+        (list of dicts): with a song's ID and name, its artist's name, the same name
+            misspelled, and another song's ID.
+    """
+    rand = np.random.RandomState(seed)
+    with kb_api.pool.connection() as con:
+        song_ids = np.array([x[0] for x in con.execute("SELECT node_id FROM songs ORDER BY node_id;")])
+    sampled = rand.choice(song_ids, num_queries)
+    songs = {x["id"]: x for x in kb_api.get_songs_by_ids(sampled.tolist())}
+    queries = []
+    for song_id, other_song_id in zip(sampled.tolist(), rand.choice(song_ids, num_queries).tolist()):
+        name = songs[song_id]["song_name"]
+        typo = int(rand.randint(0, len(name)))
+        queries.append(dict(
+            song_id=song_id,
+            song_name=name,
+            artist_name=songs[song_id]["artist_name"],
+            misspelled_song_name=name[:typo] + "x" + name[typo+1:],
+            other_song_id=other_song_id,
+        ))
+    return queries
+
+def _get_api_methods():
+    """
+    Returns:
+        (list of tuples): (name, function of KnowledgeBaseAPI and query, whether it reads the whole catalog).
+    """
+    return [
+        ("get_song_data", lambda kb, q: kb.get_song_data(q["song_name"]), False),
+        ("get_song_data(song_id)", lambda kb, q: kb.get_song_data(song_id=q["song_id"]), False),
+        ("get_songs_by_ids", lambda kb, q: kb.get_songs_by_ids([q["song_id"], q["other_song_id"]]), False),
+        ("get_artist_data", lambda kb, q: kb.get_artist_data(q["artist_name"]), False),
+        ("get_songs_by_artist", lambda kb, q: kb.get_songs_by_artist(q["artist_name"]), False),
+        ("get_related_entities", lambda kb, q: kb.get_related_entities(q["artist_name"]), False),
+        ("get_node_ids_by_entity_type", lambda kb, q: kb.get_node_ids_by_entity_type(q["artist_name"]), False),
+        ("songs_are_related", lambda kb, q: kb.songs_are_related(q["song_id"], q["other_song_id"], "more happy"), False),
+        ("filter_related_songs",
+            lambda kb, q: kb.filter_related_songs([q["other_song_id"]], q["song_id"], "more happy"), False),
+        ("get_ranked_related_songs", lambda kb, q: kb.get_ranked_related_songs(q["song_id"], "more happy", k=10), False),
+        ("get_similar_songs", lambda kb, q: kb.get_similar_songs(q["song_id"]), False),
+        ("find_similar_names", lambda kb, q: kb.find_similar_names(q["misspelled_song_name"], "song"), False),
+        ("get_stale_artists", lambda kb, q: kb.get_stale_artists(int(time.time()), limit=100), False),
+        ("get_random_song", lambda kb, q: kb.get_random_song(), True),
+        ("get_all_song_names", lambda kb, q: kb.get_all_song_names(), True),
+        ("get_all_artist_names", lambda kb, q: kb.get_all_artist_names(), True),
+        ("iter_song_names", lambda kb, q: sum(1 for _ in kb.iter_song_names(batch_size=10000)), True),
+        ("iter_artists", lambda kb, q: sum(1 for _ in kb.iter_artists(batch_size=10000)), True),
+    ]
+
+def _get_write_methods():
+    """
+    Returns:
+        (list of tuples): same as _get_api_methods, for methods that add to the knowledge base.
+            They are measured last, since each write invalidates in-memory snapshots.
+    """
+    rel_str = "similar to"
+    return [
+        ("add_genre", lambda kb, q, i: kb.add_genre("benchmark genre {}".format(i))),
+        ("add_artist", lambda kb, q, i: kb.add_artist("benchmark artist {}".format(i), genres=["benchmark genre 0"])),
+        ("add_song", lambda kb, q, i: kb.add_song("benchmark song {}".format(i), "benchmark artist 0", popularity=50)),
+        ("connect_entities",
+            lambda kb, q, i: kb.connect_entities("benchmark artist {}".format(i), q["artist_name"], rel_str, 50)),
+    ]
+
+def _get_server_handlers(server):
+    """
+    Returns:
+        (list of tuples): (name, function of query).
+    """
+    client = server.socket_io.test_client(server.app)
+
+    def emit(event, *args):
+        client.emit(event, *args)
+        client.get_received()
+
+    return [
+        ("get_similar_song", lambda q: server.get_similar_song(q["song_name"])),
+        ("get_finegrained_recommendation",
+            lambda q: server.get_finegrained_recommendation(q["song_name"], "more acoustic")),
+        ("event 'get recommendation'", lambda q: emit("get recommendation", dict(song=q["song_name"]))),
+        ("event 'get recommendation' (adjective)",
+            lambda q: emit("get recommendation", dict(song=q["song_name"], adjective="less happy"))),
+        ("event 'get random song'", lambda q: emit("get random song")),
+    ], client
+
+def measure(func, args):
+    """Calls func once with each of args.
+
+    Returns:
+        (dict): number of calls, latency of first call (which may load snapshots) and
+            percentiles of the others in milliseconds, and calls per second (also not
+            counting the first call).
+    """
+    latencies = []
+    for arg in args:
+        start = time.perf_counter()
+        func(arg)
+        latencies.append(time.perf_counter() - start)
+
+    latencies = np.array(latencies) * 1000
+    rest = latencies[1:] if len(latencies) > 1 else latencies
+    return dict(
+        calls=len(latencies),
+        first_call_ms=round(float(latencies[0]), 3),
+        mean_ms=round(float(rest.mean()), 3),
+        p50_ms=round(float(np.percentile(rest, 50)), 3),
+        p90_ms=round(float(np.percentile(rest, 90)), 3),
+        p99_ms=round(float(np.percentile(rest, 99)), 3),
+        max_ms=round(float(rest.max()), 3),
+        calls_per_second=round(1000 * len(rest) / rest.sum(), 1),
+    )
+
+def benchmark_catalog(db_path, num_calls=DEFAULT_NUM_CALLS, seed=0, include_server=True):
+    """Measures every method and handler against the given knowledge base.
+
+    The knowledge base is used as the server uses it (with in-memory snapshots). Writes
+    are measured last, and do modify it.
+
+    Returns:
+        (dict): key is method (e.g. "KnowledgeBaseAPI.get_song_data") or handler (e.g.
+            "server.get_similar_song") name, val is its measurements; see measure().
+    """
+    results = dict()
+    kb_api = KnowledgeBaseAPI(db_path, use_graph_snapshot=True, use_feature_store=True)
+    try:
+        queries = _sample_queries(kb_api, num_calls, seed)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for name, method, is_slow in _get_api_methods():
+                num_method_calls = max(2, num_calls // SLOW_METHOD_DIVISOR) if is_slow else num_calls
+                results["KnowledgeBaseAPI." + name] = measure(
+                    lambda q: method(kb_api, q), queries[:num_method_calls])
+            if include_server:
+                results.update(_benchmark_server(kb_api, queries))
+            for name, method in _get_write_methods():
+                results["KnowledgeBaseAPI." + name] = measure(
+                    lambda x: method(kb_api, x[1], x[0]), list(enumerate(queries)))
+    finally:
+        kb_api.close()
+    return results
+
+def _benchmark_server(kb_api, queries):
+    "Measures server handlers, as if the server was running on given knowledge base."
+    import app.server as server
+    music_api, server.music_api = server.music_api, kb_api
+    kb_api.add_write_listener(server.recommendation_cache.clear)
+    server.recommendation_cache.clear()
+    handlers, client = _get_server_handlers(server)
+    try:
+        results = {"server." + name: measure(handler, queries) for name, handler in handlers}
+        results["server.recommendation_cache"] = server.recommendation_cache.get_stats()
+    finally:
+        client.disconnect()
+        server.music_api = music_api
+        server.recommendation_cache.clear()
+    return results
+
+def _get_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(sizes=DEFAULT_SIZES, catalog_dir=DEFAULT_CATALOG_DIR, num_calls=DEFAULT_NUM_CALLS, seed=0,
+        include_server=True):
+    """Benchmarks a catalog of each given size.
+
+    Catalogs are copied before being measured, since writes are measured too.
+
+    Returns:
+        (dict): JSON-serializable results, along with what they were measured on.
+    """
+    catalogs = []
+    for num_songs in sizes:
+        db_path, generate_seconds = get_catalog(catalog_dir, num_songs, seed)
+        if generate_seconds is not None:
+            print(f"Generated catalog of {num_songs} songs in {generate_seconds:.1f} s: {db_path}")
+        scratch_path = db_path + ".scratch"
+        _copy_db(db_path, scratch_path)
+        try:
+            print(f"Benchmarking catalog of {num_songs} songs..")
+            catalogs.append(dict(
+                count_entities(db_path),
+                generate_seconds=None if generate_seconds is None else round(generate_seconds, 1),
+                results=benchmark_catalog(scratch_path, num_calls, seed, include_server),
+            ))
+        finally:
+            os.remove(scratch_path)
+
+    return dict(
+        commit=_get_commit(),
+        timestamp=datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        python=platform.python_version(),
+        platform=platform.platform(),
+        seed=seed,
+        num_calls=num_calls,
+        catalogs=catalogs,
+    )
+
+def _copy_db(source_path, dest_path):
+    with closing(sqlite3.connect(source_path)) as source, closing(sqlite3.connect(dest_path)) as dest:
+        source.backup(dest)
+
+def print_summary(results, baseline=None):
+    """Prints p50 latency and throughput of each method, and how p50 changed since baseline (if given)."""
+    baseline_catalogs = {x["songs"]: x["results"] for x in (baseline or dict()).get("catalogs", [])}
+    for catalog in results["catalogs"]:
+        print("\n{} songs, {} artists, {} genres, {} edges:".format(
+            catalog["songs"], catalog["artists"], catalog["genres"], catalog["edges"]))
+        print("  {:<52}{:>12}{:>12}{:>12}{:>10}".format("", "p50 ms", "p99 ms", "calls/s", "vs base"))
+        before = baseline_catalogs.get(catalog["songs"], dict())
+        for name, x in catalog["results"].items():
+            if "p50_ms" not in x:
+                continue
+            change = ""
+            if name in before and before[name]["p50_ms"] > 0:
+                change = "{:+.0%}".format(x["p50_ms"] / before[name]["p50_ms"] - 1)
+            print("  {:<52}{:>12.3f}{:>12.3f}{:>12.1f}{:>10}".format(
+                name, x["p50_ms"], x["p99_ms"], x["calls_per_second"], change))
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="Number of songs in each synthetic catalog. Ex: --sizes 1000 100000")
+    parser.add_argument("-o", type=str, dest="catalog_dir", default=DEFAULT_CATALOG_DIR,
+                        help="Directory in which generated catalogs are kept for reuse.")
+    parser.add_argument("-n", type=int, dest="num_calls", default=DEFAULT_NUM_CALLS,
+                        help="Number of calls to each method.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=str, dest="json_path", default=None,
+                        help="Path of file to write results to. Ex: --json results.json")
+    parser.add_argument("--compare", type=str, dest="baseline_path", default=None,
+                        help="Path of results of an earlier run, to compare against.")
+    parser.add_argument("--no-server", action="store_false", dest="include_server",
+                        help="Skip server handlers.")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.catalog_dir, args.num_calls, args.seed, args.include_server)
+    baseline = None
+    if args.baseline_path is not None:
+        with open(args.baseline_path) as f:
+            baseline = json.load(f)
+    print_summary(results, baseline)
+    if args.json_path is not None:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote results to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
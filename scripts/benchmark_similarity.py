@@ -0,0 +1,94 @@
+"""
+Compares approximate (LSH) similar-song search against exact (brute force) search.
+
+Builds both indexes over the songs' audio features, queries each with the same
+random songs, and reports query latency and recall@k, i.e. the fraction of the exact
+k nearest neighbours that the approximate search also finds.
+
+Songs come from the knowledge base, or are generated (with random audio features)
+to see how both searches scale with catalog size.
+
+Example:
+    python scripts/benchmark_similarity.py
+    python scripts/benchmark_similarity.py --synthetic 1000000 -k 10 --tables 8 --bits 14
+"""
+
+import sys
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+sys.path.append('../')
+sys.path.append('.')
+from knowledge_base.api import KnowledgeBaseAPI
+from knowledge_base.feature_store import SongFeatureStore
+from knowledge_base.similarity import SIMILARITY_FEATURES, BruteForceIndex, LSHIndex, embed
+
+DEFAULT_DB_PATH = "knowledge_base/knowledge_base.db"
+
+
+def _load_vectors(db_path):
+    kb_api = KnowledgeBaseAPI(db_path)
+    with kb_api.pool.connection() as con:
+        feature_store = SongFeatureStore.load(con)
+    kb_api.close()
+    columns = [SongFeatureStore.FEATURES.index(name) for name in SIMILARITY_FEATURES]
+    return embed(feature_store.features[:, columns])
+
+def _make_vectors(num_songs, seed):
+    return embed(np.random.RandomState(seed).standard_normal((num_songs, len(SIMILARITY_FEATURES))))
+
+def measure(index, queries, k):
+    """
+    Returns:
+        (tuple): (rows of neighbours of each query, mean latency in milliseconds).
+    """
+    start = time.perf_counter()
+    results = [index.query(query, k)[0] for query in queries]
+    return results, (time.perf_counter() - start) / len(queries) * 1000
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("-d", type=str, dest="db_path", default=DEFAULT_DB_PATH,
+                        help="Path to knowledge base. Ex: -d ./knowledge_base/knowledge_base.db")
+    parser.add_argument("--synthetic", type=int, default=None,
+                        help="Number of songs to generate, instead of reading the knowledge base.")
+    parser.add_argument("-n", type=int, dest="num_queries", default=200,
+                        help="Number of queries.")
+    parser.add_argument("-k", type=int, default=10,
+                        help="Number of neighbours per query.")
+    parser.add_argument("--tables", type=int, default=8,
+                        help="Number of LSH hash tables.")
+    parser.add_argument("--bits", type=int, default=12,
+                        help="Number of bits per LSH hash.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.synthetic is None:
+        vectors, source = _load_vectors(args.db_path), args.db_path
+    else:
+        vectors, source = _make_vectors(args.synthetic, args.seed), "synthetic catalog"
+    rand = np.random.RandomState(args.seed)
+    queries = vectors[rand.randint(0, len(vectors), args.num_queries)]
+
+    start = time.perf_counter()
+    lsh_index = LSHIndex(vectors, num_tables=args.tables, num_bits=args.bits, seed=args.seed)
+    build_seconds = time.perf_counter() - start
+
+    exact, exact_ms = measure(BruteForceIndex(vectors), queries, args.k)
+    approx, approx_ms = measure(lsh_index, queries, args.k)
+    recall = np.mean([
+        len(np.intersect1d(e, a)) / len(e) for e, a in zip(exact, approx) if len(e) > 0
+    ])
+
+    print(f"Ran {args.num_queries} top-{args.k} queries over {len(vectors)} songs ({source}):")
+    print("  {:<26}{:10.3f} ms/query".format("brute force:", exact_ms))
+    print("  {:<26}{:10.3f} ms/query".format(f"LSH ({args.tables}x{args.bits} bits):", approx_ms))
+    print(f"  speedup: {exact_ms / approx_ms:.2f}x")
+    print(f"  recall@{args.k}: {recall:.3f}")
+    print(f"  LSH build time: {build_seconds:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Compares knowledge base read throughput under each storage profile, with and without
+a concurrent writer.
+
+Readers (threads issuing the queries a recommendation request issues) run against a
+synthetic catalog (see benchmark_recommendations.py) for a fixed time, while a
+separate process, like a refresh from Spotify, repeatedly updates the popularity of
+a batch of songs in one transaction. Each pair of writer and reader profiles gets a
+fresh copy of the catalog, since WAL mode is stored in the DB file.
+
+Example:
+    python scripts/benchmark_storage_profiles.py
+    python scripts/benchmark_storage_profiles.py --songs 1000000 -t 8 -s 10 -b 20000
+"""
+
+import contextlib
+import multiprocessing
+import os
+import random
+import sys
+import threading
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+sys.path.append('../')
+sys.path.append('.')
+from knowledge_base.api import KnowledgeBaseAPI
+from knowledge_base.batch_writer import BatchWriter
+from scripts.benchmark_recommendations import DEFAULT_CATALOG_DIR, _copy_db, _sample_queries, get_catalog
+
+DEFAULT_NUM_SONGS = 100000
+# (writer profile, reader profile) pairs
+DEFAULT_PROFILES = (("default", "default"), ("wal", "wal"), ("wal", "read_only"))
+
+
+def _write(db_path, storage_profile, batch_size, stop, num_commits, seed):
+    """Updates popularity of batch_size random songs per transaction until stop is set."""
+    kb_api = KnowledgeBaseAPI(db_path, storage_profile=storage_profile)
+    rand = random.Random(seed)
+    with kb_api.pool.connection() as con:
+        song_ids = [x[0] for x in con.execute("SELECT node_id FROM songs ORDER BY node_id;")]
+    con = kb_api.pool.connect()
+    con.isolation_level = None
+    try:
+        while not stop.is_set():
+            rows = [(rand.randrange(100), rand.choice(song_ids)) for _ in range(batch_size)]
+            con.execute("BEGIN IMMEDIATE")
+            con.executemany(BatchWriter.UPDATE_SONG_SQL, rows)
+            con.execute("COMMIT")
+            with num_commits.get_lock():
+                num_commits.value += 1
+    finally:
+        con.close()
+        kb_api.close()
+
+def _read(kb_api, queries, stop, latencies_ms):
+    i = 0
+    while not stop.is_set():
+        q = queries[i % len(queries)]
+        start = time.perf_counter()
+        kb_api.get_song_data(song_id=q["song_id"])
+        kb_api.get_songs_by_artist(q["artist_name"])
+        latencies_ms.append((time.perf_counter() - start) * 1000)
+        i += 1
+
+def measure_reads(db_path, reader_profile, writer_profile=None, num_threads=4, seconds=5.0, batch_size=5000, seed=0):
+    """Runs readers for given number of seconds, alongside a writer process if writer_profile is given.
+
+    Returns:
+        (dict): reads per second (each being a song lookup and an artist's songs lookup),
+            their p50, p99, and max latency, and number of writer commits.
+    """
+    # the writer sets the journal mode, as it would in production
+    stop, num_commits = multiprocessing.Event(), multiprocessing.Value("i", 0)
+    writer = None
+    if writer_profile is not None:
+        writer = multiprocessing.Process(
+            target=_write, args=(db_path, writer_profile, batch_size, stop, num_commits, seed))
+        writer.start()
+        while num_commits.value == 0 and writer.is_alive():
+            time.sleep(0.01)
+
+    kb_api = KnowledgeBaseAPI(db_path, pool_size=num_threads, storage_profile=reader_profile)
+    queries = _sample_queries(kb_api, 1000, seed)
+    latencies_ms = [[] for _ in range(num_threads)]
+    threads = [
+        threading.Thread(target=_read, args=(kb_api, queries[i::num_threads], stop, latencies_ms[i]))
+        for i in range(num_threads)
+    ]
+    commits_before = num_commits.value
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    commits = num_commits.value - commits_before
+    if writer is not None:
+        writer.join()
+    kb_api.close()
+
+    latencies_ms = np.array([x for thread_latencies in latencies_ms for x in thread_latencies])
+    return dict(
+        reads_per_second=len(latencies_ms) / elapsed,
+        p50_ms=float(np.percentile(latencies_ms, 50)),
+        p99_ms=float(np.percentile(latencies_ms, 99)),
+        max_ms=float(latencies_ms.max()),
+        commits=commits,
+    )
+
+def run(db_path, profiles=DEFAULT_PROFILES, **kwargs):
+    """Measures reads on a fresh copy of the DB at db_path for each pair of profiles,
+    without and with a writer.
+
+    Returns:
+        (list of tuples): (writer profile, reader profile, results without writer, results with writer).
+    """
+    results = []
+    for writer_profile, reader_profile in profiles:
+        scratch_path = db_path + ".scratch"
+        try:
+            _copy_db(db_path, scratch_path)
+            # e.g. switch the copy to WAL mode before measuring reads without a writer
+            kb_api = KnowledgeBaseAPI(scratch_path, storage_profile=writer_profile)
+            kb_api.get_node_ids_by_entity_type("")
+            kb_api.close()
+            idle = measure_reads(scratch_path, reader_profile, **kwargs)
+            busy = measure_reads(scratch_path, reader_profile, writer_profile, **kwargs)
+        finally:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(scratch_path + suffix):
+                    os.remove(scratch_path + suffix)
+        results.append((writer_profile, reader_profile, idle, busy))
+    return results
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--songs", type=int, dest="num_songs", default=DEFAULT_NUM_SONGS,
+                        help="Number of songs in synthetic catalog.")
+    parser.add_argument("-o", type=str, dest="catalog_dir", default=DEFAULT_CATALOG_DIR,
+                        help="Directory synthetic catalogs are kept in.")
+    parser.add_argument("-t", type=int, dest="num_threads", default=4,
+                        help="Number of reader threads.")
+    parser.add_argument("-s", type=float, dest="seconds", default=5.0,
+                        help="Number of seconds to read for, per measurement.")
+    parser.add_argument("-b", type=int, dest="batch_size", default=5000,
+                        help="Number of songs updated per writer transaction.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.makedirs(args.catalog_dir, exist_ok=True)
+    db_path, _ = get_catalog(args.catalog_dir, args.num_songs, args.seed)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        results = run(db_path, num_threads=args.num_threads, seconds=args.seconds,
+                      batch_size=args.batch_size, seed=args.seed)
+
+    print(f"{args.num_songs} songs, {args.num_threads} reader thread(s), {args.batch_size} songs updated per commit:")
+    print("  {:<22}{:>14}{:>14}{:>10}{:>10}{:>10}{:>10}".format(
+        "writer / reader", "reads/s idle", "reads/s busy", "p50 ms", "p99 ms", "max ms", "commits"))
+    for writer_profile, reader_profile, idle, busy in results:
+        print("  {:<22}{:>14.0f}{:>14.0f}{:>10.2f}{:>10.2f}{:>10.1f}{:>10d}".format(
+            f"{writer_profile} / {reader_profile}", idle["reads_per_second"], busy["reads_per_second"],
+            busy["p50_ms"], busy["p99_ms"], busy["max_ms"], busy["commits"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@
 Author: John Verwolf.
 
 This is an executable script that creates and saves
-a new DB.
+a new DB, or refreshes an existing one with Spotify data.
 
 Example:
     python3 create_new_db.py -d ./knowledge_base/knowledge_base.db
@@ -10,6 +10,15 @@ Example:
     # With Spotify Credentials:
     python3 create_new_db.py -d ./knowledge_base/knowledge_base.db -s 123 123
 
+    # With 16 concurrent requests to Spotify:
+    python3 create_new_db.py -d ./knowledge_base/knowledge_base.db -s 123 123 -w 16
+
+    # Replaying Spotify responses cached by earlier runs:
+    python3 create_new_db.py -d ./knowledge_base/knowledge_base.db -s 123 123 --cache ./spotify_cache.db
+
+    # Refreshing artists in an existing DB whose data is over 7 days old:
+    python3 create_new_db.py -d ./knowledge_base/knowledge_base.db -s 123 123 --refresh --max-age 7
+
 """
 
 import os
@@ -25,6 +34,8 @@ def setup_db_with_spotify_data(spotify_client_id,
                                spotify_secret_key,
                                infile,
                                db_path=None,
+                               num_workers=8,
+                               cache_path=None,
                                ):
     try:
         db_path = test_db_utils \
@@ -32,6 +43,8 @@ def setup_db_with_spotify_data(spotify_client_id,
                                                  spotify_secret_key,
                                                  infile,
                                                  path=db_path,
+                                                 num_workers=num_workers,
+                                                 cache_path=cache_path,
                                                  )
     except FileNotFoundError as e:
         print("Please run cli.py from project directory!")
@@ -39,6 +52,27 @@ def setup_db_with_spotify_data(spotify_client_id,
     return db_path
 
 
+def refresh_db_with_spotify_data(spotify_client_id,
+                                 spotify_secret_key,
+                                 db_path,
+                                 max_age_days=7,
+                                 limit=None,
+                                 num_workers=8,
+                                 cache_path=None,
+                                 ):
+    stats = test_db_utils \
+        .refresh_db_with_spotify(spotify_client_id,
+                                 spotify_secret_key,
+                                 db_path,
+                                 max_age_days=max_age_days,
+                                 limit=limit,
+                                 num_workers=num_workers,
+                                 cache_path=cache_path,
+                                 )
+    print("Refreshed {} artist(s) and added {} song(s).".format(stats["artists"], stats["songs"]))
+    return db_path
+
+
 def setup_db(path: str = None):
     try:
         db_path = test_db_utils.create_and_populate_db(path)
@@ -60,11 +94,29 @@ def main():
                              "Ex: -s 12345 12345")
     parser.add_argument("-f", type=str, dest="infile",
                         help="Name of file containing artist names separated by newlines")
+    parser.add_argument("-w", type=int, dest="num_workers", default=8,
+                        help="Max number of concurrent requests to Spotify. Ex: -w 16")
+    parser.add_argument("--cache", type=str, dest="cache_path",
+                        help="Caches Spotify's responses in given file, and replays "
+                             "responses already in it. Ex: --cache ./spotify_cache.db")
+    parser.add_argument("--refresh", action="store_true", dest="refresh",
+                        help="Updates an existing DB with Spotify data, instead of creating "
+                             "a new one. Requires -s.")
+    parser.add_argument("--max-age", type=float, dest="max_age_days", default=7,
+                        help="With --refresh, only artists whose data is older than this many "
+                             "days are fetched again. Ex: --max-age 7")
+    parser.add_argument("--limit", type=int, dest="limit",
+                        help="With --refresh, max number of artists to refresh. Ex: --limit 1000")
     args = parser.parse_args()
 
     db_path = args.db_path
 
-    if os.path.isfile(db_path):
+    if args.refresh:
+        if not os.path.isfile(db_path) or not args.spotify_creds:
+            print("Error: --refresh requires an existing DB (-d) and Spotify credentials (-s).",
+                  file=sys.stderr)
+            sys.exit(1)
+    elif os.path.isfile(db_path):
         print("Error: File \"{}\" already exists.".format(db_path),
               file=sys.stderr)
         sys.exit()
@@ -82,6 +134,17 @@ def main():
                   file=sys.stdout)
             sys.exit()
 
+        if args.refresh:
+            refresh_db_with_spotify_data(spotify_client_id,
+                                         spotify_secret_key,
+                                         db_path,
+                                         max_age_days=args.max_age_days,
+                                         limit=args.limit,
+                                         num_workers=args.num_workers,
+                                         cache_path=args.cache_path,
+                                         )
+            return
+
         if args.infile is not None:
             infile = open(args.infile, "r")
         else:
@@ -90,6 +153,8 @@ def main():
                                    spotify_secret_key,
                                    infile,
                                    db_path=db_path,
+                                   num_workers=args.num_workers,
+                                   cache_path=args.cache_path,
                                    )
     else:
         setup_db(db_path)
@@ -1,31 +1,99 @@
+"""
+Exports the names of songs or artists in the knowledge base to a CSV file of
+"name","synonym" rows, with each name as its own synonym.
+
+Names are streamed from the knowledge base a page at a time, so memory does not grow
+with the size of the catalog. For large catalogs, the export can be split into shards
+(equal ranges of IDs) that are written in parallel across a pool of processes, then
+concatenated in order.
+
+Example:
+    python scripts/extract_entities.py -s
+    python scripts/extract_entities.py -a -d knowledge_base/knowledge_base.db -o artists.csv -w 8
+"""
+
+import csv
+import os
+import shutil
 import sys
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+
 sys.path.extend(['.', '../'])
 
 from knowledge_base.api import KnowledgeBaseAPI
+from knowledge_base.text import remove_dash_section, remove_parenthised_section
 
+DEFAULT_DB_PATH = "knowledge_base/knowledge_base.db"
 SONG_FILE_NAME = "song_names.csv"
 ARTIST_FILE_NAME = "artist_names.csv"
-USAGE ="Usage: python extract_entities.py [-a for artists] [-s (for songs)] [-t (for running tests)]"
+DEFAULT_BATCH_SIZE = 10000
 
 def print_to_csv(items, filename):
-    with open(filename, "w") as f:
+    """Writes each item, without parenthesized or dashed sections, as a row with itself
+    as synonym; items are consumed one at a time.
+
+    Returns:
+        (int): number of rows written.
+    """
+    num_rows = 0
+    with open(filename, "w", newline="") as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL, lineterminator="\n")
         for entry in items:
             entry = remove_dash_section(remove_parenthised_section(entry))
             # CSV format with itself as synonym
-            f.write(f"\"{entry}\",\"{entry}\"\n")
+            writer.writerow((entry, entry))
+            num_rows += 1
+    return num_rows
+
+def _iter_names(kb_api, entity_type, batch_size, shard=0, num_shards=1):
+    if entity_type == "song":
+        return kb_api.iter_song_names(batch_size, shard, num_shards)
+    return kb_api.iter_artists(batch_size, shard, num_shards)
+
+def _export_shard(args):
+    db_path, entity_type, filename, batch_size, shard, num_shards = args
+    kb_api = KnowledgeBaseAPI(db_path, pool_size=1)
+    try:
+        return print_to_csv(_iter_names(kb_api, entity_type, batch_size, shard, num_shards), filename)
+    finally:
+        kb_api.close()
+
+def export_entities(db_path, entity_type, filename, batch_size=DEFAULT_BATCH_SIZE, num_workers=1):
+    """Writes names of all entities of given type to a CSV file, in order of ID.
 
-def remove_parenthised_section(s):
-    tokens = s.split("(")
-    no_paren = ""
-    for t in tokens:
-        if ")" in t:
-            no_paren += t.split(")")[-1]
-        else:
-            no_paren += t
-    return no_paren.strip()
+    Params:
+        db_path (str): path to knowledge base.
+        entity_type (str): "song" or "artist".
+        filename (str): path of CSV file.
+        batch_size (int): number of names read per query.
+        num_workers (int): number of processes (and shards) the export is split across.
 
-def remove_dash_section(s):
-    return s.split("-")[0].strip()
+    Returns:
+        (int): number of rows written.
+    """
+    if entity_type not in ("song", "artist"):
+        raise ValueError("Cannot export entities of type '{}'.".format(entity_type))
+    if num_workers <= 1:
+        return _export_shard((db_path, entity_type, filename, batch_size, 0, 1))
+
+    part_filenames = ["{}.part{}".format(filename, shard) for shard in range(num_workers)]
+    tasks = [
+        (db_path, entity_type, part_filename, batch_size, shard, num_workers)
+        for shard, part_filename in enumerate(part_filenames)
+    ]
+    try:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            num_rows = sum(executor.map(_export_shard, tasks))
+        with open(filename, "wb") as f:
+            for part_filename in part_filenames:
+                with open(part_filename, "rb") as part:
+                    shutil.copyfileobj(part, f)
+    finally:
+        for part_filename in part_filenames:
+            if os.path.exists(part_filename):
+                os.remove(part_filename)
+    return num_rows
 
 def test_remove_parenthised_section():
     test_cases = [
@@ -58,28 +126,36 @@ def test_remove_dash_section():
         total += 1
     print(f"Finished running test_remove_dash_section: Ran {total} tests with {fails} failures.")
 
-if __name__ == "__main__":
-    if len(sys.argv) > 1 and sys.argv[1] == "-t":
+def main():
+    parser = ArgumentParser()
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("-s", dest="entity_type", action="store_const", const="song",
+                       help="Export song names.")
+    group.add_argument("-a", dest="entity_type", action="store_const", const="artist",
+                       help="Export artist names.")
+    group.add_argument("-t", dest="run_tests", action="store_true",
+                       help="Run tests.")
+    parser.add_argument("-d", type=str, dest="db_path", default=DEFAULT_DB_PATH,
+                        help="Path to knowledge base. Ex: -d ./knowledge_base/knowledge_base.db")
+    parser.add_argument("-o", type=str, dest="filename", default=None,
+                        help="Path of CSV file. Default: {} or {}".format(SONG_FILE_NAME, ARTIST_FILE_NAME))
+    parser.add_argument("-b", type=int, dest="batch_size", default=DEFAULT_BATCH_SIZE,
+                        help="Number of names read per query.")
+    parser.add_argument("-w", type=int, dest="num_workers", default=1,
+                        help="Number of worker processes (and shards) to split the export across.")
+    args = parser.parse_args()
+
+    if args.run_tests:
         print("Running tests...")
         test_remove_parenthised_section()
         test_remove_dash_section()
+        return
 
-    else:
-        music_api = KnowledgeBaseAPI("knowledge_base/knowledge_base.db")
-
-        # print songs
-        if sys.argv[1] == "-s":
-            print("Fetching song names..")
-            song_names = music_api.get_all_song_names()
-            print_to_csv(song_names, SONG_FILE_NAME)
-            print(f"Wrote to {SONG_FILE_NAME}")
-
-        # print artists
-        elif sys.argv[1] == "-a":
-            print("Fetching artist names..")
-            artist_names = music_api.get_all_artist_names()
-            print_to_csv(artist_names, ARTIST_FILE_NAME)
-            print(f"Wrote to {ARTIST_FILE_NAME}")
-
-        else:
-            print(USAGE)
\ No newline at end of file
+    filename = args.filename or (SONG_FILE_NAME if args.entity_type == "song" else ARTIST_FILE_NAME)
+    print(f"Fetching {args.entity_type} names..")
+    num_rows = export_entities(args.db_path, args.entity_type, filename, args.batch_size, args.num_workers)
+    print(f"Wrote {num_rows} names to {filename}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Computes the songs most similar to each song, and stores them in the knowledge base
+as "similar to" edges, so that song recommendations can follow them directly.
+
+Songs are compared by their audio features, whether they are by the same artist,
+and how many genres their artists share. The catalog is split into chunks of songs,
+which are scored against every song in parallel across a pool of processes.
+Edges from an earlier run are replaced.
+
+Example:
+    python scripts/materialize_similar_songs.py -d knowledge_base/knowledge_base.db
+    python scripts/materialize_similar_songs.py -d knowledge_base/knowledge_base.db -k 20 -w 8 -c 128
+"""
+
+import os
+import sys
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+
+import numpy as np
+
+sys.path.append('../')
+sys.path.append('.')
+from knowledge_base.api import KnowledgeBaseAPI
+from knowledge_base.feature_store import SongFeatureStore
+from knowledge_base.similarity import SIMILARITY_FEATURES, embed
+
+DEFAULT_DB_PATH = "knowledge_base/knowledge_base.db"
+DEFAULT_NUM_SIMILAR_SONGS = 10
+# each chunk's scores take chunk size x number of songs floats of memory
+DEFAULT_CHUNK_SIZE = 128
+
+# weights of each kind of similarity in a song pair's score; they add up to 1
+AUDIO_WEIGHT = 0.6
+SAME_ARTIST_WEIGHT = 0.2
+SHARED_GENRES_WEIGHT = 0.2
+
+
+def load_catalog(kb_api):
+    """Reads what songs are compared by.
+
+    Returns:
+        (tuple): (song_ids, vectors, artist_rows, genres) where
+            song_ids (np.ndarray): sorted IDs of song nodes; shape (n,).
+            vectors (np.ndarray): unit vector of each song's audio features; see similarity.embed.
+            artist_rows (np.ndarray): row in genres of each song's main artist; shape (n,).
+            genres (np.ndarray): genres[i, j] is 1 if artist i is of genre j, else 0.
+    """
+    genre_rel_str = kb_api.approved_relations["genre"]
+    with kb_api.pool.connection() as con:
+        feature_store = SongFeatureStore.load(con)
+        with closing(con.cursor()) as cursor:
+            cursor.execute("SELECT node_id, main_artist_id FROM songs ORDER BY node_id;")
+            main_artist_ids = [x[1] for x in cursor.fetchall()]
+            cursor.execute("SELECT source, dest FROM edges WHERE rel = (?);", (genre_rel_str,))
+            artist_genres = cursor.fetchall()
+
+    columns = [SongFeatureStore.FEATURES.index(name) for name in SIMILARITY_FEATURES]
+    vectors = embed(feature_store.features[:, columns])
+
+    artist_row_by_id = dict()
+    artist_rows = np.array(
+        [artist_row_by_id.setdefault(artist_id, len(artist_row_by_id)) for artist_id in main_artist_ids],
+        dtype=np.int64,
+    )
+    genre_column_by_id = dict()
+    genres = np.zeros((len(artist_row_by_id), len(set(x[1] for x in artist_genres))), dtype=np.float32)
+    for artist_id, genre_id in artist_genres:
+        if artist_id in artist_row_by_id:
+            genres[artist_row_by_id[artist_id], genre_column_by_id.setdefault(genre_id, len(genre_column_by_id))] = 1
+    return feature_store.song_ids, vectors, artist_rows, genres
+
+# catalog to compare songs in; set in each worker process by _init_worker
+_catalog = None
+
+def _init_worker(catalog):
+    global _catalog
+    _catalog = catalog
+
+def _compute_chunk(args):
+    """Scores songs [start, end) of the catalog against every song.
+
+    Returns:
+        (list of tuples): (song ID, list of (similar song ID, score)) for each song in chunk,
+            with scores in [0,100] range, most similar first.
+    """
+    start, end, k = args
+    song_ids, vectors, artist_rows, genres = _catalog
+    chunk_artist_rows = artist_rows[start:end]
+
+    # cosine similarity, from [-1,1] to [0,1]
+    audio = (vectors[start:end] @ vectors.T + 1) / 2
+    same_artist = chunk_artist_rows[:, np.newaxis] == artist_rows[np.newaxis, :]
+
+    # Jaccard similarity of genres, between artists of the chunk's songs and all artists
+    num_genres = genres.sum(axis=1)
+    shared = genres[chunk_artist_rows] @ genres.T
+    union = num_genres[chunk_artist_rows][:, np.newaxis] + num_genres[np.newaxis, :] - shared
+    shared_genres = np.divide(shared, union, out=np.zeros_like(shared), where=union > 0)[:, artist_rows]
+
+    scores = 100 * (AUDIO_WEIGHT * audio + SAME_ARTIST_WEIGHT * same_artist + SHARED_GENRES_WEIGHT * shared_genres)
+    # a song is not similar to itself
+    scores[np.arange(end - start), np.arange(start, end)] = -np.inf
+
+    best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    results = []
+    for i, row in enumerate(best):
+        row = row[np.argsort(-scores[i, row], kind="stable")]
+        results.append((
+            int(song_ids[start + i]),
+            [(int(song_ids[j]), round(float(np.clip(scores[i, j], 0, 100)), 2)) for j in row],
+        ))
+    return results
+
+def compute_similar_songs(catalog, k=DEFAULT_NUM_SIMILAR_SONGS, num_workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Finds the k songs most similar to each song.
+
+    Params:
+        catalog (tuple): see load_catalog.
+        k (int): number of similar songs per song.
+        num_workers (int): number of processes; None for one per CPU, 1 to compute in this process.
+        chunk_size (int): number of songs scored per task.
+
+    Returns:
+        (dict): key is song ID, val is list of (similar song ID, score), most similar first.
+    """
+    num_songs = len(catalog[0])
+    k = min(k, num_songs - 1)
+    if k <= 0:
+        return dict()
+
+    tasks = [(start, min(start + chunk_size, num_songs), k) for start in range(0, num_songs, chunk_size)]
+    if num_workers == 1:
+        _init_worker(catalog)
+        return dict(x for chunk in map(_compute_chunk, tasks) for x in chunk)
+
+    with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker, initargs=(catalog,)) as executor:
+        return dict(x for chunk in executor.map(_compute_chunk, tasks) for x in chunk)
+
+def materialize_similar_songs(db_path, k=DEFAULT_NUM_SIMILAR_SONGS, num_workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Replaces "similar to" edges from every song in given DB with edges to its k most similar songs.
+
+    Returns:
+        (int): number of edges stored; None if they could not be stored.
+    """
+    # in WAL mode, so that the server can keep reading while edges are replaced
+    kb_api = KnowledgeBaseAPI(db_path, storage_profile="wal")
+    try:
+        similar_songs = compute_similar_songs(load_catalog(kb_api), k, num_workers, chunk_size)
+        if not kb_api.replace_edges(kb_api.approved_relations["similarity"], similar_songs):
+            return None
+    finally:
+        kb_api.close()
+    return sum(len(edges) for edges in similar_songs.values())
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("-d", type=str, dest="db_path", default=DEFAULT_DB_PATH,
+                        help="Path to knowledge base. Ex: -d ./knowledge_base/knowledge_base.db")
+    parser.add_argument("-k", type=int, default=DEFAULT_NUM_SIMILAR_SONGS,
+                        help="Number of similar songs to store per song.")
+    parser.add_argument("-w", type=int, dest="num_workers", default=os.cpu_count(),
+                        help="Number of worker processes.")
+    parser.add_argument("-c", type=int, dest="chunk_size", default=DEFAULT_CHUNK_SIZE,
+                        help="Number of songs scored per task.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    num_edges = materialize_similar_songs(args.db_path, args.k, args.num_workers, args.chunk_size)
+    if num_edges is None:
+        sys.exit(1)
+    print(f"Stored {num_edges} 'similar to' edges in {args.db_path} in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
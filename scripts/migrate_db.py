@@ -0,0 +1,82 @@
+"""
+This is an executable script that brings an existing DB up to date
+with the schema by applying the SQL scripts in 'scripts/migrations/'.
+
+Each migration is numbered (e.g. '0001_add_indexes.sql'). The number of the
+latest migration applied to a DB is kept in its 'user_version' PRAGMA, so
+running this script again only applies migrations added since.
+DBs created from 'schema.sql' already include all migrations.
+
+Migrations may call normalize_name() (see knowledge_base/text.py) to fill in normalized names.
+
+Example:
+    python3 scripts/migrate_db.py -d ./knowledge_base/knowledge_base.db
+"""
+
+import os
+import sqlite3
+import sys
+from argparse import ArgumentParser
+from contextlib import closing
+
+sys.path.append('../')
+sys.path.append('.')
+from knowledge_base.text import normalize_name
+
+MIGRATIONS_DIR_NAME = "migrations"
+
+
+def get_migrations(migrations_dir=None):
+    """Lists migration scripts in the order they must be applied.
+
+    Returns:
+        (list of tuples): (number, path) of each migration e.g. [(1, ".../0001_add_indexes.sql")].
+    """
+    migrations_dir = migrations_dir or os.path.join(os.path.dirname(os.path.abspath(__file__)), MIGRATIONS_DIR_NAME)
+    migrations = []
+    for file_name in os.listdir(migrations_dir):
+        if file_name.endswith(".sql"):
+            migrations.append((int(file_name.split("_")[0]), os.path.join(migrations_dir, file_name)))
+    return sorted(migrations)
+
+def migrate(db_path, migrations_dir=None):
+    """Applies all migrations newer than the DB's version, each in its own transaction.
+
+    Returns:
+        (int): number of migrations applied.
+    """
+    num_applied = 0
+    with closing(sqlite3.connect(db_path)) as con:
+        con.create_function("normalize_name", 1, normalize_name, deterministic=True)
+        version = con.execute("PRAGMA user_version").fetchone()[0]
+        for number, path in get_migrations(migrations_dir):
+            if number <= version:
+                continue
+            print("Applying migration '{}'..".format(os.path.basename(path)))
+            with open(path) as f:
+                script = f.read()
+            con.executescript(
+                "BEGIN; {} PRAGMA user_version = {}; COMMIT;".format(script, number))
+            num_applied += 1
+    return num_applied
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("-d", type=str, dest="db_path", required=True,
+                        help="Specifies a relative path to the DB. Ex: -d ./knowledge_base/knowledge_base.db")
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.db_path):
+        print("Error: File \"{}\" does not exist.".format(args.db_path), file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        num_applied = migrate(args.db_path)
+    except sqlite3.Error as e:
+        print("Error: migration failed, DB was left at its last version: {}".format(e), file=sys.stderr)
+        sys.exit(1)
+    print("Applied {} migration(s) to '{}'.".format(num_applied, args.db_path))
+
+
+if __name__ == "__main__":
+    main()
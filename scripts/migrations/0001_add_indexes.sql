@@ -0,0 +1,18 @@
+-- Adds secondary indexes so that name lookups, artist -> songs joins,
+-- and reverse edge walks no longer scan whole tables.
+
+-- case-insensitive name lookups (i.e. name LIKE ?), as long as the pattern
+-- does not start with a wildcard
+CREATE INDEX IF NOT EXISTS nodes_name_nocase_idx ON nodes(name COLLATE NOCASE);
+
+-- exact name lookups (i.e. name == ?)
+CREATE INDEX IF NOT EXISTS nodes_name_idx ON nodes(name);
+
+CREATE INDEX IF NOT EXISTS nodes_type_idx ON nodes(type);
+
+CREATE UNIQUE INDEX IF NOT EXISTS songs_node_id_idx ON songs(node_id);
+
+CREATE INDEX IF NOT EXISTS songs_main_artist_id_idx ON songs(main_artist_id);
+
+-- edges are looked up by source through their primary key; this is for the opposite direction
+CREATE INDEX IF NOT EXISTS edges_dest_rel_idx ON edges(dest, rel);
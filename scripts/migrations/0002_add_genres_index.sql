@@ -0,0 +1,3 @@
+-- Without this index, deleting a node (e.g. when a batch insert rejects a song)
+-- scans the whole genres table to check its foreign key.
+CREATE UNIQUE INDEX IF NOT EXISTS genres_node_id_idx ON genres(node_id);
@@ -0,0 +1,10 @@
+-- Tracks where each artist's data came from and when it was last fetched,
+-- so that the knowledge base can be refreshed incrementally
+-- (see 'python3 scripts/create_new_db.py --refresh').
+
+ALTER TABLE artists ADD COLUMN spotify_id varchar(100);
+-- Unix time, in seconds; NULL if the artist's top songs were never fetched
+ALTER TABLE artists ADD COLUMN last_fetched_at int;
+
+CREATE UNIQUE INDEX IF NOT EXISTS artists_spotify_id_idx ON artists(spotify_id);
+CREATE INDEX IF NOT EXISTS artists_last_fetched_at_idx ON artists(last_fetched_at);
@@ -0,0 +1,14 @@
+-- Names are looked up by their normalized form (see knowledge_base/text.py:normalize_name)
+-- instead of with LIKE, which treats '%' and '_' in names as wildcards.
+-- normalize_name() is registered by scripts/migrate_db.py.
+
+ALTER TABLE nodes ADD COLUMN normalized_name varchar(50);
+UPDATE nodes SET normalized_name = normalize_name(name);
+
+CREATE INDEX IF NOT EXISTS nodes_normalized_name_idx ON nodes(normalized_name, type);
+-- artists and genres are identified by name, so no two may share a normalized name
+CREATE UNIQUE INDEX IF NOT EXISTS nodes_artist_normalized_name_idx ON nodes(normalized_name) WHERE type = 'artist';
+CREATE UNIQUE INDEX IF NOT EXISTS nodes_genre_normalized_name_idx ON nodes(normalized_name) WHERE type = 'genre';
+
+-- replaced by nodes_normalized_name_idx
+DROP INDEX IF EXISTS nodes_name_nocase_idx;
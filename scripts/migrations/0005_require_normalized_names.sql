@@ -0,0 +1,18 @@
+-- Nodes are looked up by normalized name (see knowledge_base/name_index.py), so a node
+-- without one cannot be found. SQLite cannot add NOT NULL to an existing column, so
+-- writers that leave it out are rejected by triggers instead.
+-- normalize_name() is registered by scripts/migrate_db.py.
+
+UPDATE nodes SET normalized_name = normalize_name(name) WHERE normalized_name IS NULL;
+
+CREATE TRIGGER IF NOT EXISTS nodes_normalized_name_insert_check
+BEFORE INSERT ON nodes WHEN NEW.normalized_name IS NULL
+BEGIN
+    SELECT RAISE(ABORT, 'NOT NULL constraint failed: nodes.normalized_name');
+END;
+
+CREATE TRIGGER IF NOT EXISTS nodes_normalized_name_update_check
+BEFORE UPDATE OF normalized_name ON nodes WHEN NEW.normalized_name IS NULL
+BEGIN
+    SELECT RAISE(ABORT, 'NOT NULL constraint failed: nodes.normalized_name');
+END;
@@ -10,9 +10,33 @@ CREATE TABLE nodes(
 
     -- NOTE: this field is an alias for SQLite's "row_id" column
     -- Setting this column to NULL at insert, will automatically populate it
-    id INTEGER PRIMARY KEY
+    id INTEGER PRIMARY KEY,
+
+    -- name in the form names are compared in: casefolded, without accents, whitespace collapsed
+    -- e.g. "beyonce" for "Beyoncé"; see knowledge_base/text.py:normalize_name
+    normalized_name varchar(50)
 );
 
+-- for lookups by name: normalized (i.e. case- and accent-insensitive) and exact (i.e. ==), respectively
+CREATE INDEX nodes_normalized_name_idx ON nodes(normalized_name, type);
+CREATE INDEX nodes_name_idx ON nodes(name);
+-- artists and genres are identified by name, so no two may share a normalized name
+CREATE UNIQUE INDEX nodes_artist_normalized_name_idx ON nodes(normalized_name) WHERE type = 'artist';
+CREATE UNIQUE INDEX nodes_genre_normalized_name_idx ON nodes(normalized_name) WHERE type = 'genre';
+CREATE INDEX nodes_type_idx ON nodes(type);
+-- every node must have a normalized name, or it cannot be looked up;
+-- triggers rather than NOT NULL, so that DBs migrated from older schemas get the same constraint
+CREATE TRIGGER nodes_normalized_name_insert_check
+BEFORE INSERT ON nodes WHEN NEW.normalized_name IS NULL
+BEGIN
+    SELECT RAISE(ABORT, 'NOT NULL constraint failed: nodes.normalized_name');
+END;
+CREATE TRIGGER nodes_normalized_name_update_check
+BEFORE UPDATE OF normalized_name ON nodes WHEN NEW.normalized_name IS NULL
+BEGIN
+    SELECT RAISE(ABORT, 'NOT NULL constraint failed: nodes.normalized_name');
+END;
+
 -- TODO: add constraints about node type (probably in a trigger function)
 CREATE TABLE edges(
     source  int NOT NULL REFERENCES nodes(id),
@@ -22,10 +46,18 @@ CREATE TABLE edges(
     PRIMARY KEY (source, dest, rel)
 );
 
+-- edges are looked up by source through their primary key; this is for the opposite direction
+CREATE INDEX edges_dest_rel_idx ON edges(dest, rel);
+
 CREATE TABLE artists(
     node_id                 int PRIMARY KEY REFERENCES nodes(id) NOT NULL,
-    num_spotify_followers   int
+    num_spotify_followers   int,
+    spotify_id              varchar(100),
+    -- Unix time, in seconds; NULL if the artist's top songs were never fetched
+    last_fetched_at         int
 );
+CREATE UNIQUE INDEX artists_spotify_id_idx ON artists(spotify_id);
+CREATE INDEX artists_last_fetched_at_idx ON artists(last_fetched_at);
 
 CREATE TABLE songs(
     main_artist_id  int REFERENCES artists(node_id) NOT NULL,
@@ -53,6 +85,14 @@ CREATE TABLE songs(
     spotify_uri     varchar(100) UNIQUE
 );
 
+-- lets songs be looked up by the ID of their node (e.g. KnowledgeBaseAPI.get_songs_by_ids)
+CREATE UNIQUE INDEX songs_node_id_idx ON songs(node_id);
+CREATE INDEX songs_main_artist_id_idx ON songs(main_artist_id);
+
 CREATE TABLE genres(
     node_id int REFERENCES nodes(id) NOT NULL
 );
+CREATE UNIQUE INDEX genres_node_id_idx ON genres(node_id);
+
+-- number of the latest migration in scripts/migrations/ that this schema includes
+PRAGMA user_version = 5;
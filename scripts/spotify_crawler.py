@@ -0,0 +1,331 @@
+"""
+Crawls Spotify's web API concurrently and writes the results to the knowledge base.
+
+For each seed artist, the crawler fetches (1) the artist's metadata, (2) their
+related artists, and (3) the top songs and songs' audio features of the seed
+and each related artist. Requests are spread across a pool of worker threads;
+results are handed through a queue to a single writer thread, which adds them
+to the knowledge base in one transaction (see KnowledgeBaseAPI.batch_writer).
+
+The crawler can also refresh an existing knowledge base (see refresh()): only
+artists whose data was fetched too long ago are fetched again, and progress is
+committed regularly so that an interrupted refresh resumes where it stopped.
+
+Artists are fetched at most once, even if they are related to several seeds.
+Audio features of several artists' songs are fetched together, in requests
+that are as full as Spotify allows.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from utils.spotify_client import MAX_AUDIO_FEATURES_IDS
+
+SPOTIFY_COUNTRY_ISO = "CA"
+DEFAULT_NUM_WORKERS = 8
+
+# tell the writer that no more records will arrive, and whether to commit what it has written
+_DONE = object()
+_ABORT = object()
+
+
+class _Aborted(Exception):
+    pass
+
+
+class SpotifyCrawler:
+    """
+    Usage:
+        crawler = SpotifyCrawler(SpotifyClient(client_id, secret_key), KnowledgeBaseAPI(db_path))
+        crawler.crawl(["Justin Bieber", "Raveena"])
+    """
+
+    def __init__(self, spotify, kb_api, num_workers=DEFAULT_NUM_WORKERS, country_iso_code=SPOTIFY_COUNTRY_ISO):
+        """
+        Params:
+            spotify (SpotifyClient): for making requests to Spotify web API.
+            kb_api (KnowledgeBaseAPI): knowledge base to write to.
+            num_workers (int): max number of concurrent requests to Spotify.
+            country_iso_code (str): market whose top songs are fetched e.g. "CA".
+        """
+        self.spotify = spotify
+        self.kb_api = kb_api
+        self.num_workers = num_workers
+        self.country_iso_code = country_iso_code
+
+        self._seen_artist_ids = set()
+        self._seen_lock = threading.Lock()
+        # artists whose songs' audio features are yet to be fetched
+        self._pending_artists = []  # elems are (artist name, artist info, songs)
+        self._num_pending_songs = 0
+        self._pending_lock = threading.Lock()
+        # bounded, so that fetching cannot run arbitrarily far ahead of writing
+        self._records = queue.Queue(maxsize=10 * num_workers)
+
+    def crawl(self, artist_names):
+        """Fetches data for given artists and their related artists, and adds it to the knowledge base.
+
+        Params:
+            artist_names (iterable): each element is an artist name (str).
+                For example, might be stdin, or open file, or list.
+
+        Returns:
+            (dict): number of artists crawled and of songs added
+                e.g. {"artists": 21, "songs": 200}.
+        """
+        artist_names = [x.strip() for x in artist_names if x.strip() != ""]
+        return self._run(lambda executor: self._crawl(executor, artist_names))
+
+    def refresh(self, max_age_seconds, limit=None, checkpoint_size=100):
+        """Fetches data again for artists whose data is older than given age (or was never fetched),
+        and updates the knowledge base: their number of followers, their songs' popularity, and
+        any new top songs, genres and related artists are added.
+
+        New related artists are added without their songs; they are refreshed in turn by the next
+        call, since they were never fetched.
+
+        Params:
+            max_age_seconds (int): artists fetched less than this many seconds ago are skipped.
+            limit (int): max number of artists to refresh; None for all stale artists.
+            checkpoint_size (int): number of artists refreshed per transaction. If the refresh is
+                interrupted, calling this again resumes after the last committed artist.
+
+        Returns:
+            (dict): number of artists refreshed and of songs added e.g. {"artists": 21, "songs": 10}.
+        """
+        stale_artists = self.kb_api.get_stale_artists(int(time.time()) - max_age_seconds, limit)
+
+        def refresh_all(executor):
+            for i in range(0, len(stale_artists), checkpoint_size):
+                self._refresh(executor, stale_artists[i:i + checkpoint_size])
+                self._records.put(("checkpoint",))
+        return self._run(refresh_all)
+
+    def _run(self, fetch):
+        """Calls given function with a thread pool to fetch data on, while a writer thread
+        adds the fetched data to the knowledge base.
+        """
+        with self._seen_lock:
+            self._seen_artist_ids = set()
+        with self._pending_lock:
+            # left over if the previous run failed
+            self._take_pending_artists()
+        stats = dict(artists=0, songs=0)
+        writer_errors = []
+        writer = threading.Thread(target=self._write_records, args=(stats, writer_errors))
+        writer.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+                fetch(executor)
+        except BaseException:
+            # discard data written since the last checkpoint
+            self._records.put(_ABORT)
+            writer.join()
+            raise
+        self._records.put(_DONE)
+        writer.join()
+
+        if len(writer_errors) > 0:
+            raise writer_errors[0]
+        return stats
+
+    def _crawl(self, executor, artist_names):
+        searches = {executor.submit(self.spotify.get_artist_data, name): name for name in artist_names}
+        seeds = []
+        for future in as_completed(searches):
+            artist_info = future.result()
+            if artist_info is not None:
+                seeds.append((searches[future], artist_info))
+        self._fetch_artists(executor, seeds, fetch_related_songs=True)
+
+    def _refresh(self, executor, stale_artists):
+        """
+        Params:
+            stale_artists (list): elems are (node ID, name, Spotify ID), as returned by
+                KnowledgeBaseAPI.get_stale_artists.
+        """
+        names_by_id = {spotify_id: name for _, name, spotify_id in stale_artists if spotify_id is not None}
+        unknown_names = [name for _, name, spotify_id in stale_artists if spotify_id is None]
+
+        artists = []
+        searches = {executor.submit(self.spotify.get_artist_data, name): name for name in unknown_names}
+        for spotify_id, artist_info in (self.spotify.get_artists(list(names_by_id.keys())) or dict()).items():
+            artists.append((names_by_id[spotify_id], dict(artist_info, id=spotify_id)))
+        for future in as_completed(searches):
+            artist_info = future.result()
+            if artist_info is not None:
+                artists.append((searches[future], artist_info))
+
+        found_names = set(name for name, _ in artists)
+        for node_id, name, _ in stale_artists:
+            if name not in found_names:
+                print("WARN: Could not find artist '{}' on Spotify.".format(name))
+                # so that the artist is not retried on every refresh
+                self._records.put(("fetched", node_id))
+        self._fetch_artists(executor, artists, fetch_related_songs=False)
+
+    def _fetch_artists(self, executor, artists, fetch_related_songs):
+        """Fetches songs and related artists of given artists.
+
+        Params:
+            artists (list): elems are (artist name, artist info), where artist info is a
+                dict with id, genres, and num_followers.
+            fetch_related_songs (bool): whether to also fetch songs of the related artists.
+        """
+        related_searches = dict()
+        song_fetches = []
+        for artist_name, artist_info in artists:
+            song_fetches.append(self._submit_artist(executor, artist_name, artist_info))
+            related_searches[executor.submit(self.spotify.get_related_artists, artist_info["id"])] = (artist_name, artist_info)
+
+        for future in as_completed(related_searches):
+            artist_name, artist_info = related_searches[future]
+            related_artists = future.result() or dict()
+            for rel_artist_name, rel_artist_info in related_artists.items():
+                self._records.put(("edge", (artist_name, artist_info), (rel_artist_name, rel_artist_info)))
+                if fetch_related_songs:
+                    song_fetches.append(self._submit_artist(executor, rel_artist_name, rel_artist_info))
+
+        # surface errors raised by workers
+        for future in as_completed([x for x in song_fetches if x is not None]):
+            future.result()
+        with self._pending_lock:
+            remaining = self._take_pending_artists()
+        self._fetch_audio_features(remaining)
+
+    def _submit_artist(self, executor, artist_name, artist_info):
+        """Schedules fetching of given artist's songs, unless they were already scheduled.
+
+        Returns:
+            (Future): None if artist was already seen.
+        """
+        with self._seen_lock:
+            if artist_info["id"] in self._seen_artist_ids:
+                return None
+            self._seen_artist_ids.add(artist_info["id"])
+        return executor.submit(self._fetch_artist, artist_name, artist_info)
+
+    def _fetch_artist(self, artist_name, artist_info):
+        fetched_at = int(time.time())
+        songs = self.spotify.get_top_songs(artist_info["id"], self.country_iso_code)
+        with self._pending_lock:
+            # send a full batch before it would overflow
+            if self._num_pending_songs + len(songs) > MAX_AUDIO_FEATURES_IDS:
+                full_batch = self._take_pending_artists()
+            else:
+                full_batch = []
+            self._pending_artists.append((artist_name, dict(artist_info, fetched_at=fetched_at), songs))
+            self._num_pending_songs += len(songs)
+        self._fetch_audio_features(full_batch)
+
+    def _take_pending_artists(self):
+        "Must hold self._pending_lock."
+        pending = self._pending_artists
+        self._pending_artists, self._num_pending_songs = [], 0
+        return pending
+
+    def _fetch_audio_features(self, artists):
+        """Fetches audio features of songs of given artists, then hands the artists to the writer.
+
+        Params:
+            artists (list): elems are (artist name, artist info, songs).
+        """
+        song_ids = [song_info["id"] for _, _, songs in artists for song_info in songs.values()]
+        audio_features = dict()
+        if len(song_ids) > 0:
+            audio_features = self.spotify.get_audio_features(song_ids) or dict()
+        for artist_name, artist_info, songs in artists:
+            self._records.put(("artist", (artist_name, artist_info), songs, audio_features))
+
+    def _write_records(self, stats, errors):
+        try:
+            with self.kb_api.batch_writer() as writer:
+                while True:
+                    record = self._records.get()
+                    if record is _DONE:
+                        break
+                    if record is _ABORT:
+                        raise _Aborted()
+                    if record[0] == "artist":
+                        _, artist, songs, audio_features = record
+                        artist_id = self._add_artist(writer, artist)
+                        writer.mark_artist_fetched(artist_id, artist[1]["fetched_at"])
+                        stats["artists"] += 1
+                        stats["songs"] += _insert_songs(songs, artist[0], audio_features, writer)
+                    elif record[0] == "fetched":
+                        writer.mark_artist_fetched(record[1])
+                    elif record[0] == "checkpoint":
+                        writer.commit()
+                    else:
+                        _, artist, rel_artist = record
+                        artist_id = self._add_artist(writer, artist)
+                        rel_artist_id = self._add_artist(writer, rel_artist)
+                        writer.connect_entities(artist_id, rel_artist_id, "similar to", 100)
+                        writer.connect_entities(rel_artist_id, artist_id, "similar to", 100)
+        except _Aborted:
+            pass
+        except Exception as e:
+            print("ERROR: Failed to write crawled data to knowledge base: {}".format(e))
+            errors.append(e)
+            # keep draining so that fetching threads do not block on a full queue
+            while self._records.get() not in (_DONE, _ABORT):
+                pass
+
+    def _add_artist(self, writer, artist):
+        artist_name, artist_info = artist
+        return writer.add_artist(artist_name, artist_info["genres"], artist_info["num_followers"], artist_info["id"])
+
+
+def _insert_songs(songs, artist, audio_features, kb_api):
+    """Insert given songs into Knowledge Base.
+
+    Params:
+        songs (dict): as returned by SpotifyClient.get_top_songs()
+            e.g. {
+                "thank u, next": {
+                    duration_ms: 207320,
+                    id: "3e9HZxeyfWwjeyPAMmWSSQ",
+                    popularity: 92,
+                    uri: "spotify:track:3e9HZxeyfWwjeyPAMmWSSQ"
+                },
+                ...
+            }
+        artist (string): e.g. "Ariana Grande".
+        audio_features (dict): key is song ID, value is Spotify audio feature data.
+            Songs missing from it are added without audio features.
+            e.g. {
+                '1TEL6MlSSVLSdhOSddidlJ': {
+                    'acousticness': 0.78,   'danceability': 0.647,
+                    'duration_ms': 171573,  'energy': 0.309,
+                    'liveness': 0.202,      'loudness': -7.948,
+                    'mode': 0,              'speechiness': 0.0366,
+                    'tempo': 87.045,        'time_signature': 4,
+                    'valence': 0.195,       'key': 7,
+                    'instrumentalness': 7.41e-06,
+                },
+                ...
+            }
+        kb_api (KnowledgeBaseApi or BatchWriter): anything with an add_song method.
+
+    Returns:
+        (int): number of songs added.
+    """
+    num_added = 0
+    for song_name, song_info in songs.items():
+        cur_audio_features = dict(audio_features.get(song_info['id']) or dict())
+        if 'mode' in cur_audio_features:
+            cur_audio_features['mode'] = 'major' if cur_audio_features['mode'] == 1 else 'minor'
+
+        node_id = kb_api.add_song(
+            song_name,
+            artist,
+            duration_ms=song_info["duration_ms"],
+            popularity=song_info["popularity"],
+            spotify_uri=song_info["uri"],
+            audio_features=cur_audio_features,
+        )
+        if node_id is not None:
+            num_added += 1
+    return num_added
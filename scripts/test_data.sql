@@ -1,8 +1,8 @@
-INSERT INTO nodes (name, type, id) VALUES ("Justin Bieber", "artist", 1);
-INSERT INTO nodes (name, type, id) VALUES ("Justin Timberlake", "artist", 2);
-INSERT INTO nodes (name, type, id) VALUES ("U2", "artist", 3);
-INSERT INTO nodes (name, type, id) VALUES ("Shawn Mendes", "artist", 4);
-INSERT INTO nodes (name, type, id) VALUES ("The Anti Justin Bieber", "artist", 5);
+INSERT INTO nodes (name, normalized_name, type, id) VALUES ("Justin Bieber", "justin bieber", "artist", 1);
+INSERT INTO nodes (name, normalized_name, type, id) VALUES ("Justin Timberlake", "justin timberlake", "artist", 2);
+INSERT INTO nodes (name, normalized_name, type, id) VALUES ("U2", "u2", "artist", 3);
+INSERT INTO nodes (name, normalized_name, type, id) VALUES ("Shawn Mendes", "shawn mendes", "artist", 4);
+INSERT INTO nodes (name, normalized_name, type, id) VALUES ("The Anti Justin Bieber", "the anti justin bieber", "artist", 5);
 
 INSERT INTO artists (node_id, num_spotify_followers) VALUES (1, 4000);
 INSERT INTO artists (node_id, num_spotify_followers) VALUES (2, 3000);
@@ -10,15 +10,15 @@ INSERT INTO artists (node_id, num_spotify_followers) VALUES (3, 2000);
 INSERT INTO artists (node_id, num_spotify_followers) VALUES (4, 1000);
 INSERT INTO artists (node_id, num_spotify_followers) VALUES (5, 0004);
 
-INSERT INTO nodes (name, type, id) VALUES ("Despacito", "song", 10);
-INSERT INTO nodes (name, type, id) VALUES ("Rock Your Body", "song", 11);
-INSERT INTO nodes (name, type, id) VALUES ("Beautiful Day", "song", 12);
-INSERT INTO nodes (name, type, id) VALUES ("In My Blood", "song", 13);
-INSERT INTO nodes (name, type, id) VALUES ("Sorry", "song", 14);
-INSERT INTO nodes (name, type, id) VALUES ("Sorry", "song", 15);
+INSERT INTO nodes (name, normalized_name, type, id) VALUES ("Despacito", "despacito", "song", 10);
+INSERT INTO nodes (name, normalized_name, type, id) VALUES ("Rock Your Body", "rock your body", "song", 11);
+INSERT INTO nodes (name, normalized_name, type, id) VALUES ("Beautiful Day", "beautiful day", "song", 12);
+INSERT INTO nodes (name, normalized_name, type, id) VALUES ("In My Blood", "in my blood", "song", 13);
+INSERT INTO nodes (name, normalized_name, type, id) VALUES ("Sorry", "sorry", "song", 14);
+INSERT INTO nodes (name, normalized_name, type, id) VALUES ("Sorry", "sorry", "song", 15);
 
-INSERT INTO nodes (name, type, id) VALUES ("Pop", "genre", 20);
-INSERT INTO nodes (name, type, id) VALUES ("Super pop", "genre", 21);
+INSERT INTO nodes (name, normalized_name, type, id) VALUES ("Pop", "pop", "genre", 20);
+INSERT INTO nodes (name, normalized_name, type, id) VALUES ("Super pop", "super pop", "genre", 21);
 
 INSERT INTO songs (main_artist_id, popularity, duration_ms, node_id, spotify_uri, valence)
     VALUES (1, 10, 222222, 10, 'spotify:track:Despacito', 0.1);
@@ -23,7 +23,6 @@ pp = pprint.PrettyPrinter(
 TEST_DB_NAME = "test.db"
 SCHEMA_FILE_NAME = "schema.sql"
 TEST_DATA_FILE_NAME = "test_data.sql"
-SPOTIFY_COUNTRY_ISO = "CA"
 
 
 def exec_sql_script(db_path, path_to_sql_file, DB_name: str = None):
@@ -82,114 +81,20 @@ def _get_path_prefixes():
 def remove_db():
     "Returns True if command succeeded, False otherwise."
     test_db_path, _ = _get_path_prefixes()
+    # left next to the DB if it was opened in WAL mode
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(test_db_path + TEST_DB_NAME + suffix):
+            os.remove(test_db_path + TEST_DB_NAME + suffix)
     return subprocess.run(["rm", test_db_path + TEST_DB_NAME]).returncode == 0
 
-def _get_artist_data(spotify, artists):
-    """Fetches data for each given artist.
-    Params:
-        spotify (SpotifyClient): for making requests to Spotify web API.
-        artists (iterable): each element is an artist name.
-            (e.g. list of strings, file with artist names on each line)
-
-    Returns:
-        artist_data (dict): key is artist name, value is a dict containing artist metadata.
-            e.g. {
-                "Justin Bieber": {
-                    id=1uNFoZAHBGtllmzznpCI3s,
-                    num_followers=25683438,
-                    genres=["canadian pop", "dance pop", "pop", "post-teen pop"]
-                }
-                ...
-            }
-    """
-    artist_data = dict()
-    for tmp_artist_name in artists:
-        tmp_artist_name = tmp_artist_name.strip()
-        data = spotify.get_artist_data(tmp_artist_name)
-        if data is not None:
-            artist_data[tmp_artist_name] = data
-    return artist_data
-
-def _get_artist_metadata(spotify, artist_names):
-    """Fetches metadata for each given artist.
-
-    Returns:
-        full_artist_metadata (dict): key is artist name, val is dict with:
-            Spotify id, genres, number of Spotify followers, & related artists.
-
-    e.g. {
-        "Raveena": {
-            'id': '2kQnsbKnIiMahOetwlfcaS',
-            'genres': ['indie r&b'],
-            'num_followers': 19191,
-            'related_artists': {
-                'Alextbh': {
-                    'id': '0kXDB5aeESWj5BD9TCLkMu',
-                    'genres': ['indie r&b', 'malaysian indie'],
-                    'num_followers': 19517
-                },
-                ...
-            },
-        }
-        ...
-
-    """
-    artist_summaries = _get_artist_data(spotify, artist_names)
-    full_artist_metadata = dict()
-    for artist, artist_summary in artist_summaries.items():
-        full_artist_metadata[artist] = dict(
-            id=artist_summary["id"],
-            num_followers=artist_summary["num_followers"],
-            genres=artist_summary["genres"],
-            related_artists=spotify.get_related_artists(artist_summary["id"]),
-        )
-    return full_artist_metadata
-
-def _insert_songs(songs, artist, audio_features, kb_api):
-    """Insert given songs into Knowledge Base.
-
-    Params:
-        songs (dict): as returned by SpotifyClient.get_top_songs()
-            e.g. {
-                "thank u, next": {
-                    duration_ms: 207320,
-                    id: "3e9HZxeyfWwjeyPAMmWSSQ",
-                    popularity: 92,
-                    uri: "spotify:track:3e9HZxeyfWwjeyPAMmWSSQ"
-                },
-                ...
-            }
-        artist (string): e.g. "Ariana Grande".
-        audio_features (dict): key is song ID, value is Spotify audio feature data.
-            e.g. {
-                '1TEL6MlSSVLSdhOSddidlJ': {
-                    'acousticness': 0.78,   'danceability': 0.647,
-                    'duration_ms': 171573,  'energy': 0.309,
-                    'liveness': 0.202,      'loudness': -7.948,
-                    'mode': 0,              'speechiness': 0.0366,
-                    'tempo': 87.045,        'time_signature': 4,
-                    'valence': 0.195,       'key': 7,
-                    'instrumentalness': 7.41e-06,
-                },
-                ...
-            }
-        kb_api (KnowledgeBaseApi).
-    """
-    for song_name, song_info in songs.items():
-        cur_audio_features = audio_features[song_info['id']]
-        cur_mode = cur_audio_features['mode']
-        cur_audio_features['mode'] = 'major' if cur_mode == 1 else 'minor'
-
-        kb_api.add_song(
-            song_name,
-            artist,
-            duration_ms=song_info["duration_ms"],
-            popularity=song_info["popularity"],
-            spotify_uri=song_info["uri"],
-            audio_features=cur_audio_features,
-        )
-
-def create_and_populate_db_with_spotify(spotify_client_id, spotify_secret_key, artists, path=None):
+def create_and_populate_db_with_spotify(
+    spotify_client_id,
+    spotify_secret_key,
+    artists,
+    path=None,
+    num_workers=8,
+    cache_path=None,
+):
     """Pull data from Spotify for given artists and adds it to knowledge base through its API.
 
     For each of the given artists, find and add all of the following to the knowledge base:
@@ -197,39 +102,79 @@ def create_and_populate_db_with_spotify(spotify_client_id, spotify_secret_key, a
     - top songs
     - related artists, along with their own metadata and top songs
 
+    Requests are made concurrently; see scripts/spotify_crawler.py.
+
     Params:
         spotify_client_id (str) e.g. "".
         spotify_secret_key (str) e.g. "".
         artists (iterable) each element is an artist name (str).
             For example, might be stdin, or open file, or list.
         path (str): relative path e.g. "knowledge_base.db".
+        num_workers (int): max number of concurrent requests to Spotify.
+        cache_path (str): path to file in which to cache Spotify's responses
+            e.g. "spotify_cache.db". Responses already in it are replayed instead of requested again.
 
     Returns:
         path_to_db (str): relative path to newly created db e.g. "knowledge_base/knowledge_base.db"
     """
     from utils.spotify_client import SpotifyClient
+    from utils.response_cache import ResponseCache
+    from scripts.spotify_crawler import SpotifyCrawler
     path_to_db = create_db(path=path)
-    spotify = SpotifyClient(spotify_client_id, spotify_secret_key)
-
-    artist_metadata = _get_artist_metadata(spotify, artists)
-    kb_api = KnowledgeBaseAPI(path_to_db)
-    for artist_name, artist_info in artist_metadata.items():
-        kb_api.add_artist(artist_name, artist_info["genres"], artist_info["num_followers"])
-
-        songs = spotify.get_top_songs(artist_info['id'], SPOTIFY_COUNTRY_ISO)
-        audio_features = spotify.get_audio_features(
-            [song_info['id'] for _, song_info in songs.items()]
-        )
-        _insert_songs(songs, artist_name, audio_features, kb_api)
-
-        for rel_artist_name, rel_artist_info in artist_info["related_artists"].items():
-            kb_api.add_artist(rel_artist_name, rel_artist_info["genres"], rel_artist_info["num_followers"])
-            kb_api.connect_entities(artist_name, rel_artist_name, "similar to", 100)
-            kb_api.connect_entities(rel_artist_name, artist_name, "similar to", 100)
-            songs = spotify.get_top_songs(rel_artist_info['id'], SPOTIFY_COUNTRY_ISO)
-            audio_features = spotify.get_audio_features(
-                [song_info['id'] for _, song_info in songs.items()]
-            )
-            _insert_songs(songs, rel_artist_name, audio_features, kb_api)
+    cache = None if cache_path is None else ResponseCache(cache_path)
+    spotify = SpotifyClient(spotify_client_id, spotify_secret_key, pool_size=num_workers, cache=cache)
+
+    kb_api = KnowledgeBaseAPI(path_to_db, storage_profile="wal")
+    try:
+        SpotifyCrawler(spotify, kb_api, num_workers=num_workers).crawl(artists)
+    finally:
+        kb_api.close()
+        spotify.close()
+        if cache is not None:
+            cache.close()
 
     return path_to_db
+
+def refresh_db_with_spotify(
+    spotify_client_id,
+    spotify_secret_key,
+    path,
+    max_age_days=7,
+    limit=None,
+    num_workers=8,
+    cache_path=None,
+):
+    """Pulls data from Spotify again for artists in existing knowledge base whose data is
+    older than given age, and updates the knowledge base with it (see SpotifyCrawler.refresh).
+
+    Migrates the DB to the latest schema first, if necessary.
+
+    Params:
+        spotify_client_id (str) e.g. "".
+        spotify_secret_key (str) e.g. "".
+        path (str): relative path to existing DB e.g. "knowledge_base/knowledge_base.db".
+        max_age_days (float): artists fetched less than this many days ago are skipped.
+        limit (int): max number of artists to refresh; None for all stale artists.
+        num_workers (int): max number of concurrent requests to Spotify.
+        cache_path (str): path to file in which to cache Spotify's responses e.g. "spotify_cache.db".
+
+    Returns:
+        (dict): number of artists refreshed and of songs added e.g. {"artists": 21, "songs": 10}.
+    """
+    from utils.spotify_client import SpotifyClient
+    from utils.response_cache import ResponseCache
+    from scripts.migrate_db import migrate
+    from scripts.spotify_crawler import SpotifyCrawler
+    migrate(path)
+    cache = None if cache_path is None else ResponseCache(cache_path)
+    spotify = SpotifyClient(spotify_client_id, spotify_secret_key, pool_size=num_workers, cache=cache)
+
+    kb_api = KnowledgeBaseAPI(path, storage_profile="wal")
+    try:
+        return SpotifyCrawler(spotify, kb_api, num_workers=num_workers).refresh(
+            int(max_age_days * 24 * 60 * 60), limit=limit)
+    finally:
+        kb_api.close()
+        spotify.close()
+        if cache is not None:
+            cache.close()
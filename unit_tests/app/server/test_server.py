@@ -1,8 +1,19 @@
+import threading
+import time
 import unittest
 import app.server as endpoint
+from app.bounded_executor import BoundedExecutor
 from knowledge_base.api import KnowledgeBaseAPI
 from scripts import test_db_utils
 
+def _wait_for_events(client, num_events, timeout=5):
+    "Collects events received by client until there are num_events, or timeout (in seconds) passes."
+    received, deadline = [], time.monotonic() + timeout
+    while len(received) < num_events and time.monotonic() < deadline:
+        received += client.get_received()
+        time.sleep(0.01)
+    return received
+
 # TODO: use test DB
 class TestServer(unittest.TestCase):
     def setUp(self):
@@ -20,6 +31,12 @@ class TestServer(unittest.TestCase):
 
         self.assertEqual(spotify_uri, None, "Expected to receive None.")
 
+    def test_get_similar_song_misspelled_song_name(self):
+        with self.test_app.app_context():
+            spotify_uri = endpoint.get_similar_song("thank u, nxt (Remix)")
+
+        self.assertEqual(spotify_uri[:14], "spotify:track:", "Expected closest song name to be used.")
+
     def test_get_finegrained_recommendation_song_unknown(self):
         with self.test_app.app_context():
             spotify_uri = endpoint.get_finegrained_recommendation(
@@ -75,3 +92,130 @@ class TestServer(unittest.TestCase):
             spotify_uri = endpoint.get_finegrained_recommendation("bad idea", "more popular")
 
         self.assertEqual(spotify_uri[:14], "spotify:track:", "Expected to receive Spotify URI")
+
+    def test_recommendation_candidates_cached(self):
+        endpoint.recommendation_cache.clear()
+        with self.test_app.app_context():
+            endpoint.get_finegrained_recommendation("thank u, next", "more acoustic")
+            hits = endpoint.recommendation_cache.get_stats()["hits"]
+            spotify_uri = endpoint.get_finegrained_recommendation("THANK U,  NËXT ", "more acoustic")
+
+        self.assertEqual(spotify_uri[:14], "spotify:track:", "Expected to receive Spotify URI")
+        self.assertEqual(endpoint.recommendation_cache.get_stats()["hits"], hits + 2,
+            "Expected song and its candidates to be found in cache, regardless of case, accents, and whitespace.")
+
+    def test_recommendation_candidates_cached_by_name_found(self):
+        endpoint.recommendation_cache.clear()
+        with self.test_app.app_context():
+            endpoint.get_finegrained_recommendation("thank u, next", "more acoustic")
+            size = endpoint.recommendation_cache.get_stats()["size"]
+            spotify_uri = endpoint.get_finegrained_recommendation("thank u, nxt", "more acoustic")
+
+        self.assertEqual(spotify_uri[:14], "spotify:track:", "Expected closest song name to be used.")
+        self.assertEqual(endpoint.recommendation_cache.get_stats()["size"], size + 1,
+            "Expected only the misspelled name's song lookup to be cached anew, not its candidates.")
+
+    def test_get_recommendation_event(self):
+        client = endpoint.socket_io.test_client(self.test_app)
+        other_client = endpoint.socket_io.test_client(self.test_app)
+        client.emit("get recommendation", dict(song="thank u, next", adjective="more acoustic"))
+
+        received = _wait_for_events(client, 1)
+        self.assertEqual([x["name"] for x in received], ["play song"])
+        self.assertEqual(received[0]["args"][0]["spotify_uri"][:14], "spotify:track:")
+        self.assertEqual(other_client.get_received(), [], "Expected reply to be sent only to requesting client.")
+        client.disconnect()
+        other_client.disconnect()
+
+    def test_get_random_song_event(self):
+        client = endpoint.socket_io.test_client(self.test_app)
+        client.emit("get random song")
+        client.emit("get random song", dict(genre="pop", popular=True))
+        client.emit("get random song", dict(genre="not a genre"))
+        received = client.get_received()
+        client.disconnect()
+
+        self.assertEqual([x["name"] for x in received], ["play song", "play song", "msg"])
+        for x in received[:2]:
+            self.assertEqual(x["args"][0]["spotify_uri"][:14], "spotify:track:")
+        self.assertIn("not a genre", received[2]["args"][0])
+
+    def test_metrics_endpoint(self):
+        client = endpoint.socket_io.test_client(self.test_app)
+        client.emit("get recommendation", dict(song="thank u, next"))
+        _wait_for_events(client, 1)
+        client.disconnect()
+
+        stats = self.test_app.test_client().get("/metrics").get_json()
+        self.assertGreater(stats["requests"]["get_similar_song"]["count"], 0)
+        self.assertGreater(stats["requests"]["get_similar_song"]["queries"]["max"], 0,
+            "Expected queries issued by the request to be counted.")
+        trace = [x for x in stats["recent_requests"] if x["name"] == "get_similar_song"][0]
+        self.assertEqual(sum(trace["statements"].values()), trace["num_queries"])
+        self.assertGreater(stats["methods"]["KnowledgeBaseAPI.get_song_data"]["count"], 0)
+        self.assertIn("hits", stats["recommendation_cache"])
+        self.assertIn("completed", stats["recommendation_executor"])
+
+    def _with_executor(self, executor, test):
+        "Runs test with recommendations scheduled on given executor."
+        default_executor = endpoint.recommendation_executor
+        endpoint.recommendation_executor = executor
+        try:
+            test()
+        finally:
+            executor.shutdown()
+            endpoint.recommendation_executor = default_executor
+
+    def test_get_recommendation_event_does_not_block(self):
+        release = threading.Event()
+        def test():
+            endpoint.recommendation_executor.submit(release.wait, 5)
+            client = endpoint.socket_io.test_client(self.test_app)
+            client.emit("get recommendation", dict(song="thank u, next"))
+            self.assertEqual(client.get_received(), [],
+                "Expected handler to return before a recommendation is found.")
+            client.emit("get random song")
+            self.assertEqual([x["name"] for x in client.get_received()], ["play song"],
+                "Expected other events to be handled meanwhile.")
+
+            release.set()
+            received = _wait_for_events(client, 1)
+            client.disconnect()
+            self.assertEqual([x["name"] for x in received], ["play song"])
+        self._with_executor(BoundedExecutor(max_workers=1, max_pending=1), test)
+
+    def test_get_recommendation_event_timed_out(self):
+        release = threading.Event()
+        timeout = endpoint.RECOMMENDATION_TIMEOUT_SECONDS
+        def test():
+            endpoint.recommendation_executor.submit(release.wait, 5)
+            client = endpoint.socket_io.test_client(self.test_app)
+            client.emit("get recommendation", dict(song="thank u, next"))
+            received = _wait_for_events(client, 1)
+
+            release.set()
+            endpoint.recommendation_executor.shutdown()
+            endpoint.recommendation_executor._executor.shutdown(wait=True)
+            received += client.get_received()
+            client.disconnect()
+            self.assertEqual([x["name"] for x in received], ["msg"], "Expected only the timeout to be sent.")
+            self.assertIn("Took too long", received[0]["args"][0])
+        endpoint.RECOMMENDATION_TIMEOUT_SECONDS = 0.1
+        try:
+            self._with_executor(BoundedExecutor(max_workers=1, max_pending=1), test)
+        finally:
+            endpoint.RECOMMENDATION_TIMEOUT_SECONDS = timeout
+
+    def test_get_recommendation_event_rejected_when_busy(self):
+        release = threading.Event()
+        def test():
+            endpoint.recommendation_executor.submit(release.wait, 5)
+            client = endpoint.socket_io.test_client(self.test_app)
+            client.emit("get recommendation", dict(song="thank u, next"))
+            received = _wait_for_events(client, 1)
+            client.disconnect()
+            release.set()
+
+            self.assertEqual([x["name"] for x in received], ["msg"])
+            self.assertIn("Too many requests", received[0]["args"][0])
+        self._with_executor(BoundedExecutor(max_workers=1, max_pending=0), test)
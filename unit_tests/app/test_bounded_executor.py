@@ -0,0 +1,90 @@
+import threading
+import time
+import unittest
+
+from app.bounded_executor import BoundedExecutor
+
+
+class TestBoundedExecutor(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = BoundedExecutor(max_workers=2, max_pending=1)
+        self.release = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+        self.executor.shutdown()
+
+    def block(self):
+        self.release.wait(timeout=5)
+        return "done"
+
+    def run_and_wait(self, fn, *args, timeout=None):
+        "Waits for fn's callback; returns (status, result, thread callback was called on)."
+        answers, answered = [], threading.Event()
+        def callback(status, result):
+            answers.append((status, result, threading.current_thread()))
+            answered.set()
+        self.executor.run_async(fn, *args, callback=callback, timeout=timeout)
+        self.assertTrue(answered.wait(timeout=5), "Expected callback to be called.")
+        return answers[0]
+
+    def test_run_async(self):
+        self.assertEqual(self.run_and_wait(lambda x: x * 2, 21)[:2], ("ok", 42))
+        self.assertEqual(self.executor.metrics["completed"], 1)
+
+    def test_run_async_does_not_wait(self):
+        answers = []
+        self.assertTrue(self.executor.run_async(self.block, callback=lambda *x: answers.append(x)))
+        self.assertEqual(answers, [], "Expected to return before task finishes.")
+        self.release.set()
+        self.executor.shutdown()
+        self.executor._executor.shutdown(wait=True)
+        self.assertEqual(answers, [("ok", "done")])
+
+    def test_run_async_failed(self):
+        self.assertEqual(self.run_and_wait(lambda: 1 / 0)[:2], ("failed", None))
+        self.assertEqual(self.executor.metrics["failed"], 1)
+
+    def test_rejects_when_full(self):
+        futures = [self.executor.submit(self.block) for _ in range(3)]
+        self.assertNotIn(None, futures, "Expected 2 running tasks and 1 pending task to be accepted.")
+        self.assertIsNone(self.executor.submit(self.block))
+        status, result, thread = self.run_and_wait(self.block)
+        self.assertEqual((status, result), ("rejected", None))
+        self.assertIs(thread, threading.current_thread(), "Expected rejection to be answered right away.")
+        self.assertEqual(self.executor.metrics["rejected"], 2)
+
+        self.release.set()
+        self.assertEqual([x.result(timeout=5) for x in futures], ["done"] * 3)
+        self.assertEqual(self.run_and_wait(lambda: "ok again")[:2], ("ok", "ok again"),
+            "Expected slots to be freed once tasks finish.")
+
+    def test_timeout_while_pending(self):
+        self.executor.submit(self.block)
+        self.executor.submit(self.block)
+        # waits for a free thread, which never comes
+        self.assertEqual(self.run_and_wait(self.block, timeout=0.1)[:2], ("timed out", None))
+        self.assertEqual(self.executor.metrics["timed_out"], 1)
+        self.assertIsNotNone(self.executor.submit(self.block),
+            "Expected slot of cancelled task to be freed.")
+
+    def test_timeout_while_running(self):
+        answers = []
+        self.executor.run_async(self.block, callback=lambda *x: answers.append(x), timeout=0.1)
+        self.executor.submit(self.block)
+        self.executor.submit(self.block)
+        self.assertIsNone(self.executor.submit(self.block),
+            "Expected timed out task to keep its slot while it runs.")
+        time.sleep(0.3)
+        self.assertEqual(answers, [("timed out", None)])
+
+        self.release.set()
+        self.executor.shutdown()
+        self.executor._executor.shutdown(wait=True)
+        self.assertEqual(answers, [("timed out", None)], "Expected late result to be dropped.")
+        self.assertEqual(self.executor.metrics["late"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
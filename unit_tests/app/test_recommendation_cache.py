@@ -0,0 +1,74 @@
+import unittest
+
+from app.recommendation_cache import RecommendationCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRecommendationCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = RecommendationCache(max_size=2, ttl_seconds=10, clock=self.clock)
+        self.num_computed = 0
+
+    def compute(self, result):
+        def compute():
+            self.num_computed += 1
+            return result
+        return compute
+
+    def test_get_or_compute(self):
+        self.assertEqual(self.cache.get_or_compute("a", self.compute([1, 2])), [1, 2])
+        self.assertEqual(self.cache.get_or_compute("a", self.compute([3])), [1, 2])
+        self.assertEqual(self.num_computed, 1, "Expected second lookup to be answered from cache.")
+        self.assertEqual(self.cache.get_stats(), dict(
+            size=1, hits=1, misses=1, hit_ratio=0.5, evictions=0, expirations=0))
+
+    def test_none_cached(self):
+        self.assertIsNone(self.cache.get_or_compute("a", self.compute(None)))
+        self.assertIsNone(self.cache.get_or_compute("a", self.compute("result")))
+        self.assertEqual(self.num_computed, 1, "Expected lookups that found nothing to be cached too.")
+
+    def test_least_recently_used_evicted(self):
+        self.cache.get_or_compute("a", self.compute("a"))
+        self.cache.get_or_compute("b", self.compute("b"))
+        self.cache.get_or_compute("a", self.compute("a"))
+        self.cache.get_or_compute("c", self.compute("c"))
+
+        self.assertEqual(self.cache.get_or_compute("a", self.compute("new a")), "a")
+        self.assertEqual(self.cache.get_or_compute("b", self.compute("new b")), "new b",
+            "Expected least recently used result to be evicted.")
+        self.assertEqual(self.cache.get_stats()["evictions"], 2)
+
+    def test_expired_results_recomputed(self):
+        self.cache.get_or_compute("a", self.compute("a"))
+        self.clock.now = 9.9
+        self.assertEqual(self.cache.get_or_compute("a", self.compute("new a")), "a")
+        self.clock.now = 10
+        self.assertEqual(self.cache.get_or_compute("a", self.compute("new a")), "new a")
+        self.assertEqual(self.cache.get_stats()["expirations"], 1)
+
+    def test_clear(self):
+        self.cache.get_or_compute("a", self.compute("a"))
+        self.cache.clear()
+        self.assertEqual(self.cache.get_stats()["size"], 0)
+        self.assertEqual(self.cache.get_or_compute("a", self.compute("new a")), "new a")
+
+    def test_result_computed_during_clear_not_kept(self):
+        def compute_while_knowledge_base_changes():
+            self.cache.clear()
+            return "outdated"
+
+        self.assertEqual(self.cache.get_or_compute("a", compute_while_knowledge_base_changes), "outdated")
+        self.assertEqual(self.cache.get_or_compute("a", self.compute("a")), "a")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+import contextlib
+import io
+import unittest
+
+from knowledge_base.api import KnowledgeBaseAPI
+from scripts import test_db_utils
+
+
+class TestBatchWriter(unittest.TestCase):
+
+    def setUp(self):
+        DB_path = test_db_utils.create_and_populate_db()
+        self.kb_api = KnowledgeBaseAPI(dbName=DB_path, use_graph_snapshot=True)
+
+    def tearDown(self):
+        self.kb_api.close()
+        test_db_utils.remove_db()
+
+    def test_add_entities(self):
+        with self.kb_api.batch_writer() as writer:
+            heart_id = writer.add_artist("Heart", genres=["Rock", "Pop"], num_spotify_followers=10)
+            u2_id = writer.add_artist("U2")
+            song_id = writer.add_song(
+                "Barracuda", "Heart",
+                duration_ms=11111, popularity=50, spotify_uri="spotify:track:Barracuda",
+                audio_features=dict(energy=0.9, mode="minor"),
+            )
+            writer.connect_entities(heart_id, u2_id, "similar to", 100)
+
+        self.assertEqual(u2_id, 3, "Expected ID of existing artist.")
+        artist_data = self.kb_api.get_artist_data("Heart")[0]
+        artist_data["genres"] = set(artist_data["genres"])
+        self.assertEqual(
+            artist_data,
+            dict(name="Heart", id=heart_id, genres=set(["Rock", "Pop"]), num_spotify_followers=10),
+        )
+        self.assertEqual(self.kb_api.get_node_ids_by_entity_type("Pop"), dict(genre=[20]),
+            "Expected existing genre to be reused.")
+
+        song_data = self.kb_api.get_songs_by_ids([song_id])[0]
+        self.assertEqual(
+            (song_data["song_name"], song_data["artist_name"], song_data["energy"], song_data["mode"]),
+            ("Barracuda", "Heart", 0.9, "minor"),
+        )
+        self.assertEqual(self.kb_api.get_related_entities("Heart"), ["U2"])
+
+    def test_deduplicates(self):
+        with self.kb_api.batch_writer() as writer:
+            self.assertEqual(writer.add_artist("Justin Bieber"), 1)
+            self.assertEqual(writer.add_genre("Pop"), 20)
+            self.assertIsNone(writer.add_song("Despacito", "Justin Bieber"),
+                "Expected existing song to be skipped.")
+            self.assertIsNone(writer.add_song("Other", "U2", spotify_uri="spotify:track:Despacito"),
+                "Expected song with existing Spotify URI to be skipped.")
+
+            artist_id = writer.add_artist("Heart")
+            self.assertEqual(writer.add_artist("Heart"), artist_id)
+            self.assertIsNotNone(writer.add_song("Barracuda", "Heart"))
+            self.assertIsNone(writer.add_song("Barracuda", "Heart"))
+            self.assertEqual(writer.add_artist("HEART "), artist_id, "Expected names to be compared normalized.")
+            self.assertIsNone(writer.add_song("barracuda", "heart"))
+
+            # edge already in DB
+            writer.connect_entities(1, 2, "similar to", 10)
+            writer.connect_entities(artist_id, 1, "similar to", 10)
+            writer.connect_entities(artist_id, 1, "similar to", 10)
+
+        self.assertEqual(len(self.kb_api.get_node_ids_by_entity_type("Heart")["artist"]), 1)
+        self.assertEqual(len(self.kb_api.get_song_data("Barracuda")), 1)
+        self.assertEqual(self.kb_api.get_related_entities("Heart"), ["Justin Bieber"])
+
+    def test_updates_existing_entities(self):
+        with self.kb_api.batch_writer() as writer:
+            artist_id = writer.add_artist("Justin Bieber", genres=["Pop", "Canadian pop"],
+                num_spotify_followers=123, spotify_id="1uNFoZAHBGtllmzznpCI3s")
+            self.assertEqual(artist_id, 1)
+            writer.add_artist("Justin Bieber", num_spotify_followers=456)
+            self.assertIsNone(writer.add_song("Despacito", "Justin Bieber", popularity=7))
+            writer.mark_artist_fetched(artist_id, 1000)
+
+        artist_data = self.kb_api.get_artist_data("Justin Bieber")[0]
+        self.assertEqual(artist_data["num_spotify_followers"], 123,
+            "Expected artist to be updated only once per batch.")
+        self.assertIn("Canadian pop", artist_data["genres"])
+        self.assertEqual(self.kb_api.get_song_data("Despacito")[0]["popularity"], 7)
+        self.assertEqual(self.kb_api.get_stale_artists(1001)[-1], (1, "Justin Bieber", "1uNFoZAHBGtllmzznpCI3s"),
+            "Expected artists never fetched to come first.")
+        self.assertNotIn(1, [x[0] for x in self.kb_api.get_stale_artists(1000)])
+
+    def test_song_with_unknown_artist_rejected(self):
+        with self.kb_api.batch_writer() as writer:
+            self.assertIsNone(writer.add_song("Song by Unknown Artist", "Unknown artist"))
+        self.assertEqual(self.kb_api.get_node_ids_by_entity_type("Song by Unknown Artist"), {})
+
+    def test_rows_violating_constraints_are_skipped(self):
+        with self.kb_api.batch_writer() as writer:
+            writer.add_song("Valid song", "U2", popularity=10)
+            writer.add_song("Invalid song", "U2", audio_features=dict(acousticness=2))
+            writer.add_song("Another valid song", "U2", popularity=20)
+
+        self.assertEqual(len(self.kb_api.get_song_data("Valid song")), 1)
+        self.assertEqual(len(self.kb_api.get_song_data("Another valid song")), 1)
+        self.assertEqual(self.kb_api.get_node_ids_by_entity_type("Invalid song"), {},
+            "Expected node of rejected song to be removed.")
+
+    def test_writer_reused_after_rows_rejected(self):
+        with self.kb_api.batch_writer() as writer:
+            writer.add_artist("Heart", spotify_id="spotify:artist:heart")
+            rejected_id = writer.add_artist("Cher", spotify_id="spotify:artist:heart")
+            writer.add_song("Believe", "Cher", spotify_uri="spotify:track:Believe")
+            writer.connect_entities(rejected_id, writer.add_genre("Disco"), "of genre", 100)
+            with contextlib.redirect_stdout(io.StringIO()) as out:
+                writer.flush()
+            self.assertIn("UNIQUE constraint failed: artists.spotify_id", out.getvalue())
+
+            cher_id = writer.add_artist("Cher", genres=["Disco"])
+            song_id = writer.add_song("Believe", "Cher", spotify_uri="spotify:track:Believe")
+            self.assertIsNotNone(song_id, "Expected song of rejected artist to be added again.")
+
+        self.assertEqual(self.kb_api.get_artist_data("Cher")[0]["id"], cher_id)
+        self.assertEqual(self.kb_api.get_artist_data("Cher")[0]["genres"], ["Disco"])
+        self.assertEqual(self.kb_api.get_song_data("Believe")[0]["id"], song_id)
+        self.assertEqual(self.kb_api.get_song_data("Believe")[0]["artist_name"], "Cher")
+        self.assertEqual(len(self.kb_api.get_artist_data("Heart")), 1)
+
+    def test_rejected_node_referenced_by_other_rows(self):
+        with self.kb_api.batch_writer() as writer:
+            writer.add_artist("Heart", spotify_id="spotify:artist:heart")
+            rejected_id = writer.add_artist("Cher", spotify_id="spotify:artist:heart")
+            # e.g. written by hand in the same transaction
+            writer._con.execute("INSERT INTO edges (source, dest, rel, score) VALUES (?, ?, ?, ?);",
+                (3, rejected_id, "similar to", 100))
+            with contextlib.redirect_stdout(io.StringIO()) as out:
+                writer.flush()
+            self.assertIn("Could not remove node {}".format(rejected_id), out.getvalue())
+            writer.add_song("Barracuda", "Heart")
+        self.assertEqual(len(self.kb_api.get_song_data("Barracuda")), 1, "Expected rest of batch to be kept.")
+
+    def test_rejected_row_flushed_while_adding(self):
+        with self.kb_api.batch_writer(flush_size=1) as writer:
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertIsNone(writer.add_song("Invalid song", "U2", audio_features=dict(acousticness=2)))
+            self.assertIsNotNone(writer.add_song("Invalid song", "U2"))
+        self.assertEqual(len(self.kb_api.get_song_data("Invalid song")), 1)
+
+    def test_rolls_back_on_error(self):
+        with self.assertRaises(RuntimeError):
+            with self.kb_api.batch_writer() as writer:
+                writer.add_artist("Heart")
+                raise RuntimeError()
+        self.assertEqual(self.kb_api.get_artist_data("Heart"), [])
+
+    def test_commit(self):
+        with self.assertRaises(RuntimeError):
+            with self.kb_api.batch_writer() as writer:
+                writer.add_artist("Heart")
+                writer.commit()
+                writer.add_artist("Cher")
+                raise RuntimeError()
+        self.assertEqual(len(self.kb_api.get_artist_data("Heart")), 1, "Expected committed artist to be kept.")
+        self.assertEqual(self.kb_api.get_artist_data("Cher"), [])
+
+    def test_many_entities(self):
+        num_artists, songs_per_artist = 1000, 10
+        with self.kb_api.batch_writer(flush_size=500) as writer:
+            prev_artist_id = None
+            for i in range(num_artists):
+                artist_id = writer.add_artist(f"Artist {i}", genres=[f"Genre {i % 7}"])
+                for j in range(songs_per_artist):
+                    writer.add_song(f"Song {j}", f"Artist {i}", spotify_uri=f"spotify:track:{i}-{j}")
+                if prev_artist_id is not None:
+                    writer.connect_entities(artist_id, prev_artist_id, "similar to", 100)
+                prev_artist_id = artist_id
+
+        self.assertEqual(len(self.kb_api.get_all_artist_names()), num_artists + 5)
+        self.assertEqual(len(self.kb_api.get_song_data("Song 0")), num_artists)
+        self.assertEqual(len(self.kb_api.get_songs_by_artist("Artist 500")), songs_per_artist)
+        self.assertEqual(self.kb_api.get_related_entities("Artist 500"), ["Artist 499"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import sqlite3
+import threading
+import unittest
+
+from knowledge_base.connection_pool import ConnectionPool
+from scripts import test_db_utils
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.db_path = test_db_utils.create_and_populate_db()
+        self.pool = ConnectionPool(self.db_path, max_size=2, timeout=0.2)
+
+    def tearDown(self):
+        self.pool.close()
+        test_db_utils.remove_db()
+
+    def test_reuses_connection(self):
+        with self.pool.connection() as con:
+            first = con
+        with self.pool.connection() as con:
+            second = con
+        self.assertIs(first, second, "Expected released connection to be reused.")
+
+    def test_foreign_keys_enabled(self):
+        with self.pool.connection() as con:
+            res = con.execute("PRAGMA foreign_keys").fetchone()
+        self.assertEqual(res, (1,), "Expected foreign key constraints to be enabled on pooled connections.")
+
+    def test_nested_checkout_reuses_thread_connection(self):
+        with self.pool.connection() as outer:
+            with self.pool.connection() as inner:
+                self.assertIs(outer, inner, "Expected nested checkout to reuse the thread's connection.")
+
+    def test_threads_get_distinct_connections(self):
+        checked_out, barrier = [], threading.Barrier(2)
+
+        def worker():
+            with self.pool.connection() as con:
+                checked_out.append(con)
+                barrier.wait(timeout=1)
+
+        threads = [threading.Thread(target=worker) for _ in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(checked_out), 2)
+        self.assertIsNot(checked_out[0], checked_out[1], "Expected concurrent threads to get their own connections.")
+
+    def test_exhausted_pool_times_out(self):
+        holding, release = threading.Event(), threading.Event()
+
+        def hold_connection():
+            with self.pool.connection():
+                holding.set()
+                release.wait(timeout=1)
+
+        holders = [threading.Thread(target=hold_connection) for _ in range(2)]
+        for t in holders:
+            holding.clear()
+            t.start()
+            holding.wait(timeout=1)
+
+        with self.assertRaises(sqlite3.OperationalError):
+            with self.pool.connection():
+                pass
+
+        release.set()
+        for t in holders:
+            t.join()
+
+    def test_unhealthy_connection_is_replaced(self):
+        self.pool.health_check_interval = 0
+        with self.pool.connection() as con:
+            stale = con
+        stale.close()
+
+        with self.pool.connection() as con:
+            self.assertIsNot(con, stale, "Expected closed connection to be replaced.")
+            self.assertEqual(con.execute("SELECT 1").fetchone(), (1,))
+
+    def test_unpooled_connections_are_closed(self):
+        pool = ConnectionPool(self.db_path, max_size=0)
+        with pool.connection() as con:
+            pass
+        with self.assertRaises(sqlite3.ProgrammingError):
+            con.execute("SELECT 1")
+
+    def test_closed_pool_rejects_checkout(self):
+        with self.pool.connection() as con:
+            pass
+        self.pool.close()
+
+        with self.assertRaises(sqlite3.ProgrammingError):
+            con.execute("SELECT 1")
+        with self.assertRaises(sqlite3.OperationalError):
+            with self.pool.connection():
+                pass
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,9 @@
 from contextlib import closing
 from knowledge_base.api import KnowledgeBaseAPI
-from scripts import test_db_utils
+from scripts import migrate_db, test_db_utils
 
 import os
+import sqlite3
 import unittest
 
 class TestDbSchema(unittest.TestCase):
@@ -13,6 +14,7 @@ class TestDbSchema(unittest.TestCase):
 
     @classmethod
     def tearDownClass(self):
+        self.kb_api.close()
         test_db_utils.remove_db()
 
     def test_rejects_unknown_entity(self):
@@ -78,6 +80,13 @@ class TestDbSchema(unittest.TestCase):
         self.assertEqual(node_id, None,
             "Expected 'None' value for entity type to be rejected.")
 
+    def test_nodes_normalized_name_not_null(self):
+        with closing(sqlite3.connect(self.kb_api.dbName)) as con:
+            with self.assertRaises(sqlite3.IntegrityError):
+                con.execute("INSERT INTO nodes (name, type) VALUES ('Unnormalized', 'artist');")
+            with self.assertRaises(sqlite3.IntegrityError):
+                con.execute("UPDATE nodes SET normalized_name = NULL WHERE id = 1;")
+
     def test_song_audio_features_range_constraints(self):
         # NOTE: all values are at their upper limit so that we can just add 1
         #   to them and test that the schema constraints reject their addition
@@ -115,6 +124,48 @@ class TestDbSchema(unittest.TestCase):
         self.assertEqual(new_song_id, None, "Expected song with invalid mode to be rejected.")
 
 
+    def test_migrations_match_schema(self):
+        "A DB migrated from the original schema should end up with the same tables and indexes as a new DB."
+        def get_schema(db_path):
+            with closing(sqlite3.connect(db_path)) as con:
+                indexes = set(con.execute(
+                    "SELECT name, tbl_name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+                ).fetchall())
+                triggers = set(x[0] for x in con.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'"))
+                tables = [x[0] for x in con.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+                # (name, type, not null, default value, primary key) of each column
+                columns = {
+                    table: set(tuple(x[1:]) for x in con.execute("PRAGMA table_info({})".format(table)))
+                    for table in tables
+                }
+                version = con.execute("PRAGMA user_version").fetchone()[0]
+            return indexes, columns, version, triggers
+
+        new_db_path = test_db_utils.create_db("migration_test.db")
+        old_db_path = "migration_test_v0.db"
+        schema_v0_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema_v0.sql")
+        try:
+            expected_indexes, expected_columns, version, expected_triggers = get_schema(new_db_path)
+            test_db_utils.exec_sql_script(old_db_path, schema_v0_path)
+
+            self.assertEqual(migrate_db.migrate(old_db_path), version,
+                "Expected every migration up to the schema's version to be applied.")
+            indexes, columns, migrated_version, triggers = get_schema(old_db_path)
+            self.assertEqual(migrated_version, version)
+            self.assertEqual(indexes.difference(expected_indexes), set(),
+                "Migrations created indexes that are not in schema.sql")
+            self.assertEqual(
+                set(x[0] for x in expected_indexes).difference(x[0] for x in indexes),
+                set(),
+                "Migrations did not create all indexes in schema.sql")
+            self.assertEqual(columns, expected_columns,
+                "Expected migrated tables to have the same columns as in schema.sql")
+            self.assertEqual(triggers, expected_triggers,
+                "Expected migrated DB to have the same triggers as in schema.sql")
+        finally:
+            os.remove(new_db_path)
+            os.remove(old_db_path)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,96 @@
+import math
+import unittest
+
+from knowledge_base.api import KnowledgeBaseAPI
+from knowledge_base.feature_store import SongFeatureStore
+from scripts import test_db_utils
+
+ALL_SONG_IDS = [10, 11, 12, 13, 14, 15]
+
+
+class TestSongFeatureStore(unittest.TestCase):
+
+    def setUp(self):
+        DB_path = test_db_utils.create_and_populate_db()
+        self.kb_api = KnowledgeBaseAPI(dbName=DB_path, use_feature_store=True)
+        self.slow_kb_api = KnowledgeBaseAPI(dbName=DB_path)
+
+    def tearDown(self):
+        self.kb_api.close()
+        self.slow_kb_api.close()
+        test_db_utils.remove_db()
+
+    def test_load(self):
+        with self.kb_api.pool.connection() as con:
+            store = SongFeatureStore.load(con)
+        self.assertEqual(len(store), len(ALL_SONG_IDS))
+        self.assertEqual(store.get_rows([10, 15, 1, 999]).tolist(), [0, 5, -1, -1],
+            "Expected rows for songs and -1 for non-songs.")
+
+        values = store.get_feature_values([12, 13, 999], "popularity")
+        self.assertEqual(values[0], 60)
+        self.assertTrue(math.isnan(values[1]), "Expected NaN for song with unknown popularity.")
+        self.assertTrue(math.isnan(values[2]), "Expected NaN for unknown song.")
+
+    def test_filter_related_songs(self):
+        res = self.kb_api.filter_related_songs(ALL_SONG_IDS, 10, "more popular")
+        self.assertEqual(res, [11, 12, 14], "Expected songs more popular than 'Despacito'.")
+
+        res = self.kb_api.filter_related_songs(ALL_SONG_IDS, 12, "less happy")
+        self.assertEqual(res, [10, 11, 14], "Expected songs less happy than 'Beautiful Day'.")
+
+    def test_filter_related_songs_matches_songs_are_related(self):
+        for adjective in self.kb_api.SONG_ADJECTIVES:
+            for song_id in ALL_SONG_IDS:
+                self.assertEqual(
+                    self.kb_api.filter_related_songs(ALL_SONG_IDS, song_id, adjective),
+                    self.slow_kb_api.filter_related_songs(ALL_SONG_IDS, song_id, adjective),
+                    f"Feature store disagrees with songs_are_related for '{adjective}' than song {song_id}.",
+                )
+
+    def test_filter_related_songs_value_missing(self):
+        res = self.kb_api.filter_related_songs(ALL_SONG_IDS, 13, "more popular")
+        self.assertEqual(res, [], "Expected no results when song has no popularity value.")
+
+    def test_filter_related_songs_unknown_relationship(self):
+        res = self.kb_api.filter_related_songs(ALL_SONG_IDS, 10, "more something")
+        self.assertEqual(res, [], "Expected no results for unknown relationship.")
+
+    def test_get_ranked_related_songs(self):
+        res = self.kb_api.get_ranked_related_songs(10, "more popular")
+        self.assertEqual(res, [12, 11, 14], "Expected songs more popular than 'Despacito', most popular first.")
+
+        res = self.kb_api.get_ranked_related_songs(12, "less happy")
+        self.assertEqual(res, [10, 14, 11], "Expected songs less happy than 'Beautiful Day', least happy first.")
+
+        res = self.kb_api.get_ranked_related_songs(10, "more popular", k=2)
+        self.assertEqual(res, [12, 11], "Expected top 2 songs.")
+
+        res = self.kb_api.get_ranked_related_songs(10, "more popular", candidate_song_ids=[14, 11, 13, 999], k=1)
+        self.assertEqual(res, [11], "Expected most popular of the candidates.")
+
+    def test_get_ranked_related_songs_matches_filter_related_songs(self):
+        for adjective in self.kb_api.SONG_ADJECTIVES:
+            for song_id in ALL_SONG_IDS:
+                self.assertEqual(
+                    sorted(self.slow_kb_api.get_ranked_related_songs(song_id, adjective, ALL_SONG_IDS)),
+                    sorted(self.slow_kb_api.filter_related_songs(ALL_SONG_IDS, song_id, adjective)),
+                    f"Ranking index disagrees with songs_are_related for '{adjective}' than song {song_id}.",
+                )
+
+    def test_get_ranked_related_songs_value_missing(self):
+        self.assertEqual(self.kb_api.get_ranked_related_songs(13, "more popular"), [])
+        self.assertEqual(self.kb_api.get_ranked_related_songs(10, "more something"), [])
+
+    def test_feature_store_refreshed_after_write(self):
+        self.assertEqual(self.kb_api.filter_related_songs(ALL_SONG_IDS, 12, "more popular"), [])
+
+        new_song_id = self.kb_api.add_song("Heart", "U2", popularity=70)
+        self.assertEqual(
+            self.kb_api.filter_related_songs(ALL_SONG_IDS + [new_song_id], 12, "more popular"),
+            [new_song_id],
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
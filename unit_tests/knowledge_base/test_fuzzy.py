@@ -0,0 +1,89 @@
+import unittest
+
+import numpy as np
+
+from knowledge_base.api import KnowledgeBaseAPI
+from knowledge_base.fuzzy import FuzzyNameMatcher, get_edit_distance, get_match_key, get_similarity
+from scripts import test_db_utils
+
+
+class TestFuzzyNameMatcher(unittest.TestCase):
+
+    def setUp(self):
+        DB_path = test_db_utils.create_and_populate_db()
+        self.kb_api = KnowledgeBaseAPI(dbName=DB_path)
+
+    def tearDown(self):
+        self.kb_api.close()
+        test_db_utils.remove_db()
+
+    def test_get_edit_distance(self):
+        self.assertEqual(get_edit_distance("sorry", "sorry"), 0)
+        self.assertEqual(get_edit_distance("sorry", "sory"), 1)
+        self.assertEqual(get_edit_distance("sory", "sorry"), 1)
+        self.assertEqual(get_edit_distance("kitten", "sitting"), 3)
+        self.assertEqual(get_edit_distance("", "abc"), 3)
+        self.assertEqual(get_edit_distance("beyoncé", "beyonce"), 1)
+        self.assertEqual(get_edit_distance("a" * 100, "b" * 100), 100, "Expected names longer than an int's bits to work.")
+
+    def test_get_similarity(self):
+        self.assertEqual(get_similarity("", ""), 1)
+        self.assertEqual(get_similarity("sorry", "sorry"), 1)
+        self.assertEqual(get_similarity("sorry", "sory"), 0.8)
+        self.assertEqual(get_similarity("abc", "xyz"), 0)
+
+    def test_get_match_key(self):
+        self.assertEqual(get_match_key("Sorry (Remix) - Live"), "sorry")
+        self.assertEqual(get_match_key("  Beyoncé "), "beyonce")
+        self.assertEqual(get_match_key("(Remix)"), "(remix)", "Expected name to be kept if nothing would be left of it.")
+
+    def test_find_similar_names_extra_sections(self):
+        res = self.kb_api.find_similar_names("Sorry (Remix) - Live", entity_type="song")
+        self.assertEqual([x["id"] for x in res], [14, 15], "Expected both songs named 'Sorry'.")
+        self.assertEqual(res[0]["name"], "Sorry")
+        self.assertEqual(res[0]["type"], "song")
+        self.assertEqual(res[0]["score"], 1)
+
+    def test_find_similar_names_misspelled(self):
+        res = self.kb_api.find_similar_names("despasito")
+        self.assertEqual(res[0]["id"], 10)
+        self.assertEqual(res[0]["name"], "Despacito")
+        self.assertLess(res[0]["score"], 1)
+
+        res = self.kb_api.find_similar_names("justin beiber", entity_type="artist")
+        self.assertEqual(res[0]["name"], "Justin Bieber", "Expected closest artist first.")
+        self.assertIn("The Anti Justin Bieber", [x["name"] for x in res])
+        self.assertEqual(self.kb_api.find_similar_names("justin beiber", entity_type="artist", limit=1)[0]["id"], 1)
+
+    def test_find_similar_names_by_type(self):
+        self.assertEqual(self.kb_api.find_similar_names("pop", entity_type="song"), [])
+        self.assertEqual([x["id"] for x in self.kb_api.find_similar_names("pop", entity_type="genre")], [20])
+        self.assertEqual(self.kb_api.find_similar_names("pop", entity_type="unknown type"), [])
+
+    def test_find_similar_names_no_match(self):
+        self.assertEqual(self.kb_api.find_similar_names("qwxzvk"), [])
+        self.assertEqual(self.kb_api.find_similar_names(""), [])
+
+    def test_find_similar_names_empty_db(self):
+        self.kb_api.close()
+        test_db_utils.remove_db()
+        self.kb_api = KnowledgeBaseAPI(dbName=test_db_utils.create_db())
+        self.assertEqual(self.kb_api.find_similar_names("Despacito"), [])
+        self.assertEqual(self.kb_api.find_similar_names("Despacito", entity_type="song"), [])
+
+    def test_find_similar_names_after_write(self):
+        self.assertEqual(self.kb_api.find_similar_names("Purpose", entity_type="song", min_score=0.9), [])
+        self.kb_api.add_song("Purpose", "Justin Bieber")
+        res = self.kb_api.find_similar_names("Purpose", entity_type="song", min_score=0.9)
+        self.assertEqual([x["name"] for x in res], ["Purpose"], "Expected matcher to be reloaded after write.")
+
+    def test_match_bounded_postings(self):
+        names = ["song number {}".format(i) for i in range(1000)] + ["Despacito"]
+        matcher = FuzzyNameMatcher.from_names(np.arange(len(names)), names, ["song"] * len(names))
+        self.assertEqual(matcher.match("song numbr 123", max_postings=5)[0][1], "song number 123",
+            "Expected the rarest trigrams to be read first.")
+        self.assertEqual(matcher.match("despacito", max_postings=1)[0][1], "Despacito")
+
+
+if __name__ == '__main__':
+    unittest.main()
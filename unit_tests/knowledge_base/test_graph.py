@@ -0,0 +1,63 @@
+import unittest
+
+from knowledge_base.api import KnowledgeBaseAPI
+from knowledge_base.graph import SemanticNetworkSnapshot
+from scripts import test_db_utils
+from unit_tests.knowledge_base import test_knowledge_base_api
+
+
+class TestSemanticNetworkSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        DB_path = test_db_utils.create_and_populate_db()
+        self.kb_api = KnowledgeBaseAPI(dbName=DB_path)
+        with self.kb_api.pool.connection() as con:
+            self.graph = SemanticNetworkSnapshot.load(con)
+        self.kb_api.close()
+
+        # lookups should never need the DB
+        test_db_utils.remove_db()
+
+    def test_get_node_ids(self):
+        self.assertEqual(self.graph.get_node_ids("Justin Bieber"), [1])
+        self.assertEqual(self.graph.get_node_ids("sorry"), [14, 15],
+            "Expected case-insensitive match for both songs named 'Sorry'.")
+        self.assertEqual(self.graph.get_node_ids("Sorry", node_type="artist"), [])
+        self.assertEqual(self.graph.get_node_ids("Unknown entity"), [])
+
+    def test_get_related_names(self):
+        self.assertEqual(
+            self.graph.get_related_names("justin bieber", "similar to"),
+            ["Justin Timberlake", "Shawn Mendes"],
+        )
+        self.assertEqual(self.graph.get_related_names("Justin Bieber", "of genre"), ["Pop", "Super pop"])
+        self.assertEqual(self.graph.get_related_names("Despacito", "similar to"), ["Rock Your Body"])
+        self.assertEqual(self.graph.get_related_names("Shawn Mendes", "similar to"), [])
+        self.assertEqual(self.graph.get_related_names("Justin Bieber", "unknown relation"), [])
+
+    def test_get_songs_by_artist_id(self):
+        self.assertEqual(
+            self.graph.get_songs_by_artist_id(1),
+            [dict(song_name="Despacito", id=10), dict(song_name="Sorry", id=14)],
+        )
+        self.assertEqual(self.graph.get_songs_by_artist_id(20), [], "Genres have no songs.")
+        self.assertEqual(self.graph.get_songs_by_artist_id(999), [])
+
+
+class TestMusicKnowledgeBaseAPIWithGraphSnapshot(test_knowledge_base_api.TestMusicKnowledgeBaseAPI):
+    """Runs all API tests again with graph traversals answered from the snapshot."""
+
+    def setUp(self):
+        DB_path = test_db_utils.create_and_populate_db()
+        self.kb_api = KnowledgeBaseAPI(dbName=DB_path, use_graph_snapshot=True)
+
+    def test_snapshot_refreshed_after_write(self):
+        self.assertEqual(self.kb_api.get_related_entities("Shawn Mendes"), [])
+        self.assertIn(SemanticNetworkSnapshot, self.kb_api._snapshots, "Expected snapshot to be loaded on first lookup.")
+
+        self.kb_api.connect_entities("Shawn Mendes", "U2", "similar to", 50)
+        self.assertEqual(self.kb_api.get_related_entities("Shawn Mendes"), ["U2"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,6 +12,7 @@ class TestMusicKnowledgeBaseAPI(unittest.TestCase):
         self.kb_api = KnowledgeBaseAPI(dbName=DB_path)
 
     def tearDown(self):
+        self.kb_api.close()
         test_db_utils.remove_db()
 
     def test_get_song_data(self):
@@ -78,6 +79,21 @@ class TestMusicKnowledgeBaseAPI(unittest.TestCase):
             "Found expected values for song data for 'Beautiful Day'."
         )
 
+    def test_get_song_data_normalized_name(self):
+        song_data = self.kb_api.get_song_data("  rock   YOUR body ")
+        self.assertEqual([x["id"] for x in song_data], [11], "Expected extra whitespace to be ignored.")
+
+        self.kb_api.add_song("Café del Mar", "U2")
+        song_data = self.kb_api.get_song_data("cafe del mar")
+        self.assertEqual([x["song_name"] for x in song_data], ["Café del Mar"], "Expected accents to be ignored.")
+
+    def test_get_song_data_no_wildcards(self):
+        self.assertEqual(self.kb_api.get_song_data("Desp%"), [], "Expected '%' to be matched literally.")
+        self.assertEqual(self.kb_api.get_song_data("Sorr_"), [], "Expected '_' to be matched literally.")
+
+        self.kb_api.add_song("100%", "U2")
+        self.assertEqual([x["song_name"] for x in self.kb_api.get_song_data("100%")], ["100%"])
+
     def test_get_song_data_ambiguous_name(self):
         res = self.kb_api.get_song_data("Sorry")
 
@@ -119,6 +135,24 @@ class TestMusicKnowledgeBaseAPI(unittest.TestCase):
             "Unexpected result contents."
         )
 
+    def test_get_songs_by_ids(self):
+        res = self.kb_api.get_songs_by_ids([14, 10])
+        self.assertEqual([x["id"] for x in res], [14, 10], "Expected results in order of given IDs.")
+        self.assertEqual(res[1], self.kb_api.get_song_data("Despacito")[0],
+            "Expected same song data as lookup by name.")
+
+        res = self.kb_api.get_songs_by_ids([12, 999, 1, 12])
+        self.assertEqual([x["id"] for x in res], [12, 12],
+            "Expected IDs of unknown songs (and non-songs) to be skipped.")
+
+        self.assertEqual(self.kb_api.get_songs_by_ids([]), [])
+
+    def test_get_songs_by_ids_many(self):
+        song_ids = list(range(1000)) + [15]
+        res = self.kb_api.get_songs_by_ids(song_ids)
+        self.assertEqual([x["id"] for x in res], [10, 11, 12, 13, 14, 15, 15],
+            "Expected lookups of more IDs than fit in one query to be batched.")
+
     def test_get_song_data_dne(self):
         res = self.kb_api.get_song_data("Not In Database")
         self.assertEqual(res, [], "Expected empty list of results for queried song not in DB.")
@@ -147,6 +181,24 @@ class TestMusicKnowledgeBaseAPI(unittest.TestCase):
         res = self.kb_api.get_all_artist_names()
         self.assertEqual(set(res), expected_artist_names, "Unexpected result from fetching all artists from db.")
 
+    def test_iter_song_names(self):
+        expected_song_names = self.kb_api.get_all_song_names()
+        self.assertEqual(list(self.kb_api.iter_song_names(batch_size=2)), expected_song_names,
+            "Expected every song name, in order of ID, across pages.")
+
+        shards = [list(self.kb_api.iter_song_names(batch_size=2, shard=i, num_shards=4)) for i in range(4)]
+        self.assertEqual([x for shard in shards for x in shard], expected_song_names,
+            "Expected shards to partition songs, in order.")
+
+    def test_iter_artists(self):
+        res = self.kb_api.iter_artists(batch_size=1)
+        self.assertEqual(
+            list(res),
+            ["Justin Bieber", "Justin Timberlake", "U2", "Shawn Mendes", "The Anti Justin Bieber"],
+            "Unexpected result from iterating over artists.",
+        )
+        self.assertEqual(list(self.kb_api.iter_artists(shard=1, num_shards=8)), ["Justin Timberlake"])
+
     def test_get_songs(self):
         res = self.kb_api.get_songs_by_artist("Justin Bieber")
         self.assertEqual(
@@ -358,6 +410,35 @@ class TestMusicKnowledgeBaseAPI(unittest.TestCase):
         res = self.kb_api.add_artist("Justin Bieber")
         self.assertEqual(res, artist_node_id, "Expected rejection of attempt to add artist 'Justin Bieber' to knowledge base.")
 
+    def test_replace_edges(self):
+        res = self.kb_api.replace_edges("similar to", {10: [(12, 90), (14, 80.5)], 11: []})
+        self.assertEqual(res, True)
+        self.assertEqual(self.kb_api.get_related_entities("Despacito"), ["Beautiful Day", "Sorry"],
+            "Expected 'similar to' edges from 'Despacito' to be replaced.")
+        self.assertEqual(self.kb_api.get_related_entities("Rock Your Body"), [])
+        self.assertEqual(self.kb_api.get_related_entities("Despacito", "other relation"), ["Beautiful Day"],
+            "Expected edges of other relations to be kept.")
+
+    def test_replace_edges_bad_score(self):
+        res = self.kb_api.replace_edges("similar to", {10: [(12, 90), (14, 101)]})
+        self.assertEqual(res, False)
+        self.assertEqual(self.kb_api.get_related_entities("Despacito"), ["Rock Your Body"],
+            "Expected nothing to be replaced.")
+
+    def test_write_listeners_notified(self):
+        num_writes = []
+        self.kb_api.add_write_listener(lambda: num_writes.append(1))
+
+        self.kb_api.add_artist("Heart")
+        self.assertGreater(len(num_writes), 0, "Expected listener to be notified of new artist.")
+        num_notifications = len(num_writes)
+        self.kb_api.get_artist_data("Heart")
+        self.assertEqual(len(num_writes), num_notifications, "Expected listener not to be notified of reads.")
+
+    def test_add_artist_existing_normalized_name(self):
+        self.assertEqual(self.kb_api.add_artist("JUSTIN  bieber"), 1, "Expected existing artist to be returned.")
+        self.assertEqual(self.kb_api.get_node_ids_by_entity_type("Justin Bieber"), dict(artist=[1]))
+
     def test_add_artist_omitted_opt_params(self):
         res = self.kb_api.add_artist("Heart")
         self.assertNotEqual(res, None, "Failed to add artist 'Heart' to knowledge base.")
@@ -0,0 +1,105 @@
+import threading
+import unittest
+
+from knowledge_base.api import KnowledgeBaseAPI
+from knowledge_base.metrics import Metrics, LatencyHistogram, metrics, normalize_statement
+from scripts import test_db_utils
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        DB_path = test_db_utils.create_and_populate_db()
+        self.kb_api = KnowledgeBaseAPI(dbName=DB_path)
+        # so that opening the connection (with its PRAGMAs) and loading the name index are not counted
+        self.kb_api.get_song_data("Despacito")
+        metrics.reset()
+
+    def tearDown(self):
+        self.kb_api.close()
+        test_db_utils.remove_db()
+        metrics.enabled = True
+
+    def test_latency_histogram(self):
+        histogram = LatencyHistogram()
+        self.assertEqual(histogram.get_percentile(0.5), 0)
+        for ms in [1] * 90 + [100] * 9 + [5000]:
+            histogram.observe(ms)
+
+        stats = histogram.get_stats()
+        self.assertEqual(stats["count"], 100)
+        self.assertEqual(stats["max_ms"], 5000)
+        self.assertAlmostEqual(stats["mean_ms"], (90 + 900 + 5000) / 100)
+        self.assertTrue(1 <= stats["p50_ms"] < 2, "Expected percentile to be within a factor of 2.")
+        self.assertTrue(100 <= stats["p99_ms"] < 200)
+        self.assertEqual(histogram.get_percentile(1), 5000)
+
+        histogram.observe(10 ** 6)
+        self.assertEqual(histogram.get_percentile(1), 10 ** 6, "Expected durations above every bucket to be kept.")
+
+    def test_normalize_statement(self):
+        self.assertEqual(
+            normalize_statement("""
+                SELECT name FROM nodes
+                WHERE id IN (?, ?, ?);
+            """),
+            "SELECT name FROM nodes WHERE id IN (?, ...);",
+        )
+        self.assertEqual(normalize_statement("SELECT * FROM nodes WHERE id IN (?);"), "SELECT * FROM nodes WHERE id IN (?);")
+
+    def test_methods_and_statements_recorded(self):
+        self.kb_api.get_song_data("Despacito")
+        self.kb_api.get_song_data("Rock Your Body")
+        stats = metrics.get_stats()
+
+        self.assertEqual(stats["methods"]["KnowledgeBaseAPI.get_song_data"]["count"], 2)
+        song_queries = [x for sql, x in stats["statements"].items() if "WHERE song.id IN (" in sql]
+        self.assertEqual(len(song_queries), 1, "Expected executions of same statement to be counted together.")
+        self.assertEqual(song_queries[0]["count"], 2)
+        self.assertGreaterEqual(song_queries[0]["fetch_ms"], 0)
+
+    def test_trace(self):
+        with metrics.trace("request") as trace:
+            self.kb_api.get_song_data("Despacito")
+            # statements run by other threads are not part of this request
+            other = threading.Thread(target=self.kb_api.get_song_data, args=("Sorry",))
+            other.start()
+            other.join()
+
+        self.assertEqual(trace.num_queries, 1)
+        self.assertEqual(sum(trace.statements.values()), 1)
+        self.assertGreater(trace.elapsed_ms, 0)
+        stats = metrics.get_stats()
+        self.assertEqual(stats["requests"]["request"]["count"], 1)
+        self.assertEqual(stats["requests"]["request"]["queries"], dict(mean=1, max=1))
+        self.assertEqual(stats["recent_requests"][0]["name"], "request")
+
+        self.kb_api.get_song_data("Despacito")
+        self.assertEqual(trace.num_queries, 1, "Expected statements after request not to be counted in it.")
+
+    def test_traced(self):
+        @metrics.traced
+        def handle(song_name):
+            return self.kb_api.get_song_data(song_name)
+
+        self.assertEqual(handle("Despacito")[0]["song_name"], "Despacito")
+        self.assertEqual(metrics.get_stats()["recent_requests"][0]["num_queries"], 1)
+
+    def test_recent_requests_bounded(self):
+        local_metrics = Metrics(num_recent_requests=2)
+        for name in ["a", "b", "c"]:
+            with local_metrics.trace(name):
+                pass
+        self.assertEqual([x["name"] for x in local_metrics.get_stats()["recent_requests"]], ["c", "b"])
+
+    def test_disabled(self):
+        metrics.enabled = False
+        with metrics.trace("request"):
+            self.kb_api.get_song_data("Despacito")
+
+        stats = metrics.get_stats()
+        self.assertEqual((stats["methods"], stats["statements"], stats["requests"]), (dict(), dict(), dict()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+
+from knowledge_base.api import KnowledgeBaseAPI
+from knowledge_base.metrics import metrics
+from knowledge_base.name_index import NameIndex
+from scripts import test_db_utils
+
+
+class TestNameIndex(unittest.TestCase):
+
+    def setUp(self):
+        DB_path = test_db_utils.create_and_populate_db()
+        self.kb_api = KnowledgeBaseAPI(dbName=DB_path)
+
+    def tearDown(self):
+        self.kb_api.close()
+        test_db_utils.remove_db()
+
+    def test_get_ids(self):
+        index = NameIndex()
+        index.add("sorry", "song", 14)
+        index.add("sorry", "song", 15)
+        index.add("despacito", "song", 10)
+        index.add("despacito", "artist", 20)
+
+        self.assertEqual(index.get_ids("sorry", "song"), [14, 15])
+        self.assertEqual(index.get_ids("despacito", "song"), [10])
+        self.assertEqual(index.get_ids("despacito", "genre"), [])
+        self.assertEqual(index.get_ids("unknown", "song"), [])
+        self.assertEqual(index.get_ids_by_type("despacito"), dict(song=[10], artist=[20]))
+        self.assertEqual(index.get_ids_by_type("unknown"), dict())
+
+    def test_load(self):
+        with self.kb_api.pool.connection() as con:
+            index = NameIndex.load(con)
+        self.assertEqual(index.get_ids("sorry", "song"), [14, 15])
+        self.assertEqual(index.get_ids("justin bieber", "artist"), [1])
+
+    def test_lookups_do_not_query_names(self):
+        self.kb_api.get_node_ids_by_entity_type("Justin Bieber")
+        metrics.reset()
+        self.assertEqual(self.kb_api.get_node_ids_by_entity_type("  JUSTIN bieber"), dict(artist=[1]))
+        self.assertEqual(self.kb_api._get_matching_node_ids("Sorry"), [14, 15])
+        self.assertEqual(metrics.get_stats()["statements"], dict(), "Expected names to be resolved in memory.")
+
+    def test_kept_up_to_date_on_writes(self):
+        self.kb_api.get_node_ids_by_entity_type("Justin Bieber")
+        index = self.kb_api._get_name_index()
+        artist_id = self.kb_api.add_artist("Beyoncé", genres=["Pop"])
+        song_id = self.kb_api.add_song("Halo", "Beyonce")
+
+        self.assertIs(self.kb_api._get_name_index(), index, "Expected index to be updated, not reloaded.")
+        self.assertEqual(self.kb_api.get_node_ids_by_entity_type("beyonce"), dict(artist=[artist_id]))
+        self.assertEqual(self.kb_api.get_song_data("halo")[0]["id"], song_id)
+        self.assertEqual(self.kb_api.get_artist_data("Beyonce")[0]["genres"], ["Pop"])
+
+    def test_reloaded_after_batch_write(self):
+        self.kb_api.get_node_ids_by_entity_type("Justin Bieber")
+        with self.kb_api.batch_writer() as writer:
+            artist_id = writer.add_artist("Raveena")
+
+        self.assertEqual(self.kb_api.get_node_ids_by_entity_type("raveena"), dict(artist=[artist_id]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import ast
+import glob
+import os
+import unittest
+
+from knowledge_base.api import KnowledgeBaseAPI
+from scripts import test_db_utils
+
+KNOWLEDGE_BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../knowledge_base")
+
+# (module, function) pairs whose statements are meant to read whole tables
+FULL_SCANS_ALLOWED = set([
+    ("graph.py", "load"),
+    ("feature_store.py", "load"),
+    ("fuzzy.py", "load"),
+    ("sampler.py", "load"),
+    ("name_index.py", "load"),
+])
+
+
+def find_sql_statements(path):
+    """Finds SQL statements passed to execute() or executemany() in given module.
+
+    Statements built with str.format() (e.g. to expand 'IN ({})') have their
+    placeholders replaced with a single parameter.
+
+    Returns:
+        (list of tuples): (name of enclosing function, SQL statement).
+    """
+    with open(path) as f:
+        tree = ast.parse(f.read())
+
+    statements = []
+    for func in ast.walk(tree):
+        if not isinstance(func, ast.FunctionDef):
+            continue
+        for node in ast.walk(func):
+            if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                    and node.func.attr in ("execute", "executemany") and node.args):
+                continue
+            sql = node.args[0]
+            if (isinstance(sql, ast.Call) and isinstance(sql.func, ast.Attribute)
+                    and sql.func.attr == "format" and isinstance(sql.func.value, ast.Constant)):
+                statements.append((func.name, sql.func.value.value.replace("{}", "?")))
+            elif isinstance(sql, ast.Constant) and isinstance(sql.value, str):
+                statements.append((func.name, sql.value))
+    return statements
+
+
+class TestQueryPlans(unittest.TestCase):
+    """Fails if any SQL statement in the knowledge base falls back to scanning a whole table."""
+
+    def setUp(self):
+        DB_path = test_db_utils.create_and_populate_db()
+        self.kb_api = KnowledgeBaseAPI(dbName=DB_path)
+
+    def tearDown(self):
+        self.kb_api.close()
+        test_db_utils.remove_db()
+
+    def test_statements_found(self):
+        statements = find_sql_statements(os.path.join(KNOWLEDGE_BASE_DIR, "api.py"))
+        self.assertGreater(len(statements), 10, "Expected to find the API's SQL statements.")
+
+    def test_no_full_scans(self):
+        for path in sorted(glob.glob(os.path.join(KNOWLEDGE_BASE_DIR, "*.py"))):
+            module = os.path.basename(path)
+            for func_name, sql in find_sql_statements(path):
+                if (module, func_name) in FULL_SCANS_ALLOWED:
+                    continue
+                if sql.strip().upper().startswith("PRAGMA"):
+                    continue
+                with self.subTest(module=module, function=func_name):
+                    plan = self._get_query_plan(sql)
+                    scans = [step for step in plan if step.startswith("SCAN") and step != "SCAN CONSTANT ROW"]
+                    self.assertEqual(scans, [],
+                        "Statement in {}:{}() scans a whole table:\n{}\nQuery plan: {}"
+                            .format(module, func_name, sql, plan))
+
+    def _get_query_plan(self, sql):
+        # bind a plain string to every parameter; LIKE can only use an index
+        # if its pattern is known not to start with a wildcard
+        params = ["x"] * sql.count("?")
+        with self.kb_api.pool.connection() as con:
+            rows = con.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+        return [x[3] for x in rows]
+
+
+if __name__ == '__main__':
+    unittest.main()
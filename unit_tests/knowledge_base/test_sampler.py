@@ -0,0 +1,91 @@
+import random
+import unittest
+from collections import Counter
+
+import numpy as np
+
+from knowledge_base.api import KnowledgeBaseAPI
+from knowledge_base.sampler import SongSampler
+from scripts import test_db_utils
+
+
+class TestSongSampler(unittest.TestCase):
+
+    def setUp(self):
+        DB_path = test_db_utils.create_and_populate_db()
+        self.kb_api = KnowledgeBaseAPI(dbName=DB_path)
+
+    def tearDown(self):
+        self.kb_api.close()
+        test_db_utils.remove_db()
+
+    def test_load(self):
+        with self.kb_api.pool.connection() as con:
+            sampler = SongSampler.load(con)
+
+        # songs without a Spotify URI (13, 15) cannot be played
+        self.assertEqual(sampler.song_ids.tolist(), [10, 11, 12, 14])
+        self.assertEqual(sampler.weights.tolist(), [11, 31, 61, 21], "Expected popularity + 1.")
+        # Justin Bieber (artist of 10 and 14) is of genres 20 and 21; Justin Timberlake (of 11) is of 20
+        self.assertEqual(sampler.genre_ids.tolist(), [20, 21])
+        songs_by_genre = [
+            sampler.song_ids[sampler.genre_rows[sampler.genre_offsets[g]:sampler.genre_offsets[g+1]]].tolist()
+            for g in range(2)
+        ]
+        self.assertEqual(songs_by_genre, [[10, 11, 14], [10, 14]])
+
+    def test_sample_uniform(self):
+        sampler = SongSampler(np.array([1, 2, 3]), np.array([1.0, 1.0, 100.0]), *SongSampler._group_by_genre(
+            np.array([7, 8, 7]), np.array([[7, 50], [8, 60]])))
+        rand = random.Random(0)
+
+        counts = Counter(sampler.sample(rand=rand) for _ in range(3000))
+        self.assertEqual(sorted(counts), [1, 2, 3])
+        self.assertTrue(all(800 < x < 1200 for x in counts.values()), "Expected every song to be equally likely.")
+        self.assertEqual(set(sampler.sample(genre_id=50, rand=rand) for _ in range(100)), {1, 3})
+        self.assertEqual(set(sampler.sample(genre_id=60, rand=rand) for _ in range(100)), {2})
+        self.assertIsNone(sampler.sample(genre_id=55, rand=rand))
+
+    def test_sample_weighted_by_popularity(self):
+        sampler = SongSampler(np.array([1, 2, 3]), np.array([1.0, 3.0, 6.0]), *SongSampler._group_by_genre(
+            np.array([7, 8, 7]), np.array([[7, 50], [8, 50]])))
+        rand = random.Random(0)
+
+        counts = Counter(sampler.sample(weighted_by_popularity=True, rand=rand) for _ in range(10000))
+        for song_id, expected in [(1, 1000), (2, 3000), (3, 6000)]:
+            self.assertAlmostEqual(counts[song_id], expected, delta=300)
+        counts = Counter(sampler.sample(weighted_by_popularity=True, genre_id=50, rand=rand) for _ in range(10000))
+        self.assertAlmostEqual(counts[3], 6000, delta=300)
+
+    def test_sample_empty(self):
+        sampler = SongSampler(*[np.zeros(0, dtype=np.int64)] * 2, *SongSampler._group_by_genre(
+            np.zeros(0, dtype=np.int64), np.zeros((0, 2), dtype=np.int64)))
+        self.assertIsNone(sampler.sample())
+        self.assertIsNone(sampler.sample(weighted_by_popularity=True))
+
+    def test_get_random_song(self):
+        uris = set(self.kb_api.get_random_song() for _ in range(200))
+        self.assertEqual(uris, {
+            'spotify:track:Despacito', 'spotify:track:Sorry', 'spotify:track:RockYourBody', 'spotify:track:BeautifulDay',
+        })
+        self.assertLessEqual(
+            set(self.kb_api.get_random_song(weighted_by_popularity=True) for _ in range(50)), uris)
+
+    def test_get_random_song_by_genre(self):
+        self.assertEqual(
+            set(self.kb_api.get_random_song(genre="Super Pop") for _ in range(50)),
+            {'spotify:track:Despacito', 'spotify:track:Sorry'},
+        )
+        self.assertEqual(self.kb_api.get_random_song(genre="unknown genre"), None)
+
+    def test_get_random_song_after_write(self):
+        self.kb_api.add_genre("Jazz")
+        self.assertEqual(self.kb_api.get_random_song(genre="jazz"), None, "Expected no songs of genre.")
+        self.kb_api.add_artist("Miles Davis", genres=["jazz"])
+        self.kb_api.add_song("So What", "Miles Davis", spotify_uri="spotify:track:SoWhat")
+        self.assertEqual(self.kb_api.get_random_song(genre="jazz"), "spotify:track:SoWhat",
+            "Expected sampler to be reloaded after write.")
+
+
+if __name__ == '__main__':
+    unittest.main()
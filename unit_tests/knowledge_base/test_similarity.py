@@ -0,0 +1,64 @@
+import unittest
+
+import numpy as np
+
+from knowledge_base.api import KnowledgeBaseAPI
+from knowledge_base.feature_store import SongFeatureStore
+from knowledge_base.similarity import BruteForceIndex, LSHIndex, SongSimilarityEngine, embed
+from scripts import test_db_utils
+
+
+class TestSongSimilarityEngine(unittest.TestCase):
+
+    def setUp(self):
+        DB_path = test_db_utils.create_and_populate_db()
+        self.kb_api = KnowledgeBaseAPI(dbName=DB_path)
+
+    def tearDown(self):
+        self.kb_api.close()
+        test_db_utils.remove_db()
+
+    def test_embed(self):
+        vectors = embed([[0, 100], [1, 200], [np.nan, 200], [np.nan, 100], [np.nan, np.nan]])
+        np.testing.assert_allclose(np.linalg.norm(vectors[:4], axis=1), 1, rtol=1e-6)
+        np.testing.assert_allclose(vectors[1], [2 ** -0.5, 2 ** -0.5], rtol=1e-6,
+            err_msg="Expected features to be standardized, so that tempo-like ranges do not dominate.")
+        np.testing.assert_allclose(vectors[2], [0, 1], atol=1e-6, err_msg="Expected missing value to count as the mean.")
+        self.assertEqual(vectors[4].tolist(), [0, 0], "Expected zeros for song missing every feature.")
+
+    def test_get_similar_songs(self):
+        # only Despacito (10), Rock Your Body (11), Beautiful Day (12), and Sorry (14) have audio features
+        res = self.kb_api.get_similar_songs(10, k=10)
+        self.assertEqual(sorted(res), [11, 12, 14], "Expected songs with audio features other than the given song.")
+        self.assertEqual(res[0], 14, "Expected 'Sorry', whose valence is closest to that of 'Despacito', first.")
+        self.assertEqual(self.kb_api.get_similar_songs(10, k=1), [14])
+
+    def test_get_similar_songs_without_features(self):
+        self.assertEqual(self.kb_api.get_similar_songs(13), [], "Expected no results for song without audio features.")
+        self.assertEqual(self.kb_api.get_similar_songs(999), [], "Expected no results for unknown song.")
+
+    def test_lsh_index_matches_brute_force(self):
+        vectors = embed(np.random.RandomState(0).standard_normal((5000, 9)))
+        exact = SongSimilarityEngine(np.arange(len(vectors)), vectors, BruteForceIndex(vectors))
+        approx = SongSimilarityEngine(np.arange(len(vectors)), vectors, LSHIndex(vectors, num_bits=8, seed=0))
+
+        recalls = []
+        for song_id in range(0, len(vectors), 50):
+            expected = set(song_id for song_id, _ in exact.get_similar(song_id, k=10))
+            found = [song_id for song_id, _ in approx.get_similar(song_id, k=10)]
+            self.assertNotIn(song_id, found, "Expected song not to be similar to itself.")
+            recalls.append(len(expected.intersection(found)) / 10)
+        self.assertGreater(np.mean(recalls), 0.8)
+
+    def test_engine_uses_given_index(self):
+        with self.kb_api.pool.connection() as con:
+            feature_store = SongFeatureStore.load(con)
+        engine = SongSimilarityEngine.from_feature_store(feature_store, index_cls=LSHIndex)
+        self.assertIsInstance(engine.index, LSHIndex)
+        self.assertEqual(len(engine), 4)
+        self.assertLessEqual(set(song_id for song_id, _ in engine.get_similar(10)), set([11, 12, 14]),
+            "Expected approximate search to find some of the songs with audio features.")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import contextlib
+import io
+import os
+import unittest
+
+from knowledge_base.api import KnowledgeBaseAPI
+from knowledge_base.storage import StorageProfile, get_storage_profile
+from scripts import test_db_utils
+
+
+class TestStorageProfiles(unittest.TestCase):
+
+    def setUp(self):
+        self.DB_path = test_db_utils.create_and_populate_db()
+        self.kb_apis = []
+
+    def tearDown(self):
+        for kb_api in self.kb_apis:
+            kb_api.close()
+        test_db_utils.remove_db()
+
+    def _open(self, storage_profile):
+        kb_api = KnowledgeBaseAPI(dbName=self.DB_path, storage_profile=storage_profile)
+        self.kb_apis.append(kb_api)
+        return kb_api
+
+    def _get_pragma(self, kb_api, name):
+        with kb_api.pool.connection() as con:
+            return con.execute("PRAGMA {}".format(name)).fetchone()[0]
+
+    def test_default_profile(self):
+        kb_api = self._open("default")
+        self.assertEqual(self._get_pragma(kb_api, "journal_mode"), "delete")
+        self.assertEqual(self._get_pragma(kb_api, "foreign_keys"), 1)
+
+    def test_wal_profile(self):
+        kb_api = self._open("wal")
+        self.assertEqual(self._get_pragma(kb_api, "journal_mode"), "wal")
+        self.assertEqual(self._get_pragma(kb_api, "synchronous"), 1, "Expected synchronous = NORMAL.")
+        self.assertEqual(self._get_pragma(kb_api, "cache_size"), -64 * 1024)
+        self.assertEqual(self._get_pragma(kb_api, "foreign_keys"), 1)
+        self.assertEqual(kb_api.get_song_data("Despacito")[0]["id"], 10)
+
+        self.assertEqual(self._get_pragma(self._open("default"), "journal_mode"), "wal",
+            "Expected WAL mode to be kept in the DB file.")
+
+    def test_custom_profile(self):
+        kb_api = self._open(StorageProfile(cache_size=100, mmap_size=0))
+        self.assertEqual(self._get_pragma(kb_api, "cache_size"), 100)
+        self.assertEqual(self._get_pragma(kb_api, "mmap_size"), 0)
+
+    def test_unknown_profile(self):
+        with self.assertRaises(ValueError):
+            get_storage_profile("fast")
+
+    def test_read_only_profile(self):
+        kb_api = self._open("read_only")
+        self.assertEqual(kb_api.get_song_data("Despacito")[0]["id"], 10)
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            res = kb_api.add_genre("Reggaeton")
+        self.assertIsNone(res, "Expected write to fail.")
+        self.assertIn("readonly database", out.getvalue())
+
+    def test_read_only_profiles_db_dne(self):
+        for storage_profile in ["read_only", "immutable"]:
+            kb_api = KnowledgeBaseAPI(dbName=self.DB_path + ".dne", storage_profile=storage_profile)
+            with contextlib.redirect_stdout(io.StringIO()) as out:
+                self.assertEqual(kb_api.get_song_data("Despacito"), [])
+            kb_api.close()
+            self.assertIn("unable to open database file", out.getvalue())
+            self.assertFalse(os.path.exists(self.DB_path + ".dne"), "Expected DB not to be created.")
+
+    def test_immutable_profile(self):
+        kb_api = self._open("immutable")
+        self.assertEqual(kb_api.get_artist_data("U2")[0]["id"], 3)
+        self.assertEqual(self._get_pragma(kb_api, "query_only"), 1)
+
+    def test_readers_not_blocked_by_writer(self):
+        writer = self._open("wal")
+        reader = self._open("read_only")
+        reader.pool.timeout = 0.5
+        with writer.pool.connection() as con:
+            con.execute("BEGIN EXCLUSIVE")
+            con.execute("UPDATE songs SET popularity = 99 WHERE node_id = 10")
+            self.assertEqual(reader.get_song_data("Despacito")[0]["popularity"], 10,
+                "Expected reader to see last committed state while writer holds its lock.")
+            con.commit()
+
+        self.assertEqual(reader.get_song_data("Despacito")[0]["popularity"], 99)
+
+    def test_sees_writes_by_other_process(self):
+        reader = self._open("read_only")
+        reader.use_graph_snapshot = True
+        num_changes = []
+        reader.add_write_listener(lambda: num_changes.append(1))
+        self.assertEqual(reader.get_artist_data("Heart"), [])
+        self.assertNotIn("Heart", reader.get_related_entities("Justin Bieber"))
+        self.assertFalse(reader.check_for_changes())
+
+        # another process, e.g. a refresh from Spotify
+        writer = self._open("default")
+        heart_id = writer.add_artist("Heart")
+        writer.connect_entities("Justin Bieber", "Heart", "similar to", 1)
+        self.assertFalse(writer.check_for_changes(), "Expected writer not to mistake its writes for another's.")
+
+        self.assertEqual(reader.get_artist_data("Heart"), [],
+            "Expected snapshots to be served without checking the DB for changes on every lookup.")
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertTrue(reader.check_for_changes())
+        self.assertEqual(reader.get_artist_data("Heart")[0]["id"], heart_id)
+        self.assertIn("Heart", reader.get_related_entities("Justin Bieber"))
+        self.assertEqual(len(num_changes), 1, "Expected listener to be notified of change once.")
+        self.assertFalse(reader.check_for_changes())
+
+    def test_immutable_profile_sees_replaced_file(self):
+        kb_api = self._open("immutable")
+        self.assertFalse(kb_api.check_for_changes())
+        stat = os.stat(self.DB_path)
+        os.utime(self.DB_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertTrue(kb_api.check_for_changes())
+        self.assertFalse(kb_api.check_for_changes())
@@ -0,0 +1,27 @@
+import unittest
+
+from knowledge_base.text import normalize_name, remove_dash_section, remove_extra_sections, remove_parenthised_section
+
+
+class TestText(unittest.TestCase):
+
+    def test_normalize_name(self):
+        self.assertEqual(normalize_name("Despacito"), "despacito")
+        self.assertEqual(normalize_name("  Thank U,\tNext  "), "thank u, next")
+        self.assertEqual(normalize_name("Beyoncé"), "beyonce")
+        self.assertEqual(normalize_name("Mötley Crüe"), "motley crue")
+        self.assertEqual(normalize_name("Die Ärzte – Straße"), "die arzte – strasse")
+        self.assertEqual(normalize_name("100%_pure"), "100%_pure")
+        self.assertEqual(normalize_name(None), None)
+
+    def test_remove_extra_sections(self):
+        self.assertEqual(remove_parenthised_section("Sorry (Remix)"), "Sorry")
+        self.assertEqual(remove_parenthised_section("Sorry (Remix) (Live)"), "Sorry")
+        self.assertEqual(remove_dash_section("Sorry - Live"), "Sorry")
+        self.assertEqual(remove_extra_sections("Sorry (Remix) - Live"), "Sorry")
+        self.assertEqual(remove_extra_sections("Despacito"), "Despacito")
+        self.assertEqual(remove_extra_sections(" (Intro) "), "(Intro)", "Expected name as is if nothing would be left of it.")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from contextlib import closing
+
+from scripts.benchmark_recommendations import generate_catalog, get_catalog, print_summary, run
+
+
+def _dump(db_path):
+    with closing(sqlite3.connect(db_path)) as con:
+        return list(con.iterdump())
+
+
+class TestBenchmarkRecommendations(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.catalog_dir)
+
+    def test_generate_catalog(self):
+        path1, path2 = os.path.join(self.catalog_dir, "1.db"), os.path.join(self.catalog_dir, "2.db")
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            counts = generate_catalog(path1, 300, seed=1)
+            generate_catalog(path2, 300, seed=1)
+
+        self.assertEqual(out.getvalue(), "", "Expected every entity to be added without errors.")
+        self.assertEqual(counts["songs"], 300)
+        self.assertGreater(counts["artists"], 1)
+        self.assertGreater(counts["genres"], 1)
+        self.assertGreater(counts["edges"], counts["artists"], "Expected genre and related artist edges.")
+        self.assertEqual(_dump(path1), _dump(path2), "Expected same catalog for same seed.")
+
+    def test_get_catalog_reused(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            db_path, generate_seconds = get_catalog(self.catalog_dir, 100, seed=0)
+            self.assertIsNotNone(generate_seconds)
+            self.assertEqual(get_catalog(self.catalog_dir, 100, seed=0), (db_path, None), "Expected catalog to be reused.")
+        self.assertEqual(os.listdir(self.catalog_dir), [os.path.basename(db_path)])
+
+    def test_run(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = run(sizes=[200], catalog_dir=self.catalog_dir, num_calls=5, seed=0)
+            db_path, _ = get_catalog(self.catalog_dir, 200, seed=0)
+
+        self.assertEqual(json.loads(json.dumps(results)), results, "Expected results to be JSON serializable.")
+        self.assertEqual(len(results["catalogs"]), 1)
+        catalog = results["catalogs"][0]
+        self.assertEqual(catalog["songs"], 200)
+        for name in ["KnowledgeBaseAPI.get_song_data", "KnowledgeBaseAPI.add_song", "server.get_similar_song"]:
+            self.assertEqual(catalog["results"][name]["calls"], 5)
+            self.assertLessEqual(catalog["results"][name]["p50_ms"], catalog["results"][name]["p99_ms"])
+        self.assertNotIn("benchmark song 0", "\n".join(_dump(db_path)), "Expected writes not to modify the catalog.")
+
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            print_summary(results, baseline=results)
+        self.assertIn("+0%", out.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
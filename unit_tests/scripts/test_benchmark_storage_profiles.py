@@ -0,0 +1,34 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from scripts.benchmark_recommendations import generate_catalog
+from scripts.benchmark_storage_profiles import run
+
+
+class TestBenchmarkStorageProfiles(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.catalog_dir)
+
+    def test_run(self):
+        db_path = os.path.join(self.catalog_dir, "catalog.db")
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_catalog(db_path, 300, seed=0)
+            results = run(db_path, profiles=[("default", "default"), ("wal", "read_only")],
+                          num_threads=2, seconds=0.2, batch_size=10)
+
+        self.assertEqual([x[:2] for x in results], [("default", "default"), ("wal", "read_only")])
+        for _, _, idle, busy in results:
+            self.assertGreater(idle["reads_per_second"], 0)
+            self.assertEqual(idle["commits"], 0, "Expected no writer without a writer profile.")
+            self.assertGreater(busy["reads_per_second"], 0)
+            self.assertGreater(busy["commits"], 0, "Expected writer to commit while readers ran.")
+            self.assertLessEqual(busy["p50_ms"], busy["max_ms"])
+        self.assertEqual(os.listdir(self.catalog_dir), ["catalog.db"], "Expected scratch copies to be removed.")
@@ -0,0 +1,60 @@
+import contextlib
+import csv
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from knowledge_base.api import KnowledgeBaseAPI
+from scripts import test_db_utils
+from scripts.extract_entities import export_entities
+
+
+def _read_csv(filename):
+    with open(filename, newline="") as f:
+        return list(csv.reader(f))
+
+
+class TestExtractEntities(unittest.TestCase):
+
+    def setUp(self):
+        self.DB_path = test_db_utils.create_and_populate_db()
+        self.out_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.out_dir)
+        test_db_utils.remove_db()
+
+    def test_export_songs(self):
+        filename = os.path.join(self.out_dir, "songs.csv")
+        num_rows = export_entities(self.DB_path, "song", filename, batch_size=2)
+
+        rows = _read_csv(filename)
+        self.assertEqual(num_rows, len(rows))
+        self.assertEqual(rows[0], ["Despacito", "Despacito"], "Expected each name to be its own synonym.")
+        self.assertEqual([x[0] for x in rows], ["Despacito", "Rock Your Body", "Beautiful Day", "In My Blood", "Sorry", "Sorry"])
+
+    def test_export_sharded(self):
+        filename, sharded_filename = os.path.join(self.out_dir, "1.csv"), os.path.join(self.out_dir, "2.csv")
+        export_entities(self.DB_path, "artist", filename)
+        num_rows = export_entities(self.DB_path, "artist", sharded_filename, batch_size=1, num_workers=3)
+
+        self.assertEqual(num_rows, 5)
+        with open(filename) as f, open(sharded_filename) as sharded_f:
+            self.assertEqual(sharded_f.read(), f.read(), "Expected same file from shards.")
+        self.assertEqual(sorted(os.listdir(self.out_dir)), ["1.csv", "2.csv"], "Expected part files to be removed.")
+
+    def test_export_quotes_and_sections(self):
+        kb_api = KnowledgeBaseAPI(dbName=self.DB_path)
+        with contextlib.redirect_stdout(io.StringIO()):
+            kb_api.add_artist('Say "Hi" (Live) - Remastered')
+        kb_api.close()
+
+        filename = os.path.join(self.out_dir, "artists.csv")
+        export_entities(self.DB_path, "artist", filename)
+        self.assertEqual(_read_csv(filename)[-1], ['Say "Hi"', 'Say "Hi"'])
+
+    def test_export_bad_entity_type(self):
+        with self.assertRaises(ValueError):
+            export_entities(self.DB_path, "genre", os.path.join(self.out_dir, "genres.csv"))
@@ -0,0 +1,54 @@
+import unittest
+
+from knowledge_base.api import KnowledgeBaseAPI
+from scripts import test_db_utils
+from scripts.materialize_similar_songs import compute_similar_songs, load_catalog, materialize_similar_songs
+
+ALL_SONG_IDS = [10, 11, 12, 13, 14, 15]
+
+
+class TestMaterializeSimilarSongs(unittest.TestCase):
+
+    def setUp(self):
+        self.DB_path = test_db_utils.create_and_populate_db()
+        self.kb_api = KnowledgeBaseAPI(dbName=self.DB_path)
+
+    def tearDown(self):
+        self.kb_api.close()
+        test_db_utils.remove_db()
+
+    def test_compute_similar_songs(self):
+        catalog = load_catalog(self.kb_api)
+        similar_songs = compute_similar_songs(catalog, k=2, num_workers=1, chunk_size=4)
+
+        self.assertEqual(sorted(similar_songs.keys()), ALL_SONG_IDS)
+        for song_id, edges in similar_songs.items():
+            self.assertEqual(len(edges), 2)
+            self.assertNotIn(song_id, [dest_id for dest_id, _ in edges], "Expected song not to be similar to itself.")
+            scores = [score for _, score in edges]
+            self.assertEqual(scores, sorted(scores, reverse=True), "Expected most similar song first.")
+            self.assertTrue(all(0 <= score <= 100 for score in scores))
+
+        # 'Sorry' (14) and 'Despacito' (10) are both by Justin Bieber and have similar valence
+        self.assertEqual(similar_songs[10][0][0], 14)
+
+        self.assertEqual(
+            compute_similar_songs(catalog, k=2, num_workers=2, chunk_size=4), similar_songs,
+            "Expected same results from a process pool.")
+
+    def test_materialize_similar_songs(self):
+        self.assertEqual(self.kb_api.get_related_entities("Despacito"), ["Rock Your Body"])
+
+        self.assertEqual(materialize_similar_songs(self.DB_path, k=3, num_workers=2), 18)
+        self.assertEqual(len(self.kb_api.get_related_entities("Despacito")), 3)
+        self.assertIn("Sorry", self.kb_api.get_related_entities("Despacito"))
+
+        self.assertEqual(materialize_similar_songs(self.DB_path, k=1, num_workers=1), 6)
+        self.assertEqual(self.kb_api.get_related_entities("Despacito"), ["Sorry"],
+            "Expected edges from an earlier run to be replaced.")
+        self.assertEqual(self.kb_api.get_related_entities("Justin Bieber"), ["Justin Timberlake", "Shawn Mendes"],
+            "Expected edges between artists to be kept.")
+
+
+if __name__ == '__main__':
+    unittest.main()
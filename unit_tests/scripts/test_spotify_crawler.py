@@ -0,0 +1,194 @@
+import time
+import unittest
+from contextlib import closing
+
+from knowledge_base.api import KnowledgeBaseAPI
+from scripts import test_db_utils
+from scripts.spotify_crawler import SpotifyCrawler
+from unit_tests.utils.spotify_stub import SpotifyStub, make_catalog
+from utils.spotify_client import SpotifyClient
+
+
+class TestSpotifyCrawler(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = make_catalog(num_artists=10, num_related=3, songs_per_artist=4)
+        self.stub = SpotifyStub(self.catalog)
+        self.stub.start()
+        self.spotify = SpotifyClient("id", "secret", api_base=self.stub.api_base, auth_url=self.stub.auth_url)
+
+        DB_path = test_db_utils.create_db()
+        self.kb_api = KnowledgeBaseAPI(dbName=DB_path)
+
+    def tearDown(self):
+        self.kb_api.close()
+        test_db_utils.remove_db()
+        self.spotify.close()
+        self.stub.stop()
+
+    def test_crawl(self):
+        # Artist 0's related artists are 1-3, Artist 2's are 3-5
+        stats = SpotifyCrawler(self.spotify, self.kb_api, num_workers=4).crawl(["Artist 0\n", "Artist 2\n", "\n"])
+
+        expected_artists = ["Artist {}".format(i) for i in range(6)]
+        self.assertEqual(sorted(self.kb_api.get_all_artist_names()), expected_artists)
+        self.assertEqual(stats, dict(artists=6, songs=24))
+
+        self.assertEqual(sorted(self.kb_api.get_related_entities("Artist 0")), ["Artist 1", "Artist 2", "Artist 3"])
+        self.assertEqual(sorted(self.kb_api.get_related_entities("Artist 3")), ["Artist 0", "Artist 2"])
+        self.assertEqual(self.kb_api.get_related_entities("Artist 4"), ["Artist 2"])
+
+        artist_data = self.kb_api.get_artist_data("Artist 4")[0]
+        self.assertEqual(artist_data["num_spotify_followers"], 5000)
+        self.assertEqual(artist_data["genres"], ["genre 1"])
+
+        songs = self.kb_api.get_songs_by_artist("Artist 4")
+        self.assertEqual(len(songs), 4)
+        song_data = self.kb_api.get_song_data("Song 1 by Artist 4")[0]
+        expected_song = self.catalog["Artist 4"]["songs"][1]
+        self.assertEqual(song_data["spotify_uri"], expected_song["uri"])
+        self.assertEqual(song_data["danceability"], expected_song["danceability"])
+        self.assertEqual(song_data["mode"], "major")
+
+    def test_fetches_each_artist_once(self):
+        SpotifyCrawler(self.spotify, self.kb_api, num_workers=8).crawl(["Artist {}".format(i) for i in range(10)])
+
+        self.assertEqual(len(self.kb_api.get_all_artist_names()), 10)
+        self.assertEqual(self.stub.request_counts["search"], 10)
+        self.assertEqual(self.stub.request_counts["related-artists"], 10)
+        self.assertEqual(self.stub.request_counts["top-tracks"], 10,
+            "Expected top songs of artists related to several seeds to be fetched only once.")
+        self.assertEqual(self.stub.request_counts["audio-features"], 1,
+            "Expected audio features of all 40 songs to be fetched in one request.")
+
+    def test_audio_features_requests_merged(self):
+        self.spotify.close()
+        self.stub.stop()
+        self.stub = SpotifyStub(make_catalog(num_artists=30, num_related=5, songs_per_artist=10))
+        self.stub.start()
+        self.spotify = SpotifyClient("id", "secret", api_base=self.stub.api_base, auth_url=self.stub.auth_url)
+
+        stats = SpotifyCrawler(self.spotify, self.kb_api, num_workers=8).crawl(["Artist 0", "Artist 10", "Artist 20"])
+
+        self.assertEqual(stats, dict(artists=18, songs=180))
+        self.assertEqual(self.stub.request_counts["audio-features"], 2)
+        song_data = self.kb_api.get_song_data("Song 9 by Artist 25")[0]
+        self.assertIsNotNone(song_data["danceability"], "Expected every song to have audio features.")
+
+    def test_unknown_artist_skipped(self):
+        stats = SpotifyCrawler(self.spotify, self.kb_api).crawl(["Unknown artist", "Artist 9"])
+        self.assertEqual(stats["artists"], 4)
+        self.assertEqual(self.kb_api.get_artist_data("Unknown artist"), [])
+
+    def get_fetch_state(self, artist_name):
+        "Returns Spotify ID and time of last fetch of given artist."
+        with closing(self.kb_api.pool.connect()) as con:
+            return con.execute("""
+                SELECT spotify_id, last_fetched_at
+                FROM artists JOIN nodes ON nodes.id == artists.node_id
+                WHERE nodes.name = (?);
+            """, (artist_name,)).fetchone()
+
+    def set_last_fetched_at(self, fetched_at, artist_names=None):
+        with closing(self.kb_api.pool.connect()) as con:
+            with con:
+                if artist_names is None:
+                    con.execute("UPDATE artists SET last_fetched_at = (?);", (fetched_at,))
+                for name in artist_names or []:
+                    con.execute("""
+                        UPDATE artists SET last_fetched_at = (?)
+                        WHERE node_id = (SELECT id FROM nodes WHERE name = (?));
+                    """, (fetched_at, name))
+
+    def test_crawl_records_fetch_state(self):
+        before = int(time.time())
+        SpotifyCrawler(self.spotify, self.kb_api).crawl(["Artist 0"])
+        spotify_id, last_fetched_at = self.get_fetch_state("Artist 2")
+        self.assertEqual(spotify_id, "artist2")
+        self.assertGreaterEqual(last_fetched_at, before)
+        self.assertEqual(self.kb_api.get_stale_artists(before), [])
+        self.assertEqual(len(self.kb_api.get_stale_artists(int(time.time()) + 1)), 4)
+
+    def test_refresh(self):
+        crawler = SpotifyCrawler(self.spotify, self.kb_api)
+        crawler.crawl(["Artist 0"])
+        self.set_last_fetched_at(1000, ["Artist 1"])
+
+        # Artist 1 gained followers, a new top song, and a new related artist
+        artist = self.catalog["Artist 1"]
+        artist["num_followers"] = 99999
+        artist["songs"][0]["popularity"] = 1
+        artist["songs"].append(dict(artist["songs"][1], name="New song", id="newsong", uri="spotify:track:newsong"))
+        artist["related"].append("Artist 9")
+        self.stub._songs_by_id["newsong"] = artist["songs"][-1]
+        num_top_tracks_requests = self.stub.request_counts["top-tracks"]
+
+        stats = crawler.refresh(max_age_seconds=3600)
+
+        self.assertEqual(stats, dict(artists=1, songs=1))
+        self.assertEqual(self.stub.request_counts["top-tracks"], num_top_tracks_requests + 1,
+            "Expected only the stale artist to be fetched again.")
+        self.assertEqual(self.kb_api.get_artist_data("Artist 1")[0]["num_spotify_followers"], 99999)
+        self.assertEqual(self.kb_api.get_song_data("Song 0 by Artist 1")[0]["popularity"], 1)
+        self.assertEqual(len(self.kb_api.get_songs_by_artist("Artist 1")), 5)
+        self.assertIn("Artist 9", self.kb_api.get_related_entities("Artist 1"))
+        self.assertGreater(self.get_fetch_state("Artist 1")[1], 1000)
+
+        # new related artists (Artist 4 is related to the refreshed Artist 1 as well)
+        # are refreshed, i.e. fetched for the first time, next
+        self.assertEqual(self.get_fetch_state("Artist 9"), ("artist9", None))
+        self.assertEqual(crawler.refresh(max_age_seconds=3600), dict(artists=2, songs=8))
+        self.assertEqual(crawler.refresh(max_age_seconds=3600, limit=1), dict(artists=1, songs=4))
+
+    def test_refresh_artists_without_spotify_id(self):
+        test_db_utils.exec_sql_script(self.kb_api.dbName, "scripts/test_data.sql")
+        self.kb_api.add_artist("Artist 3")
+        self.assertEqual(self.get_fetch_state("Artist 3"), (None, None))
+
+        stats = SpotifyCrawler(self.spotify, self.kb_api).refresh(max_age_seconds=3600)
+
+        self.assertEqual(stats["artists"], 1, "Expected only Artist 3 to be found on Spotify.")
+        self.assertEqual(self.get_fetch_state("Artist 3")[0], "artist3")
+        self.assertEqual(len(self.kb_api.get_songs_by_artist("Artist 3")), 4)
+        self.assertIsNotNone(self.get_fetch_state("Justin Bieber")[1],
+            "Expected artists not on Spotify to be skipped until they are stale again.")
+        self.assertEqual(
+            [name for _, name, _ in self.kb_api.get_stale_artists(int(time.time()) - 3600)],
+            ["Artist 4", "Artist 5", "Artist 6"],
+            "Expected only newly found related artists to be left to refresh.")
+
+    def test_refresh_resumes_after_interruption(self):
+        crawler = SpotifyCrawler(self.spotify, self.kb_api, num_workers=1)
+        crawler.crawl(["Artist 0", "Artist 5"])
+        self.set_last_fetched_at(1000)
+
+        get_related_artists = self.spotify.get_related_artists
+        num_calls = []
+        def get_related_artists_then_fail(artist_id):
+            num_calls.append(artist_id)
+            if len(num_calls) > 3:
+                raise ConnectionError("Connection lost")
+            return get_related_artists(artist_id)
+        self.spotify.get_related_artists = get_related_artists_then_fail
+
+        # artists are refreshed in order of their node IDs: Artist 0, 1, 2, then 3, 5, 6, then 7, 8
+        with self.assertRaises(ConnectionError):
+            crawler.refresh(max_age_seconds=3600, checkpoint_size=3)
+        for name in ["Artist 0", "Artist 1", "Artist 2"]:
+            self.assertGreater(self.get_fetch_state(name)[1], 1000, "Expected first checkpoint to be committed.")
+        for name in ["Artist 3", "Artist 5"]:
+            self.assertEqual(self.get_fetch_state(name)[1], 1000, "Expected work after checkpoint to be rolled back.")
+
+        self.spotify.get_related_artists = get_related_artists
+        num_related_artists_requests = self.stub.request_counts["related-artists"]
+        # Artists 3, 5-8, and Artist 4, who was found to be related to Artist 2
+        self.assertEqual(crawler.refresh(max_age_seconds=3600)["artists"], 6)
+        self.assertEqual(self.stub.request_counts["related-artists"], num_related_artists_requests + 6)
+        self.assertEqual(
+            [name for _, name, _ in self.kb_api.get_stale_artists(int(time.time()) - 3600)],
+            ["Artist 9"],
+            "Expected only Artist 9, found to be related to Artists 7 and 8, to be left to refresh.")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,244 @@
+"""
+A local stand-in for the parts of Spotify's web API that SpotifyClient uses,
+so that the client and the crawler can be tested offline.
+
+Usage:
+    stub = SpotifyStub(make_catalog(num_artists=10))
+    stub.start()
+    spotify = SpotifyClient("id", "secret", api_base=stub.api_base, auth_url=stub.auth_url)
+    ...
+    stub.stop()
+"""
+
+import gzip
+import json
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+STUB_TOKEN = "stub-token"
+
+
+def make_catalog(num_artists, num_related=3, songs_per_artist=4):
+    """Generates a deterministic catalog in which related artists overlap.
+
+    Returns:
+        (dict): key is artist name, val is dict with id, genres, num_followers,
+            related (list of artist names), and songs (list of dicts with song metadata
+            and audio features).
+            e.g. {
+                "Artist 0": {
+                    "id": "artist0",
+                    "genres": ["genre 0"],
+                    "num_followers": 1000,
+                    "related": ["Artist 1", "Artist 2", "Artist 3"],
+                    "songs": [{"name": "Song 0 by Artist 0", "id": "artist0song0", ...}, ...],
+                },
+                ...
+            }
+    """
+    catalog = dict()
+    for i in range(num_artists):
+        artist_id = f"artist{i}"
+        catalog[f"Artist {i}"] = dict(
+            id=artist_id,
+            genres=[f"genre {i % 3}"],
+            num_followers=1000 * (i + 1),
+            related=[f"Artist {(i + k) % num_artists}" for k in range(1, num_related + 1)],
+            songs=[
+                dict(
+                    name=f"Song {j} by Artist {i}",
+                    id=f"{artist_id}song{j}",
+                    uri=f"spotify:track:{artist_id}song{j}",
+                    duration_ms=100000 + 1000 * j,
+                    popularity=(i * 7 + j * 13) % 101,
+                    acousticness=((i + j) % 10) / 10,
+                    danceability=((i * 3 + j) % 10) / 10,
+                    energy=0.5, instrumentalness=0.0, liveness=0.1, loudness=-5.0,
+                    speechiness=0.05, valence=((i + 2 * j) % 10) / 10, tempo=120.0,
+                    key=j % 12, mode=j % 2, time_signature=4,
+                )
+                for j in range(songs_per_artist)
+            ],
+        )
+    return catalog
+
+
+class SpotifyStub:
+    """Serves a catalog (see make_catalog) over HTTP, in a background thread.
+
+    Counts the requests it receives per endpoint (e.g. "search", "top-tracks") in request_counts,
+    along with the number of connections opened ("connections") and of gzipped responses ("gzip").
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.request_counts = Counter()
+        self.token_expires_in = 3600  # seconds
+        self._failures = dict()  # key is endpoint, val is list of (HTTP status, Retry-After header)
+        self._artists_by_id = {info["id"]: (name, info) for name, info in catalog.items()}
+        self._songs_by_id = {
+            song["id"]: song for info in catalog.values() for song in info["songs"]
+        }
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def api_base(self):
+        return "http://127.0.0.1:{}".format(self._server.server_address[1])
+
+    @property
+    def auth_url(self):
+        return self.api_base + "/api/token"
+
+    def start(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(self))
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def count(self, endpoint):
+        with self._lock:
+            self.request_counts[endpoint] += 1
+
+    def fail_next(self, endpoint, status, times=1, retry_after=None):
+        """Makes the next requests to given endpoint fail with given HTTP status.
+
+        Params:
+            endpoint (str): e.g. "top-tracks".
+            status (int): e.g. 429.
+            times (int): number of requests that should fail.
+            retry_after (int): value of Retry-After header in failed responses, if any.
+        """
+        with self._lock:
+            self._failures.setdefault(endpoint, []).extend([(status, retry_after)] * times)
+
+    def _count_or_fail(self, endpoint):
+        """Counts a request to given endpoint.
+
+        Returns:
+            (tuple): failure response (see handle) if the request should fail; None otherwise.
+        """
+        self.count(endpoint)
+        with self._lock:
+            failures = self._failures.get(endpoint)
+            if not failures:
+                return None
+            status, retry_after = failures.pop(0)
+        headers = dict() if retry_after is None else {"Retry-After": str(retry_after)}
+        return status, dict(error=dict(status=status, message="Stub failure")), headers
+
+    def _artist_json(self, name, info):
+        return dict(name=name, id=info["id"], genres=info["genres"], followers=dict(total=info["num_followers"]))
+
+    def handle(self, method, path, params):
+        """
+        Returns:
+            (tuple): HTTP status, JSON-serializable body, and optionally headers (dict).
+        """
+        parts = path.strip("/").split("/")
+        if method == "POST" and path == "/api/token":
+            failure = self._count_or_fail("token")
+            if failure is not None:
+                return failure
+            return 200, dict(access_token=STUB_TOKEN, token_type="Bearer", expires_in=self.token_expires_in)
+
+        if method != "GET" or parts[0] != "v1":
+            return 404, dict(error=dict(status=404, message="Not found"))
+
+        if parts[1:] == ["search"]:
+            failure = self._count_or_fail("search")
+            if failure is not None:
+                return failure
+            query = params.get("q", [""])[0]
+            items = [self._artist_json(name, info) for name, info in self.catalog.items() if name == query]
+            return 200, dict(artists=dict(items=items))
+
+        if parts[1:] == ["artists"]:
+            failure = self._count_or_fail("artists")
+            if failure is not None:
+                return failure
+            ids = params.get("ids", [""])[0].split(",")
+            if len(ids) > 50:
+                return 400, dict(error=dict(status=400, message="Too many ids requested"))
+            artists = [self._artists_by_id.get(x) for x in ids]
+            return 200, dict(artists=[None if x is None else self._artist_json(*x) for x in artists])
+
+        if parts[1] == "artists" and len(parts) == 4:
+            name, info = self._artists_by_id.get(parts[2], (None, None))
+            if info is None:
+                return 400, dict(error=dict(status=400, message="invalid id"))
+            if parts[3] == "related-artists":
+                failure = self._count_or_fail("related-artists")
+                if failure is not None:
+                    return failure
+                return 200, dict(artists=[self._artist_json(x, self.catalog[x]) for x in info["related"]])
+            if parts[3] == "top-tracks":
+                failure = self._count_or_fail("top-tracks")
+                if failure is not None:
+                    return failure
+                tracks = [
+                    dict(name=x["name"], id=x["id"], uri=x["uri"], duration_ms=x["duration_ms"], popularity=x["popularity"])
+                    for x in info["songs"]
+                ]
+                return 200, dict(tracks=tracks)
+
+        if parts[1:] == ["audio-features"]:
+            failure = self._count_or_fail("audio-features")
+            if failure is not None:
+                return failure
+            ids = unquote(params.get("ids", [""])[0]).split(",")
+            if len(ids) > 100:
+                return 400, dict(error=dict(status=400, message="Too many ids requested"))
+            features = []
+            for track_id in ids:
+                song = self._songs_by_id.get(track_id)
+                features.append(None if song is None else dict(
+                    {k: v for k, v in song.items() if k not in ("name", "popularity", "uri")},
+                    type="audio_features", uri=song["uri"],
+                ))
+            return 200, dict(audio_features=features)
+
+        return 404, dict(error=dict(status=404, message="Not found"))
+
+
+def _make_handler(stub):
+    class Handler(BaseHTTPRequestHandler):
+        # keeps connections alive between requests
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            stub.count("connections")
+
+        def _respond(self, method):
+            url = urlparse(self.path)
+            status, body, *headers = stub.handle(method, url.path, parse_qs(url.query))
+            payload = json.dumps(body).encode("UTF-8")
+            self.send_response(status)
+            for name, value in (headers[0] if headers else dict()).items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "application/json")
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                stub.count("gzip")
+                payload = gzip.compress(payload)
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            self._respond("GET")
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            self.rfile.read(length)
+            self._respond("POST")
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
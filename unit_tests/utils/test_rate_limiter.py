@@ -0,0 +1,69 @@
+import threading
+import time
+import unittest
+
+from utils.rate_limiter import TokenBucket
+
+
+class FakeClock:
+    "Time that only passes when sleeping."
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.bucket = TokenBucket(rate=10, capacity=5, clock=self.clock, sleep=self.clock.sleep)
+
+    def test_burst_then_steady_rate(self):
+        waits = [self.bucket.acquire() for _ in range(25)]
+        self.assertEqual(waits[:5], [0.0] * 5, "Expected a burst of up to capacity to go through at once.")
+        self.assertAlmostEqual(self.clock.now, 2.0)
+
+    def test_refills_up_to_capacity(self):
+        for _ in range(5):
+            self.bucket.acquire()
+        self.clock.now += 100
+        waits = [self.bucket.acquire() for _ in range(6)]
+        self.assertEqual(waits[:5], [0.0] * 5)
+        self.assertAlmostEqual(waits[5], 0.1)
+
+    def test_pause(self):
+        self.bucket.pause(3)
+        self.assertAlmostEqual(self.bucket.acquire(), 3.0)
+        self.assertAlmostEqual(self.bucket.acquire(), 0.1, msg="Expected no burst right after a pause.")
+
+        self.bucket.pause(5)
+        self.bucket.pause(1)
+        # bucket was empty when paused, so a token is due 0.1s after the pause ends
+        self.assertAlmostEqual(self.bucket.acquire(), 5.1, msg="Expected longer pause to be kept.")
+
+    def test_concurrent_acquires(self):
+        bucket = TokenBucket(rate=200, capacity=10)
+        acquired = []
+        threads = [threading.Thread(target=lambda: acquired.append(bucket.acquire())) for _ in range(40)]
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(acquired), 40)
+        # 10 tokens right away, then 30 more at 200 per second
+        self.assertGreaterEqual(time.monotonic() - start, 0.15 - 0.01)
+
+    def test_invalid_rate(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import unittest
+
+from unit_tests.utils.spotify_stub import SpotifyStub, make_catalog
+from utils.response_cache import DAY_IN_SECONDS, ResponseCache
+from utils.spotify_client import SpotifyClient
+
+CACHE_PATH = "response_cache_test.db"
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = ResponseCache(CACHE_PATH, clock=self.clock)
+        self.stub = SpotifyStub(make_catalog(num_artists=5))
+        self.stub.start()
+
+    def tearDown(self):
+        self.cache.close()
+        os.remove(CACHE_PATH)
+        self.stub.stop()
+
+    def make_client(self):
+        return SpotifyClient("id", "secret", api_base=self.stub.api_base, auth_url=self.stub.auth_url, cache=self.cache)
+
+    def test_get_put(self):
+        url = "https://api.spotify.com/v1/search"
+        self.assertIsNone(self.cache.get(url, dict(q="U2", type="artist")))
+        self.cache.put(url, dict(q="U2", type="artist"), b"{}")
+        self.assertEqual(self.cache.get(url, dict(type="artist", q="U2")), b"{}",
+            "Expected order of params to not matter.")
+        self.assertIsNone(self.cache.get(url, dict(q="U3", type="artist")))
+
+    def test_ttl(self):
+        url = "https://api.spotify.com/v1/artists/123/top-tracks"
+        self.cache.put(url, dict(country="CA"), b"{}")
+        self.clock.now += DAY_IN_SECONDS - 1
+        self.assertEqual(self.cache.get(url, dict(country="CA")), b"{}")
+        self.clock.now += 2
+        self.assertIsNone(self.cache.get(url, dict(country="CA")))
+
+        self.assertEqual(self.cache.purge_expired(), 1)
+        self.assertEqual(self.cache.purge_expired(), 0)
+
+    def test_uncacheable_endpoint(self):
+        self.cache.put("https://accounts.spotify.com/api/token", None, b"{}")
+        self.assertIsNone(self.cache.get("https://accounts.spotify.com/api/token"))
+
+    def test_replays_responses(self):
+        spotify = self.make_client()
+        artist_data = spotify.get_artist_data("Artist 1")
+        related_artists = spotify.get_related_artists("artist1")
+        top_songs = spotify.get_top_songs("artist1", "CA")
+        audio_features = spotify.get_audio_features(["artist1song0", "artist1song1"])
+        spotify.close()
+        self.assertEqual(spotify.metrics["cache_misses"], 4)
+        num_requests = sum(self.stub.request_counts.values())
+
+        # e.g. a rebuild of the knowledge base
+        spotify = self.make_client()
+        self.assertEqual(spotify.get_artist_data("Artist 1"), artist_data)
+        self.assertEqual(spotify.get_related_artists("artist1"), related_artists)
+        self.assertEqual(spotify.get_top_songs("artist1", "CA"), top_songs)
+        self.assertEqual(spotify.get_audio_features(["artist1song0", "artist1song1"]), audio_features)
+        spotify.close()
+        self.assertEqual(spotify.metrics["cache_hits"], 4)
+        self.assertEqual(sum(self.stub.request_counts.values()), num_requests,
+            "Expected no requests, not even for a token.")
+
+    def test_failed_responses_not_cached(self):
+        spotify = self.make_client()
+        spotify._sleep = lambda seconds: None
+        self.stub.fail_next("top-tracks", 500, times=spotify.max_retries + 1)
+        self.assertEqual(spotify.get_top_songs("artist1", "CA"), dict())
+        self.assertEqual(len(spotify.get_top_songs("artist1", "CA")), 4)
+        spotify.close()
+        self.assertEqual(spotify.metrics["cache_hits"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
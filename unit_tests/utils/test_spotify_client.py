@@ -0,0 +1,174 @@
+import threading
+import unittest
+
+from unit_tests.utils.spotify_stub import STUB_TOKEN, SpotifyStub, make_catalog
+from utils import spotify_client
+from utils.spotify_client import SpotifyClient
+
+
+class TestSpotifyClient(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = SpotifyStub(make_catalog(num_artists=5))
+        self.stub.start()
+        self.spotify = SpotifyClient("id", "secret", api_base=self.stub.api_base, auth_url=self.stub.auth_url)
+
+    def tearDown(self):
+        self.spotify.close()
+        self.stub.stop()
+
+    def test_get_artist_data(self):
+        self.assertEqual(
+            self.spotify.get_artist_data("Artist 1"),
+            dict(id="artist1", num_followers=2000, genres=["genre 1"]),
+        )
+        self.assertIsNone(self.spotify.get_artist_data("Unknown artist"))
+
+    def test_get_audio_features_in_batches(self):
+        self.spotify.close()
+        self.stub.stop()
+        self.stub = SpotifyStub(make_catalog(num_artists=25, songs_per_artist=10))
+        self.stub.start()
+        self.spotify = SpotifyClient("id", "secret", api_base=self.stub.api_base, auth_url=self.stub.auth_url)
+
+        track_ids = ["artist{}song{}".format(i, j) for i in range(25) for j in range(10)]
+        audio_features = self.spotify.get_audio_features(track_ids + ["unknown"])
+        self.assertEqual(set(audio_features.keys()), set(track_ids))
+        self.assertEqual(audio_features["artist3song4"]["key"], 4)
+        self.assertEqual(self.stub.request_counts["audio-features"], 3)
+
+    def test_batches_requested_on_shared_threads(self):
+        spotify = SpotifyClient("id", "secret", api_base=self.stub.api_base, auth_url=self.stub.auth_url, pool_size=2)
+        track_ids = ["artist{}song{}".format(i, j) for i in range(2) for j in range(5)]
+
+        def get_audio_features():
+            for _ in range(3):
+                spotify._get_in_batches(spotify._get_audio_features_batch, track_ids, 2)
+        threads = [threading.Thread(target=get_audio_features) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        client_threads = [t for t in threading.enumerate() if t.name.startswith("SpotifyClient")]
+        self.assertGreater(len(client_threads), 0, "Expected batches to be requested on the client's threads.")
+        self.assertLessEqual(len(client_threads), 2, "Expected batches of all callers to share the client's threads.")
+
+        spotify.close()
+        for thread in client_threads:
+            thread.join(timeout=5)
+            self.assertFalse(thread.is_alive(), "Expected threads to be stopped when client is closed.")
+
+    def test_get_audio_features_none(self):
+        self.assertEqual(self.spotify.get_audio_features([]), dict())
+        self.assertEqual(self.stub.request_counts["audio-features"], 0)
+
+    def test_get_artists(self):
+        artists = self.spotify.get_artists(["artist{}".format(i) for i in range(5)] * 12 + ["unknown"])
+        self.assertEqual(len(artists), 5)
+        self.assertEqual(artists["artist2"], dict(name="Artist 2", genres=["genre 2"], num_followers=3000))
+        self.assertEqual(self.stub.request_counts["artists"], 2)
+
+    def test_retries_when_throttled(self):
+        spotify = SpotifyClient("id", "secret", api_base=self.stub.api_base, auth_url=self.stub.auth_url,
+            requests_per_second=None)
+        sleeps = []
+        spotify._sleep = sleeps.append
+        self.stub.fail_next("top-tracks", 429, times=2, retry_after=2)
+
+        self.assertEqual(len(spotify.get_top_songs("artist1", "CA")), 4)
+        spotify.close()
+        self.assertEqual(sleeps, [2.0, 2.0], "Expected Retry-After header to be honored.")
+        self.assertEqual(spotify.metrics["retries"], 2)
+        self.assertEqual(spotify.metrics["rate_limited"], 2)
+        self.assertEqual(spotify.metrics["throttled_seconds"], 4.0)
+
+    def test_retries_server_errors_with_backoff(self):
+        spotify = SpotifyClient("id", "secret", api_base=self.stub.api_base, auth_url=self.stub.auth_url,
+            requests_per_second=None)
+        sleeps = []
+        spotify._sleep = sleeps.append
+        self.stub.fail_next("token", 503)
+        self.stub.fail_next("audio-features", 500, times=3)
+
+        audio_features = spotify.get_audio_features(["artist1song0", "artist1song1"])
+        spotify.close()
+        self.assertEqual(len(audio_features), 2)
+        self.assertEqual(len(sleeps), 4)
+        for max_delay, delay in zip([0.5, 0.5, 1.0, 2.0], sleeps):
+            self.assertLessEqual(delay, max_delay)
+        self.assertEqual(spotify.metrics["retries"], 4)
+        self.assertEqual(spotify.metrics["rate_limited"], 0)
+
+    def test_gives_up_after_max_retries(self):
+        spotify = SpotifyClient("id", "secret", api_base=self.stub.api_base, auth_url=self.stub.auth_url,
+            requests_per_second=None, max_retries=2)
+        spotify._sleep = lambda seconds: None
+        self.stub.fail_next("top-tracks", 502, times=3)
+
+        self.assertEqual(spotify.get_top_songs("artist1", "CA"), dict())
+        spotify.close()
+        self.assertEqual(self.stub.request_counts["top-tracks"], 3)
+        self.assertEqual(spotify.metrics["retries"], 2)
+
+    def test_client_errors_not_retried(self):
+        self.assertEqual(self.spotify.get_top_songs("unknown", "CA"), dict())
+        self.assertEqual(self.spotify.metrics["retries"], 0)
+
+    def test_token_cached(self):
+        for _ in range(5):
+            self.spotify.get_top_songs("artist1", "CA")
+        self.assertEqual(self.spotify.token, STUB_TOKEN)
+        self.assertEqual(self.stub.request_counts["token"], 1)
+        self.assertEqual(self.spotify.metrics["token_refreshes"], 1)
+        self.assertEqual(self.spotify.metrics["token_hits"], 5)
+
+    def test_token_refreshed_before_expiry(self):
+        self.stub.token_expires_in = spotify_client.TOKEN_EXPIRY_MARGIN_SECONDS
+        self.spotify.get_top_songs("artist1", "CA")
+        self.spotify.get_top_songs("artist1", "CA")
+        self.assertEqual(self.stub.request_counts["token"], 2)
+        self.assertEqual(self.spotify.metrics["token_refreshes"], 2)
+
+    def test_token_refreshed_once_by_concurrent_callers(self):
+        threads = [threading.Thread(target=lambda: self.spotify.token) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.stub.request_counts["token"], 1)
+        self.assertEqual(self.spotify.metrics["token_refreshes"], 1)
+        self.assertEqual(self.spotify.metrics["token_hits"], 19)
+
+    def test_connections_reused(self):
+        for _ in range(5):
+            self.spotify.get_top_songs("artist1", "CA")
+        self.assertEqual(self.stub.request_counts["connections"], 1)
+        self.assertEqual(self.stub.request_counts["gzip"], 6)
+
+    def test_connections_reused_by_concurrent_callers(self):
+        spotify = SpotifyClient("id", "secret", api_base=self.stub.api_base, auth_url=self.stub.auth_url, pool_size=4)
+        spotify.token
+        num_connections_before = self.stub.request_counts["connections"]
+
+        def make_requests():
+            for _ in range(10):
+                spotify.get_top_songs("artist1", "CA")
+        threads = [threading.Thread(target=make_requests) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        spotify.close()
+
+        self.assertEqual(self.stub.request_counts["top-tracks"], 40)
+        self.assertLessEqual(self.stub.request_counts["connections"] - num_connections_before, 4)
+
+    def test_uncompressed(self):
+        spotify = SpotifyClient("id", "secret", api_base=self.stub.api_base, auth_url=self.stub.auth_url, compress=False)
+        self.assertEqual(len(spotify.get_top_songs("artist1", "CA")), 4)
+        spotify.close()
+        self.assertEqual(self.stub.request_counts["gzip"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import threading
+import time
+
+# tolerance for floating point error in token counts
+_EPSILON = 1e-9
+
+
+class TokenBucket:
+    """Limits the rate at which something (e.g. HTTP requests) happens, across threads.
+
+    The bucket holds up to `capacity` tokens and gains `rate` tokens per second.
+    Each acquire() takes a token, waiting for one if the bucket is empty, so bursts
+    of up to `capacity` go through at once while the long-run rate stays at `rate`.
+
+    Usage:
+        bucket = TokenBucket(rate=10, capacity=10)
+        bucket.acquire()
+        requests.get(...)
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        """
+        Params:
+            rate (float): tokens added per second.
+            capacity (float): max number of tokens; defaults to rate (i.e. one second's worth).
+            clock (function): returns current time in seconds; may be replaced for testing.
+            sleep (function): waits for given number of seconds; may be replaced for testing.
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive, got {}".format(rate))
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.capacity
+        self._last_refill = clock()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        "Must hold self._lock."
+        # no tokens are added while paused
+        start = max(self._last_refill, min(self._paused_until, now))
+        self._tokens = min(self.capacity, self._tokens + max(0.0, now - start) * self.rate)
+        self._last_refill = now
+
+    def acquire(self):
+        """Takes a token, waiting until one is available.
+
+        Returns:
+            (float): number of seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._refill(now)
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._tokens >= 1 - _EPSILON:
+                    self._tokens = max(0.0, self._tokens - 1)
+                    return waited
+                else:
+                    wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+            waited += wait
+
+    def pause(self, seconds):
+        """Stops handing out tokens for given number of seconds, e.g. when a server asks
+        clients to back off. Does not shorten a longer pause already in effect.
+        """
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            self._paused_until = max(self._paused_until, now + seconds)
+            # let a single request through once the pause ends, rather than a burst
+            self._tokens = min(self._tokens, 1)
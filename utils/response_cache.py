@@ -0,0 +1,128 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from urllib.parse import urlencode, urlparse
+
+DAY_IN_SECONDS = 24 * 60 * 60
+
+# how long responses stay valid, by endpoint (last segment of the URL's path);
+# responses from other endpoints are not cached
+DEFAULT_TTLS = {
+    "search": 7 * DAY_IN_SECONDS,
+    "artists": 7 * DAY_IN_SECONDS,
+    "related-artists": 7 * DAY_IN_SECONDS,
+    "top-tracks": DAY_IN_SECONDS,
+    # computed once per track, so they do not change
+    "audio-features": 90 * DAY_IN_SECONDS,
+}
+
+
+class ResponseCache:
+    """Stores bodies of successful HTTP responses in a SQLite file, so that they can be replayed.
+
+    Useful for rebuilding the knowledge base, or resuming a crawl that failed halfway,
+    without making the same requests to Spotify again.
+
+    Responses are keyed by a hash of their URL and query parameters.
+
+    Usage:
+        spotify = SpotifyClient(client_id, secret_key, cache=ResponseCache("spotify_cache.db"))
+    """
+
+    def __init__(self, path, ttls=None, clock=time.time):
+        """
+        Params:
+            path (str): path to SQLite file; created if it does not exist.
+            ttls (dict): key is endpoint e.g. "top-tracks", val is number of seconds
+                its responses stay valid. Defaults to DEFAULT_TTLS.
+            clock (function): returns current time in seconds; may be replaced for testing.
+        """
+        self.path = path
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(path, check_same_thread=False)
+        with self._con:
+            self._con.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    endpoint TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    body BLOB NOT NULL,
+                    fetched_at REAL NOT NULL
+                );
+            """)
+
+    def __str__(self):
+        return "Response cache in {}".format(self.path)
+
+    def close(self):
+        with self._lock:
+            self._con.close()
+
+    @staticmethod
+    def get_endpoint(url):
+        """
+        Returns:
+            (str): e.g. "top-tracks" for "https://api.spotify.com/v1/artists/123/top-tracks".
+        """
+        return urlparse(url).path.rstrip("/").split("/")[-1]
+
+    @staticmethod
+    def get_key(url, params=None):
+        query = urlencode(sorted((params or dict()).items()))
+        return hashlib.sha256("{}?{}".format(url, query).encode("UTF-8")).hexdigest()
+
+    def is_cacheable(self, url):
+        return self.get_endpoint(url) in self.ttls
+
+    def get(self, url, params=None):
+        """
+        Returns:
+            (bytes): body of cached response; None if there is none, or it expired.
+        """
+        endpoint = self.get_endpoint(url)
+        if endpoint not in self.ttls:
+            return None
+        with self._lock:
+            row = self._con.execute("""
+                SELECT body FROM responses WHERE key = (?) AND fetched_at >= (?);
+            """, (self.get_key(url, params), self._clock() - self.ttls[endpoint])).fetchone()
+        return None if row is None else row[0]
+
+    def put(self, url, params, body):
+        """Stores given response body, replacing any older response to the same request.
+
+        Params:
+            url (str): e.g. "https://api.spotify.com/v1/search".
+            params (dict): query parameters e.g. {"q": "Justin Bieber", "type": "artist"}.
+            body (bytes): response body.
+        """
+        endpoint = self.get_endpoint(url)
+        if endpoint not in self.ttls:
+            return
+        with self._lock:
+            with self._con:
+                self._con.execute("""
+                    INSERT OR REPLACE INTO responses (key, endpoint, url, body, fetched_at)
+                    VALUES (?, ?, ?, ?, ?);
+                """, (self.get_key(url, params), endpoint, url, body, self._clock()))
+
+    def purge_expired(self):
+        """Deletes expired responses.
+
+        Returns:
+            (int): number of responses deleted.
+        """
+        now = self._clock()
+        num_deleted = 0
+        with self._lock:
+            with self._con:
+                for endpoint in self._con.execute("SELECT DISTINCT endpoint FROM responses;").fetchall():
+                    endpoint = endpoint[0]
+                    ttl = self.ttls.get(endpoint, 0)
+                    num_deleted += self._con.execute("""
+                        DELETE FROM responses WHERE endpoint = (?) AND fetched_at < (?);
+                    """, (endpoint, now - ttl)).rowcount
+        return num_deleted
@@ -1,11 +1,27 @@
 import requests
+from requests.adapters import HTTPAdapter
+
+from utils.rate_limiter import TokenBucket
 from base64 import b64encode
 import pprint
+import random
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 
 pp = pprint.PrettyPrinter(indent=2)
 URL_ENCODED_COMMA = "%2C"
+# max number of IDs Spotify accepts per request to each batch endpoint
+MAX_AUDIO_FEATURES_IDS = 100
+MAX_ARTISTS_IDS = 50
+# retries of throttled (HTTP 429) or failed (HTTP 5xx) requests wait about
+# BACKOFF_BASE_SECONDS * 2^attempt, up to MAX_BACKOFF_SECONDS, unless Spotify says otherwise
+BACKOFF_BASE_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 30.0
+# tokens are refreshed this many seconds before they expire, so they do not expire mid-request
+TOKEN_EXPIRY_MARGIN_SECONDS = 60
 
 class SpotifyClient():
     """A simple object for interacting with Spotify's public web API.
@@ -23,18 +39,180 @@ class SpotifyClient():
     in Spotify's API objects: if the fields are not found, the error message should be quite clear.
     """
 
-    def __init__(self, client_id, secret_key):
+    def __init__(
+        self,
+        client_id,
+        secret_key,
+        api_base="https://api.spotify.com",
+        auth_url="https://accounts.spotify.com/api/token",
+        pool_size=10,
+        compress=True,
+        max_retries=5,
+        requests_per_second=20.0,
+        cache=None,
+    ):
+        """
+        Params:
+            client_id (str): Spotify client ID.
+            secret_key (str): Spotify secret key.
+            api_base (str): root URL of the web API; may point elsewhere for testing.
+            auth_url (str): URL for obtaining tokens; may point elsewhere for testing.
+            pool_size (int): max number of connections kept open per host; should be
+                at least the number of threads making requests concurrently. Also the
+                number of threads that batches of a request (e.g. for audio features of
+                many tracks) are requested on.
+            compress (bool): whether to ask for gzip-compressed responses.
+            max_retries (int): number of times a throttled (HTTP 429) or failed (HTTP 5xx)
+                request is retried before giving up.
+            requests_per_second (float): max rate of requests, across all threads using
+                this client; None for no limit.
+            cache (ResponseCache): if given, successful responses are stored in it, and
+                requests are answered from it while its responses are fresh.
+        """
         self.client_id = client_id
         self.secret_key = secret_key
-        self.api_base = "https://api.spotify.com"
+        self.api_base = api_base
+        self.auth_url = auth_url
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.rate_limiter = None if requests_per_second is None else TokenBucket(requests_per_second)
+        self._sleep = time.sleep
+        self.cache = cache
+
+        # connections are kept alive and reused across requests (and threads)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Accept-Encoding"] = "gzip, deflate" if compress else "identity"
+        # shared by all callers (e.g. crawler threads), so that batches never need more
+        # threads, or connections, than the pool has
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="SpotifyClient")
+
+        self._token = None
+        self._token_expires_at = 0.0  # in terms of time.monotonic()
+        self._token_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self.metrics = dict(
+            token_hits=0, token_refreshes=0,
+            retries=0, rate_limited=0, throttled_seconds=0.0,
+            cache_hits=0, cache_misses=0,
+        )
+
+    def close(self):
+        """Closes connections kept open by the client, and stops its threads."""
+        self._executor.shutdown()
+        self.session.close()
+
+    def _count(self, metric, amount=1):
+        with self._metrics_lock:
+            self.metrics[metric] += amount
+
+    def _send(self, method, url, authorize=False, **kwargs):
+        """Sends an HTTP request, unless its response is in the cache.
+
+        Params:
+            method (str): e.g. "GET".
+            url (str): e.g. "https://api.spotify.com/v1/search".
+            authorize (bool): whether to set the bearer token in the request's headers.
+            kwargs: passed on to requests.Session.request e.g. params.
+
+        Returns:
+            (requests.Response)
+        """
+        use_cache = self.cache is not None and method == "GET" and self.cache.is_cacheable(url)
+        if use_cache:
+            body = self.cache.get(url, kwargs.get("params"))
+            if body is not None:
+                self._count("cache_hits")
+                return _make_response(url, body)
+            self._count("cache_misses")
+
+        if authorize:
+            kwargs["headers"] = self.set_token_in_auth_header(dict(kwargs.get("headers") or dict()))
+        resp = self._send_with_retries(method, url, **kwargs)
+        if use_cache and resp.status_code == 200:
+            self.cache.put(url, kwargs.get("params"), resp.content)
+        return resp
+
+    def _send_with_retries(self, method, url, **kwargs):
+        """Sends an HTTP request through the session, waiting for the rate limiter first.
+
+        Throttled (HTTP 429) and failed (HTTP 5xx or connection error) requests are
+        retried, after waiting as long as Spotify asks in the Retry-After header or
+        else backing off exponentially, with jitter.
+
+        Returns:
+            (requests.Response): last response received.
+        """
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                self._count("throttled_seconds", self.rate_limiter.acquire())
+            try:
+                resp = self.session.request(method, url, **kwargs)
+            except requests.ConnectionError as e:
+                if attempt == self.max_retries:
+                    raise e
+                reason, delay = str(e), self._get_backoff(attempt)
+            else:
+                if resp.status_code == 429:
+                    self._count("rate_limited")
+                    reason, delay = "HTTP 429", self._get_retry_after(resp, attempt)
+                    if self.rate_limiter is not None:
+                        # hold back the other threads too
+                        self.rate_limiter.pause(delay)
+                elif resp.status_code >= 500:
+                    reason, delay = "HTTP {}".format(resp.status_code), self._get_backoff(attempt)
+                else:
+                    return resp
+                if attempt == self.max_retries:
+                    return resp
+
+            print("WARN: Request to '{}' failed ({}); retrying in {:.2f}s.".format(url, reason, delay))
+            self._count("retries")
+            self._count("throttled_seconds", delay)
+            self._sleep(delay)
+
+    def _get_backoff(self, attempt):
+        return random.uniform(0, min(MAX_BACKOFF_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+    def _get_retry_after(self, resp, attempt):
+        try:
+            return float(resp.headers["Retry-After"])
+        except (KeyError, ValueError):
+            return self._get_backoff(attempt)
+
+    def _has_fresh_token(self):
+        return self._token is not None and time.monotonic() < self._token_expires_at - TOKEN_EXPIRY_MARGIN_SECONDS
 
     @property
     def token(self):
+        """Bearer token for authorizing requests.
+
+        The token is cached until shortly before it expires. If several threads find it
+        expired at once, only one of them requests a new one; the others wait for it.
+        """
+        if not self._has_fresh_token():
+            with self._token_lock:
+                if not self._has_fresh_token():
+                    self._token, expires_in = self._request_token()
+                    self._token_expires_at = time.monotonic() + expires_in
+                    self._count("token_refreshes")
+                    return self._token
+        self._count("token_hits")
+        return self._token
+
+    def _request_token(self):
+        """
+        Returns:
+            (tuple): token (str), and number of seconds until it expires (int).
+        """
         encoded_auth_header = b64encode((self.client_id + ":" + self.secret_key).encode("UTF-8")).decode()
         post_headers = dict(Authorization="Basic {}".format(encoded_auth_header))
         post_body = dict(grant_type="client_credentials")
-        resp = requests.post(
-            "https://accounts.spotify.com/api/token",
+        resp = self._send(
+            "POST",
+            self.auth_url,
             data=post_body,
             headers=post_headers,
         )
@@ -50,7 +228,8 @@ class SpotifyClient():
         token = body.get("access_token")
         if token is None:
             raise Exception("ERROR: Token not found in resp body: ", body)
-        return token
+        # Spotify's tokens last an hour
+        return token, int(body.get("expires_in", 3600))
 
     def set_token_in_auth_header(self, headers):
         """Adds 'Authorization' field to given headers object and returns it.
@@ -94,10 +273,10 @@ class SpotifyClient():
                     ...
                 }
         """
-        headers = self.set_token_in_auth_header(dict())
-        resp = requests.get(
+        resp = self._send(
+            "GET",
             self.api_base + "/v1/artists/{}/related-artists".format(artist_ID),
-            headers=headers,
+            authorize=True,
         )
 
         try:
@@ -133,11 +312,11 @@ class SpotifyClient():
                 songs, and albums.
         """
         params = dict(q=artist, type="artist")
-        headers = self.set_token_in_auth_header(dict())
-        resp = requests.get(
+        resp = self._send(
+            "GET",
             self.api_base + "/v1/search",
             params=params,
-            headers=headers,
+            authorize=True,
         )
 
         try:
@@ -180,11 +359,11 @@ class SpotifyClient():
                     ...
                 }
         """
-        headers = self.set_token_in_auth_header(dict())
         params = dict(country=country_iso_code)
-        resp = requests.get(
+        resp = self._send(
+            "GET",
             self.api_base + "/v1/artists/{}/top-tracks".format(artist_ID),
-            headers=headers,
+            authorize=True,
             params=params,
         )
         try:
@@ -217,9 +396,13 @@ class SpotifyClient():
         - instrumentalness
         - bounciness
 
+        Params:
+            track_ids (iterable): Spotify IDs of tracks. Any number may be given: they are
+                requested in batches of (at most) 100, concurrently.
+
         Returns:
             all_audio_features (dict): elems are dicts with track ID as key and value is a dict
-                containing each audio feature; None if request fails.
+                containing each audio feature; None if every request fails.
                 e.g. {
                     '1TEL6MlSSVLSdhOSddidlJ': {
                         'acousticness': 0.78,
@@ -244,11 +427,21 @@ class SpotifyClient():
                     ...
                 }
         """
+        batches = self._get_in_batches(self._get_audio_features_batch, track_ids, MAX_AUDIO_FEATURES_IDS)
+        if len(batches) > 0 and all(batch is None for batch in batches):
+            return None
+
+        all_audio_features = dict()
+        for batch in batches:
+            all_audio_features.update(batch or dict())
+        return all_audio_features
+
+    def _get_audio_features_batch(self, track_ids):
         comma_sep_ids = URL_ENCODED_COMMA.join([x for x in track_ids])
-        headers = self.set_token_in_auth_header(dict())
-        resp = requests.get(
+        resp = self._send(
+            "GET",
             self.api_base + f"/v1/audio-features?ids={comma_sep_ids}",
-            headers=headers,
+            authorize=True,
         )
         try:
             body = resp.json()
@@ -262,13 +455,96 @@ class SpotifyClient():
             return None
 
         all_audio_features = dict()
-        for features in body['audio_features']:
+        for track_id, features in zip(track_ids, body['audio_features']):
             if features is None:
-                print(f"ERROR: did not get audio features in response body: {body}")
-                break
+                print(f"ERROR: did not get audio features for track with ID '{track_id}'")
+                continue
             all_audio_features[features['id']] = features
         return all_audio_features
 
+    def get_artists(self, artist_ids):
+        """Retrieves metadata of the specified artists.
+
+        Params:
+            artist_ids (list): Spotify IDs of artists e.g. ["51Blml2LZPmy7TTiAg47vQ", ...]
+
+        Returns:
+            artists (dict): key is artist ID, val is their metadata packaged in a dict.
+                Artists that could not be found are left out; None if every request fails.
+                e.g. {
+                    '0kXDB5aeESWj5BD9TCLkMu': {
+                        'name': 'Alextbh',
+                        'genres': ['indie r&b', 'malaysian indie'],
+                        'num_followers': 19517
+                    },
+                    ...
+                }
+        """
+        batches = self._get_in_batches(self._get_artists_batch, artist_ids, MAX_ARTISTS_IDS)
+        if len(batches) > 0 and all(batch is None for batch in batches):
+            return None
+
+        artists = dict()
+        for batch in batches:
+            artists.update(batch or dict())
+        return artists
+
+    def _get_artists_batch(self, artist_ids):
+        resp = self._send(
+            "GET",
+            self.api_base + "/v1/artists",
+            params=dict(ids=",".join(artist_ids)),
+            authorize=True,
+        )
+        try:
+            body = resp.json()
+        except Exception as e:
+            print("ERROR: Could not parse response body of request for artists with IDs: ", artist_ids)
+            return None
+
+        if resp.status_code != 200:
+            print(f"ERROR: Request for artists with IDs '{artist_ids}' failed with HTTP code:{resp.status_code}")
+            print(body)
+            return None
+
+        artists = dict()
+        for artist_id, hit in zip(artist_ids, body["artists"]):
+            if hit is None:
+                print(f"ERROR: did not find artist with ID '{artist_id}'")
+                continue
+            artists[hit["id"]] = dict(
+                name=hit["name"],
+                genres=hit["genres"],
+                num_followers=int(hit["followers"]["total"]),
+            )
+        return artists
+
+    def _get_in_batches(self, get_batch, ids, batch_size):
+        """Splits given IDs into batches of at most batch_size, and requests the batches concurrently.
+
+        Params:
+            get_batch (function): takes a list of IDs and returns the response for them.
+            ids (iterable): e.g. track IDs.
+            batch_size (int): max number of IDs per request.
+
+        Returns:
+            (list): return value of get_batch for each batch, in order.
+        """
+        ids = list(ids)
+        batches = [ids[i:i + batch_size] for i in range(0, len(ids), batch_size)]
+        if len(batches) <= 1:
+            return [get_batch(batch) for batch in batches]
+        return list(self._executor.map(get_batch, batches))
+
+def _make_response(url, body):
+    "Makes a successful response with given body (bytes), e.g. for replaying it from the cache."
+    resp = requests.Response()
+    resp.status_code = 200
+    resp.url = url
+    resp._content = body
+    resp.headers["Content-Type"] = "application/json"
+    return resp
+
 def test_client(file):
     """Finds metadata and top songs on Spotify for given artists.
 